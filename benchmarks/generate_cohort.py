@@ -0,0 +1,294 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import plotting.ancestry_helpers as ancestry_helpers
+
+# Synthetic cohort in the layouts the src/ readers expect:
+#   ancestry.tsv                  1KG ancestry table (Sample name, ..., Population code, Superpopulation code, ...)
+#   ccpm_ancestry.tsv             ccpm_id<TAB>ancestry with a header
+#   trios.ped                     sampleID fatherID motherID sex
+#   ids.txt                       haplotype IDs (sample_0, sample_1)
+#   TOP_HITS_K.txt                query match,score ... (self first)
+#   plink.genome / plink.kin0     plink pair files for the neighbor pairs
+#   knn_segments/                 chrmC.segmentS.knn per-segment haplotype hits
+#   ccpm_chrm_C/                  one QUERY .knn file per query
+#   ilash/                        chrmC.match iLASH IBD segments
+#   timing/                       chrmC_segments.log segment search timing logs (see src/timing_ingest.py)
+#   VERSION                       generator version the cohort was written with
+# Hits are distinct samples drawn mostly from the query's subpopulation, then its superpopulation, then
+# anywhere, and trio parents and children are each other's best hits, so the files have the same structure
+# as the 1KG outputs at any number of samples.
+
+# bumped whenever the generated files change, so cached cohorts are regenerated
+VERSION = 3
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Generate a synthetic cohort for the benchmarks')
+    parser.add_argument('--samples', type=int, required=True, help='number of samples')
+    parser.add_argument('--out', type=str, required=True, help='output directory')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--chrms', type=int, default=1, help='number of chromosomes')
+    parser.add_argument('--segments', type=int, default=4, help='segments per chromosome')
+    parser.add_argument('--queries', type=int, default=100, help='number of per-query .knn files')
+    parser.add_argument('--trio_fraction', type=float, default=0.1, help='fraction of samples in trios')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.samples <= args.k:
+        parser.error('--samples must be larger than --k')
+    return args
+
+def get_sample_ids(num_samples):
+    return ['SYN' + str(i).zfill(6) for i in range(num_samples)]
+
+def get_trios(sample_subpops, trio_fraction, rng):
+    '''
+    Group samples of the same subpopulation into (child, father, mother) trios
+    @return: father and mother index per sample (-1 for founders)
+    '''
+    fathers = np.full(len(sample_subpops), -1, dtype=np.int64)
+    mothers = np.full(len(sample_subpops), -1, dtype=np.int64)
+    # trios are counted over the whole cohort, so small cohorts (a few samples per subpopulation) still get some
+    pools = [list(rng.permutation(np.flatnonzero(sample_subpops == subpop))) for subpop in np.unique(sample_subpops)]
+    for _ in range(int(len(sample_subpops) * trio_fraction) // 3):
+        sizes = np.array([len(pool) if len(pool) >= 3 else 0 for pool in pools], dtype=np.float64)
+        if sizes.sum() == 0:
+            break
+        pool = pools[rng.choice(len(pools), p=sizes / sizes.sum())]
+        child, father, mother = pool.pop(), pool.pop(), pool.pop()
+        fathers[child] = father
+        mothers[child] = mother
+    return fathers, mothers
+
+def get_neighbors(sample_subpops, k, rng, p_subpop=0.8, p_superpop=0.15):
+    '''
+    Draw k distinct hits per sample from its subpopulation, superpopulation or anywhere else
+    @return: N x k neighbor indexes
+    '''
+    num_samples = len(sample_subpops)
+    superpops = sorted(ancestry_helpers.SUPER_SUBPOPULATIONS.keys())
+    subpop_superpop = np.array([superpops.index(ancestry_helpers.SUB_SUPERPOPULATIONS[s])
+                                for s in ancestry_helpers.SUBPOPULATIONS])
+    sample_superpops = subpop_superpop[sample_subpops]
+
+    # hits per sample from each of three disjoint pools: subpopulation, rest of the superpopulation, everyone else
+    counts = rng.multinomial(k, [p_subpop, p_superpop, 1 - p_subpop - p_superpop], size=num_samples)
+    neighbors = np.empty((num_samples, k), dtype=np.int64)
+    for subpop in np.unique(sample_subpops):
+        in_subpop = sample_subpops == subpop
+        in_superpop = sample_superpops == subpop_superpop[subpop]
+        pools = [np.flatnonzero(in_subpop), np.flatnonzero(in_superpop & ~in_subpop), np.flatnonzero(~in_superpop)]
+        for i in np.flatnonzero(in_subpop):
+            picks = []
+            short = 0
+            for pool, count in zip(pools, counts[i]):
+                # a pool too small for its share passes the rest on to the next one
+                pool = pool[pool != i]
+                take = min(count + short, len(pool))
+                short = count + short - take
+                picks.append(rng.choice(pool, size=take, replace=False))
+            row = np.concatenate(picks)
+            if len(row) < k:
+                # a pool was too small: fill from everyone not drawn yet
+                rest = np.setdiff1d(np.arange(num_samples), np.append(row, i))
+                row = np.append(row, rng.choice(rest, size=k - len(row), replace=False))
+            neighbors[i] = rng.permutation(row)
+    return neighbors
+
+def get_scores(num_samples, k, rng):
+    # GenoSiS-like scores: self near 7000, relatives near 3800, everything else a few hundred, descending
+    scores = np.round(rng.normal(600, 60, size=(num_samples, k)))
+    return -np.sort(-np.clip(scores, 100, None), axis=1)
+
+def put_hits(neighbors, scores, rows, col, hits, hit_scores):
+    '''
+    Set column col of rows to hits, swapping a hit already elsewhere in its row so no row repeats a match
+    '''
+    found = neighbors[rows] == hits[:, None]
+    has = found.any(axis=1)
+    where = found.argmax(axis=1)
+    neighbors[rows[has], where[has]] = neighbors[rows[has], col]
+    neighbors[rows, col] = hits
+    scores[rows, col] = hit_scores
+
+def add_relatives(neighbors, scores, fathers, mothers, rng):
+    '''
+    Put trio parents and children at the top of each other's hits
+    '''
+    children = np.flatnonzero(fathers >= 0)
+    for parents in (fathers, mothers):
+        col = 0 if parents is fathers else 1
+        put_hits(neighbors, scores, children, col, parents[children],
+                 np.round(rng.normal(3800, 100, size=len(children))))
+        put_hits(neighbors, scores, parents[children], col, children,
+                 np.round(rng.normal(3800, 100, size=len(children))))
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(neighbors, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+def write_ancestry(sample_ids, sample_subpops, out_file):
+    with open(out_file, 'w') as f:
+        f.write('\t'.join(['Sample name', 'Sex', 'Biosample ID', 'Population code', 'Population name',
+                           'Superpopulation code', 'Superpopulation name', 'Population elastic ID',
+                           'Data collections']) + '\n')
+        for i, sample in enumerate(sample_ids):
+            subpop = ancestry_helpers.SUBPOPULATIONS[sample_subpops[i]]
+            superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[subpop]
+            f.write('\t'.join([sample, 'female' if i % 2 else 'male', 'SAME' + str(i), subpop, subpop,
+                               superpop, superpop, subpop, 'synthetic']) + '\n')
+
+def write_ccpm_ancestry(sample_ids, sample_subpops, out_file):
+    with open(out_file, 'w') as f:
+        f.write('ccpm_id\tancestry\n')
+        for sample, subpop in zip(sample_ids, sample_subpops):
+            f.write(sample + '\t' + ancestry_helpers.SUB_SUPERPOPULATIONS[ancestry_helpers.SUBPOPULATIONS[subpop]] + '\n')
+
+def write_ped(sample_ids, fathers, mothers, out_file):
+    with open(out_file, 'w') as f:
+        f.write('sampleID fatherID motherID sex\n')
+        for i, sample in enumerate(sample_ids):
+            father = sample_ids[fathers[i]] if fathers[i] >= 0 else '0'
+            mother = sample_ids[mothers[i]] if mothers[i] >= 0 else '0'
+            f.write(' '.join([sample, father, mother, str(i % 2 + 1)]) + '\n')
+
+def write_ids(sample_ids, out_file):
+    with open(out_file, 'w') as f:
+        for sample in sample_ids:
+            f.write(sample + '_0\n' + sample + '_1\n')
+
+def write_top_hits(sample_ids, neighbors, scores, self_scores, out_file):
+    with open(out_file, 'w') as f:
+        for i, sample in enumerate(sample_ids):
+            hits = [sample + ',' + str(self_scores[i])]
+            hits += [sample_ids[m] + ',' + str(s) for m, s in zip(neighbors[i], scores[i])]
+            f.write(sample + ' ' + ' '.join(hits) + '\n')
+
+def get_pairs(neighbors):
+    '''
+    unique unordered neighbor pairs (i < j)
+    '''
+    queries = np.repeat(np.arange(len(neighbors)), neighbors.shape[1])
+    matches = neighbors.ravel()
+    pairs = np.unique(np.stack((np.minimum(queries, matches), np.maximum(queries, matches)), axis=1), axis=0)
+    return pairs[pairs[:, 0] != pairs[:, 1]]
+
+def write_plink(sample_ids, pairs, rng, genome_file, kin0_file):
+    # mostly unrelated pairs with a long tail of related ones
+    pi_hat = np.round(np.clip(rng.beta(1, 20, size=len(pairs)), 0, 1), 4)
+    dst = np.round(0.7 + 0.3 * pi_hat + rng.normal(0, 0.005, size=len(pairs)), 6)
+    kinship = np.round(pi_hat / 2 + rng.normal(0, 0.01, size=len(pairs)), 4)
+    with open(genome_file, 'w') as f:
+        f.write(' '.join(['FID1', 'IID1', 'FID2', 'IID2', 'RT', 'EZ', 'Z0', 'Z1', 'Z2',
+                          'PI_HAT', 'PHE', 'DST', 'PPC', 'RATIO']) + '\n')
+        for (a, b), p, d in zip(pairs, pi_hat, dst):
+            A, B = sample_ids[a], sample_ids[b]
+            f.write(f'{A} {A} {B} {B} UN NA {1 - p:.4f} {p:.4f} 0.0000 {p:.4f} -1 {d:.6f} 1.0000 2.0000\n')
+    with open(kin0_file, 'w') as f:
+        f.write('\t'.join(['#IID1', 'IID2', 'NSNP', 'HETHET', 'IBS0', 'KINSHIP']) + '\n')
+        for (a, b), kin in zip(pairs, kinship):
+            f.write(f'{sample_ids[a]}\t{sample_ids[b]}\t1000000\t0.15\t0.02\t{kin}\n')
+
+def write_segment_knn(sample_ids, neighbors, rng, k, out_file):
+    '''
+    per-segment haplotype hits: each haplotype's matches are haplotypes of the sample's neighbors
+    '''
+    with open(out_file, 'w') as f:
+        for i, sample in enumerate(sample_ids):
+            for hap in ('_0', '_1'):
+                f.write('Query: ' + sample + hap + '\n')
+                f.write(sample + hap + ' 0.0\n')
+                picks = rng.permutation(neighbors[i])[:k - 1]
+                distances = np.sort(np.round(rng.uniform(0.5, 5, size=len(picks)), 4))
+                for m, d in zip(picks, distances):
+                    f.write(sample_ids[m] + '_' + str(rng.integers(2)) + ' ' + str(d) + '\n')
+                f.write('\n')
+
+def write_query_knn(sample_ids, neighbors, scores, queries, out_dir):
+    for i in queries:
+        with open(os.path.join(out_dir, sample_ids[i] + '.knn'), 'w') as f:
+            f.write('QUERY: ' + sample_ids[i] + '\n')
+            for m, s in zip(neighbors[i], scores[i]):
+                f.write(sample_ids[m] + '\t' + str(s) + '\n')
+
+def write_ilash(sample_ids, pairs, chrm, rng, out_file):
+    lengths = np.round(rng.exponential(5, size=len(pairs)) + 3, 4)
+    starts = rng.integers(1, 200_000_000, size=len(pairs))
+    with open(out_file, 'w') as f:
+        for (a, b), length, start in zip(pairs, lengths, starts):
+            end = start + int(length * 1_000_000)
+            f.write('\t'.join([sample_ids[a], sample_ids[a] + '_' + str(rng.integers(2)),
+                               sample_ids[b], sample_ids[b] + '_' + str(rng.integers(2)),
+                               str(chrm), str(start), str(end), 'rs' + str(start), 'rs' + str(end),
+                               str(length), '1']) + '\n')
+
+def write_timing_log(chrm, segments, num_samples, rng, out_file):
+    '''
+    segment search log: per segment a config line, the time of every stage and the `time` total
+    '''
+    queries = num_samples * 2
+    with open(out_file, 'w') as f:
+        for seg in range(segments):
+            # seconds per stage, roughly proportional to the number of queries
+            reading, loading = rng.gamma(4, 0.5), rng.gamma(4, 0.25)
+            searching, scoring = queries * rng.gamma(4, 5e-5), queries * rng.gamma(4, 2e-5)
+            full = reading + loading + searching + scoring
+            f.write(f'chrm{chrm}.segment{seg}.config\n')
+            f.write(f'reading embeddings: {reading:.4f} s\n')
+            f.write(f'loading index: {loading:.4f} s\n')
+            f.write(f'searching index: {searching:.4f} s\n')
+            f.write(f'scoring hits: {scoring:.4f} s\n')
+            f.write(f'full search: {full:.4f} s\n')
+            f.write(f'real\t{int((full + 1) // 60)}m{(full + 1) % 60:.3f}s\n')
+        f.write(f'sorting hits: {queries * rng.gamma(4, 1e-5):.4f} s\n')
+
+def generate(num_samples, out_dir, k=20, chrms=1, segments=4, queries=100, trio_fraction=0.1, seed=0):
+    '''
+    Write every synthetic input for a cohort of num_samples samples
+    @return: out_dir
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    sample_ids = get_sample_ids(num_samples)
+    sample_subpops = rng.integers(len(ancestry_helpers.SUBPOPULATIONS), size=num_samples)
+    fathers, mothers = get_trios(sample_subpops, trio_fraction, rng)
+    neighbors = get_neighbors(sample_subpops, k - 1, rng)
+    scores = get_scores(num_samples, k - 1, rng)
+    neighbors, scores = add_relatives(neighbors, scores, fathers, mothers, rng)
+    self_scores = np.round(rng.normal(7000, 150, size=num_samples))
+    pairs = get_pairs(neighbors)
+
+    with open(os.path.join(out_dir, 'VERSION'), 'w') as f:
+        f.write(str(VERSION) + '\n')
+    write_ancestry(sample_ids, sample_subpops, os.path.join(out_dir, 'ancestry.tsv'))
+    write_ccpm_ancestry(sample_ids, sample_subpops, os.path.join(out_dir, 'ccpm_ancestry.tsv'))
+    write_ped(sample_ids, fathers, mothers, os.path.join(out_dir, 'trios.ped'))
+    write_ids(sample_ids, os.path.join(out_dir, 'ids.txt'))
+    write_top_hits(sample_ids, neighbors, scores, self_scores, os.path.join(out_dir, 'TOP_HITS_' + str(k) + '.txt'))
+    write_plink(sample_ids, pairs, rng, os.path.join(out_dir, 'plink.genome'), os.path.join(out_dir, 'plink.kin0'))
+
+    os.makedirs(os.path.join(out_dir, 'knn_segments'), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'ilash'), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'timing'), exist_ok=True)
+    for chrm in range(1, chrms + 1):
+        for seg in range(segments):
+            write_segment_knn(sample_ids, neighbors, rng, k,
+                              os.path.join(out_dir, 'knn_segments', f'chrm{chrm}.segment{seg}.knn'))
+        write_ilash(sample_ids, pairs, chrm, rng, os.path.join(out_dir, 'ilash', f'chrm{chrm}.match'))
+        write_timing_log(chrm, segments, num_samples, rng, os.path.join(out_dir, 'timing', f'chrm{chrm}_segments.log'))
+
+        query_dir = os.path.join(out_dir, f'ccpm_chrm_{chrm}')
+        os.makedirs(query_dir, exist_ok=True)
+        write_query_knn(sample_ids, neighbors, scores,
+                        rng.choice(num_samples, size=min(queries, num_samples), replace=False), query_dir)
+    return out_dir
+
+def main():
+    args = get_args()
+    generate(args.samples, args.out, args.k, args.chrms, args.segments, args.queries, args.trio_fraction, args.seed)
+    print('wrote', args.out)
+
+if __name__ == '__main__':
+    main()
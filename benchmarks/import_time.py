@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+# Start-up cost of the command line scripts: `python -X importtime` of each module in a fresh
+# interpreter, so plotting and scientific libraries that are only needed later show up here.
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# module -> directory it is imported from (the scripts are run as files, not packages)
+MODULES = {
+    'figure3_ancestry': 'plotting',
+    'plot_density': 'plotting',
+    'top_hits_umap': 'plotting',
+    'top_hits_pca': 'plotting',
+    'ilash_pval': 'src',
+    'embedding_quality': 'src',
+    'genosis_topK_percent': 'src',
+}
+
+def import_time(module, module_dir):
+    '''
+    Cumulative import time of a module in a new interpreter
+    @return: seconds, list of (seconds, imported module) for the slowest imports
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_DIR, os.path.join(REPO_DIR, module_dir)])
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError('import ' + module + ' failed:\n' + result.stderr[-2000:])
+    # import time: self [us] | cumulative | imported package
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        # nested imports are indented under the module that imported them
+        depth = len(fields[2]) - len(fields[2].lstrip()) - 1
+        times.append((int(fields[1]) / 1e6, fields[2].strip(), depth))
+    total = [t for t, name, depth in times if name == module]
+    top = sorted([(t, name) for t, name, depth in times if depth <= 2 and name != module], reverse=True)[:5]
+    return total[0] if len(total) > 0 else sum(t for t, name, depth in times if depth == 0), top
+
+def main():
+    for module, module_dir in MODULES.items():
+        seconds, top = import_time(module, module_dir)
+        print(f'{module:24s} {seconds:8.3f} s   ' + ', '.join(f'{name} {t:.3f}' for t, name in top[:3]))
+
+if __name__ == '__main__':
+    main()
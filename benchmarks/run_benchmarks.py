@@ -0,0 +1,240 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# time the parsers themselves, never a parsed_cache hit
+os.environ['GENOSIS_CACHE'] = '0'
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+import generate_cohort
+import import_time
+import plotting.ancestry_helpers as ancestry_helpers
+import aggregate_segment_hits
+import get_relations
+import read_genosis
+import read_plink
+import sum_ilash
+import update_top_hits
+import write_ccpm_ancestry
+import write_plink_top_k
+import write_subpop_counts
+import write_trio_scores
+
+# Every reader and aggregator is timed on synthetic cohorts of each size (see generate_cohort.py).
+# Results are the best and median of --repeat runs per benchmark and size; --save stores them as a
+# baseline under benchmarks/baselines/ and --compare reports (and exits non-zero on) slowdowns.
+# The committed reference is baselines/ref.json (--sizes 1000 10000 --repeat 5 --save ref); check a
+# change against it with --sizes 1000 10000 --compare ref, on a quiet machine.
+# Start-up time of the command line scripts is tracked as 'import.<module>' with size 'import'.
+
+K = 20
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the readers and aggregators on synthetic cohorts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help='cohort sizes (samples)')
+    parser.add_argument('--data', type=str, default=os.path.join(tempfile.gettempdir(), 'genosis_bench'),
+                        help='directory for generated cohorts (reused between runs)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', type=str, nargs='+', help='run benchmarks whose name contains any of these')
+    parser.add_argument('--out', type=str, help='write results JSON here')
+    parser.add_argument('--save', type=str, help='save results as baseline benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', type=str, help='baseline JSON file or name to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio (current / baseline median) reported as a regression')
+    parser.add_argument('--plot', type=str, help='write scaling curves to this png')
+    parser.add_argument('--no_imports', action='store_true', help='skip the script import time benchmarks')
+    return parser.parse_args()
+
+class Cohort:
+    '''
+    Paths of a generated cohort and inputs shared between benchmarks
+    '''
+    def __init__(self, cohort_dir):
+        self.dir = cohort_dir
+        self.top_hits = os.path.join(cohort_dir, 'TOP_HITS_' + str(K) + '.txt')
+        self.ancestry = os.path.join(cohort_dir, 'ancestry.tsv')
+        self.ccpm_ancestry = os.path.join(cohort_dir, 'ccpm_ancestry.tsv')
+        self.ped = os.path.join(cohort_dir, 'trios.ped')
+        self.ids = os.path.join(cohort_dir, 'ids.txt')
+        self.genome = os.path.join(cohort_dir, 'plink.genome')
+        self.kin0 = os.path.join(cohort_dir, 'plink.kin0')
+        self.segment_knn = sorted(glob.glob(os.path.join(cohort_dir, 'knn_segments', 'chrm1.segment*.knn')))
+        self.query_knn = os.path.join(cohort_dir, 'ccpm_chrm_1')
+        self.matches = sorted(glob.glob(os.path.join(cohort_dir, 'ilash', '*.match')))
+        self.cache = {}
+
+    def get(self, name, func, *args):
+        if name not in self.cache:
+            self.cache[name] = func(*args)
+        return self.cache[name]
+
+    def subpopulations(self):
+        return self.get('subpopulations', ancestry_helpers.get_subpopulations, self.ancestry)
+
+    def dst_dict(self):
+        return self.get('dst_dict', read_plink.get_pairwise_DST_score_dict, self.genome)
+
+    def id_index(self):
+        return self.get('id_index', aggregate_segment_hits.get_id_index, self.ids, True)
+
+    def accumulated(self):
+        return self.get('accumulated', aggregate_segment_hits.accumulate_chromosome,
+                        self.segment_knn, self.id_index()[1], 'count')
+
+    def ped_rows(self):
+        return self.get('ped_rows', get_relations.get_ped, self.ped, 'ALL', None, False)
+
+# name -> function of a cohort returning the call to time
+BENCHMARKS = {
+    'read_genosis.get_top_hits_dict': lambda c: lambda: read_genosis.get_top_hits_dict(c.top_hits),
+    'write_trio_scores.read_top_hits': lambda c: lambda: write_trio_scores.read_top_hits(c.top_hits),
+    'update_top_hits.read_top_k': lambda c: lambda: update_top_hits.read_top_k(c.top_hits),
+    'ancestry_helpers.get_subpopulations': lambda c: lambda: ancestry_helpers.get_subpopulations(c.ancestry),
+    'ancestry_helpers.get_population_maps': lambda c: lambda: ancestry_helpers.get_population_maps(c.ancestry),
+    'write_subpop_counts.get_subpop_counts':
+        lambda c: lambda: write_subpop_counts.get_subpop_counts(c.top_hits, c.subpopulations(), header=False),
+    'read_plink.get_pairwise_DST_score_dict': lambda c: lambda: read_plink.get_pairwise_DST_score_dict(c.genome),
+    'read_plink.get_pairwise_pihat_score_dict': lambda c: lambda: read_plink.get_pairwise_pihat_score_dict(c.genome),
+    'read_plink.get_pairwise_kin_score_dict': lambda c: lambda: read_plink.get_pairwise_kin_score_dict(c.kin0),
+    'write_plink_top_k.get_plink_top_hits': lambda c: lambda: write_plink_top_k.get_plink_top_hits(c.dst_dict(), K),
+    'get_relations.get_ped': lambda c: lambda: get_relations.get_ped(c.ped, 'ALL', None, False),
+    'get_relations.build_family_tree': lambda c: lambda: get_relations.build_family_tree(c.ped_rows()),
+    'aggregate_segment_hits.accumulate_chromosome':
+        lambda c: lambda: aggregate_segment_hits.accumulate_chromosome(c.segment_knn, c.id_index()[1], 'count'),
+    'aggregate_segment_hits.get_top_k':
+        lambda c: lambda: aggregate_segment_hits.get_top_k(*c.accumulated(), len(c.id_index()[0]), K),
+    'write_ccpm_ancestry.read_ccpm_ancestry': lambda c: lambda: write_ccpm_ancestry.read_ccpm_ancestry(c.ccpm_ancestry),
+    'write_ccpm_ancestry.get_cohorts': lambda c: lambda: write_ccpm_ancestry.get_cohorts(c.query_knn),
+    'sum_ilash.get_pair_lengths': lambda c: lambda: sum_ilash.get_pair_lengths(c.matches),
+}
+
+def get_cohort_version(cohort_dir):
+    version_file = os.path.join(cohort_dir, 'VERSION')
+    if not os.path.exists(version_file):
+        return None
+    with open(version_file, 'r') as f:
+        return int(f.read().strip())
+
+def get_cohort(data_dir, num_samples):
+    cohort_dir = os.path.join(data_dir, 'cohort_' + str(num_samples))
+    if get_cohort_version(cohort_dir) != generate_cohort.VERSION or \
+            not os.path.exists(os.path.join(cohort_dir, 'TOP_HITS_' + str(K) + '.txt')):
+        print('generating...', cohort_dir)
+        generate_cohort.generate(num_samples, cohort_dir, k=K)
+    return Cohort(cohort_dir)
+
+def time_call(func, repeat):
+    # untimed first call: builds the cohort inputs the call shares with other benchmarks and warms the file cache
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+def run(args):
+    names = [name for name in BENCHMARKS
+             if args.only is None or any(pattern in name for pattern in args.only)]
+    results = {name: {} for name in names}
+    for num_samples in args.sizes:
+        cohort = get_cohort(args.data, num_samples)
+        for name in names:
+            func = BENCHMARKS[name](cohort)
+            times = time_call(func, args.repeat)
+            results[name][str(num_samples)] = {'min_s': min(times),
+                                               'median_s': statistics.median(times),
+                                               'samples_per_s': num_samples / min(times)}
+            print(f'{name:48s} {num_samples:>8d} {min(times):10.4f} s {num_samples / min(times):14.1f} samples/s')
+    if not args.no_imports:
+        for module, module_dir in import_time.MODULES.items():
+            name = 'import.' + module
+            if args.only is not None and not any(pattern in name for pattern in args.only):
+                continue
+            times = [import_time.import_time(module, module_dir)[0] for _ in range(args.repeat)]
+            results[name] = {'import': {'min_s': min(times), 'median_s': statistics.median(times)}}
+            print(f'{name:48s} {"import":>8s} {min(times):10.4f} s')
+    return {'meta': {'python': platform.python_version(),
+                     'platform': platform.platform(),
+                     'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                     'repeat': args.repeat},
+            'results': results}
+
+def get_baseline_file(name):
+    if os.path.exists(name):
+        return name
+    return os.path.join(BENCH_DIR, 'baselines', name + '.json')
+
+def compare(current, baseline, threshold):
+    '''
+    Print current / baseline median ratios
+    @return: list of (benchmark, size, ratio) slower than the threshold
+    '''
+    regressions = []
+    print('\n' + f'{"benchmark":48s} {"samples":>8s} {"baseline":>10s} {"current":>10s} {"ratio":>7s}')
+    for name, sizes in current['results'].items():
+        for size, result in sizes.items():
+            try:
+                base = baseline['results'][name][size]
+            except KeyError:
+                continue
+            ratio = result['median_s'] / base['median_s']
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f'{name:48s} {size:>8s} {base["median_s"]:10.4f} {result["median_s"]:10.4f} {ratio:7.2f}{flag}')
+            if ratio > threshold:
+                regressions.append((name, size, ratio))
+    return regressions
+
+def plot_scaling(current, png_file):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 7))
+    for name, sizes in current['results'].items():
+        x = sorted(int(s) for s in sizes if s.isdigit())
+        if len(x) == 0:
+            continue
+        ax.plot(x, [sizes[str(s)]['median_s'] for s in x], marker='o', label=name)
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('samples')
+    ax.set_ylabel('median seconds')
+    ax.legend(fontsize=7, frameon=False)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    plt.tight_layout()
+    plt.savefig(png_file)
+
+def main():
+    args = get_args()
+    current = run(args)
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.save is not None:
+        os.makedirs(os.path.join(BENCH_DIR, 'baselines'), exist_ok=True)
+        with open(get_baseline_file(args.save), 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.plot is not None:
+        plot_scaling(current, args.plot)
+
+    if args.compare is not None:
+        with open(get_baseline_file(args.compare), 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(len(regressions), 'regressions over', args.threshold)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+from collections import defaultdict
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import ancestry_helpers
+import compressed_io
+import hit_rate_bootstrap
+import parsed_cache
+
+# Data helpers for figure3_ancestry.py that do not need the plotting libraries
+
+@parsed_cache.cached()
+def read_ancestry_group_scores(ancestry_group_scores_file):
+    '''
+    Read scores for superpop, subpop, and outpop labels.
+    @param ancestry_group_scores_file: path to scores file for 1KG data
+    @return: dictionary of scores for each superpop
+    '''
+    # superpop: category: [scores...]
+    scores = defaultdict(dict)
+    with open(ancestry_group_scores_file, 'r') as f:
+        header = f.readline().strip().split(',')
+        for line in f:
+            line = line.strip().split(',')
+            superpop = line[0]
+            category = line[1]
+            scores[superpop][category] = [float(x) for x in line[2].strip().split()]
+    return scores
+
+@parsed_cache.cached()
+def read_top_K(top_k_file,
+               subpopulations,
+               header=True):
+    '''
+    Read top K scores and return top K samples, and populations
+    @param top_k_file: path top k scores
+    @param subpopulations: dictionary of subpopulations for each sample
+    @return: dictionary of top K samples and populations for each query
+    '''
+    top_K_samples = {}
+    top_K_subpopulations = {}
+    f = compressed_io.open_text(top_k_file)
+    if header:
+        f.readline()
+    for line in f:
+        line = line.strip().split()
+        query = line[0]
+        top_K_samples[query] = []
+        top_K_subpopulations[query] = []
+        matches = line[1:]
+        for match_score in matches:
+            match = match_score.split(',')[0]
+            top_K_samples[query].append(match)
+            try:
+                top_K_subpopulations[query].append(subpopulations[match])
+            except:
+                pass # header
+    return top_K_samples, top_K_subpopulations
+
+def get_percent_in_top_k(top_K_samples,
+                         subpopulations):
+    '''
+
+    @param top_K_samples: dictionary with key = sample and value = list of top k samples
+    @param top_K_subpopulations: dictionary with key = sample and value = list of top k subpopulations
+
+    @return: dictionary with key = sample and value = percent in top k that are subpop, superpop, outgroup
+    '''
+    sample_percents = {}
+    for query in top_K_samples.keys():
+        k = len(top_K_samples[query])
+        query_subpop = subpopulations[query]
+        query_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[query_subpop]
+        subpop_count = 0
+        superpop_count = 0
+        outgroup_count = 0
+        for match in top_K_samples[query]:
+            match_subpop = subpopulations[match]
+            match_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[match_subpop]
+            if query_subpop == match_subpop:
+                subpop_count += 1
+                superpop_count += 1
+            elif query_superpop == match_superpop:
+                superpop_count += 1
+            else:
+                outgroup_count += 1
+        sample_percents[query] = {'subpop': subpop_count / k,
+                                    'superpop': superpop_count / k,
+                                    'outgroup': outgroup_count / k}
+    return sample_percents
+
+
+def get_pop_counts(sample_percents,
+                   subpopulations):
+    '''
+    Get the counts of samples in the same subpopulation, superpopulation, and outgroup
+    @param sample_percents:
+    @return:
+    '''
+    counts = defaultdict(dict)
+    for sample in sample_percents.keys():
+        # get superpop of sample
+        sample_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[subpopulations[sample]]
+        for category in sample_percents[sample].keys():
+            if category not in counts[sample_superpop]:
+                counts[sample_superpop][category] = []
+            counts[sample_superpop][category].append(sample_percents[sample][category])
+    return counts
+
+
+
+
+def get_population_percents(top_K_subpopulations,
+                            k,
+                            subpopulations):
+    '''
+    Get the percent of matches in the same subpopulation and superpopulation
+    @param top_K_subpopulations:
+    @param k: k used for knn
+    @return:
+    '''
+    num_samples = {'AFR': 0,
+                     'AMR': 0,
+                     'EAS': 0,
+                     'EUR': 0,
+                     'SAS': 0}
+
+    # start with k as k, and move down to k = 1
+    superpop_counts = {'AFR': {k_i:0 for k_i in range(1,k+1)},
+                       'AMR': {k_i:0 for k_i in range(1,k+1)},
+                       'EAS': {k_i:0 for k_i in range(1,k+1)},
+                       'EUR': {k_i:0 for k_i in range(1,k+1)},
+                       'SAS': {k_i:0 for k_i in range(1,k+1)}}
+    subpop_counts = {'AFR': {k_i:0 for k_i in range(1,k+1)},
+                       'AMR': {k_i:0 for k_i in range(1,k+1)},
+                       'EAS': {k_i:0 for k_i in range(1,k+1)},
+                       'EUR': {k_i:0 for k_i in range(1,k+1)},
+                       'SAS': {k_i:0 for k_i in range(1,k+1)}}
+    cohort_size = k
+    while cohort_size >= 1:
+        for query in top_K_subpopulations.keys():
+            query_subpop = subpopulations[query]
+            query_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[query_subpop]
+            if cohort_size == k:
+                num_samples[query_superpop] += 1
+            match_index = 0
+            for match_subpop in top_K_subpopulations[query]:
+                if match_index >= cohort_size:
+                    continue
+                match_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[match_subpop]
+                if query_subpop == match_subpop:
+                    try:
+                        superpop_counts[query_superpop][cohort_size] += 1
+                        subpop_counts[query_superpop][cohort_size] += 1
+                    except KeyError:
+                        superpop_counts[query_superpop]
+                        subpop_counts[query_superpop][cohort_size] = 1
+                elif query_superpop == match_superpop:
+                    try:
+                        superpop_counts[query_superpop][cohort_size] += 1
+                    except KeyError:
+                        superpop_counts[query_superpop][cohort_size] = 1
+
+                match_index += 1
+
+        cohort_size -= 1
+
+    # get percents
+    superpop_percents = {'AFR': {p: superpop_counts['AFR'][p] / (p * num_samples['AFR']) for p in superpop_counts['AFR'].keys()},
+                         'AMR': {p: superpop_counts['AMR'][p] / (p * num_samples['AMR']) for p in superpop_counts['AMR'].keys()},
+                         'EAS': {p: superpop_counts['EAS'][p] / (p * num_samples['EAS']) for p in superpop_counts['EAS'].keys()},
+                         'EUR': {p: superpop_counts['EUR'][p] / (p * num_samples['EUR']) for p in superpop_counts['EUR'].keys()},
+                         'SAS': {p: superpop_counts['SAS'][p] / (p * num_samples['SAS']) for p in superpop_counts['SAS'].keys()}
+                         }
+    subpop_percents = {'AFR': {p: subpop_counts['AFR'][p] / (p * num_samples['AFR']) for p in subpop_counts['AFR'].keys()},
+                       'AMR': {p: subpop_counts['AMR'][p] / (p * num_samples['AMR']) for p in subpop_counts['AMR'].keys()},
+                       'EAS': {p: subpop_counts['EAS'][p] / (p * num_samples['EAS']) for p in subpop_counts['EAS'].keys()},
+                       'EUR': {p: subpop_counts['EUR'][p] / (p * num_samples['EUR']) for p in subpop_counts['EUR'].keys()},
+                       'SAS': {p: subpop_counts['SAS'][p] / (p * num_samples['SAS']) for p in subpop_counts['SAS'].keys()}
+                       }
+
+    return superpop_percents, subpop_percents
+
+def get_population_intervals(top_K_subpopulations,
+                             k,
+                             subpopulations,
+                             confidence=0.95,
+                             num_resamples=1000,
+                             seed=0,
+                             threads=None):
+    '''
+    Bootstrap confidence intervals of get_population_percents, resampling the queries of each superpopulation
+    @param top_K_subpopulations: dictionary with key = query and value = list of top k subpopulations
+    @param k: k used for knn
+    @param confidence: central fraction of the resampled percents inside the interval
+    @param num_resamples: number of bootstrap resamples
+    @param seed: seed of the resamples
+    @param threads: worker processes for the resamples
+    @return: superpop_intervals, subpop_intervals with key = superpop and value = {k: (low, high)}
+    '''
+    queries = list(top_K_subpopulations.keys())
+    query_subpops = [subpopulations[query] for query in queries]
+    categories = hit_rate_bootstrap.get_categories(query_subpops,
+                                                   [top_K_subpopulations[query] for query in queries],
+                                                   k,
+                                                   ancestry_helpers.SUB_SUPERPOPULATIONS)
+    # matches past the end of a short list count as out of population, as in get_population_percents
+    superpop_rates = hit_rate_bootstrap.get_hit_rates(categories, hit_rate_bootstrap.SUPERPOP)
+    subpop_rates = hit_rate_bootstrap.get_hit_rates(categories, hit_rate_bootstrap.SUBPOP)
+    query_superpops = np.array([ancestry_helpers.SUB_SUPERPOPULATIONS[subpop] for subpop in query_subpops])
+
+    group_values = {}
+    for superpop in ['AFR', 'AMR', 'EAS', 'EUR', 'SAS']:
+        in_superpop = query_superpops == superpop
+        group_values[(superpop, 'superpop')] = superpop_rates[in_superpop]
+        group_values[(superpop, 'subpop')] = subpop_rates[in_superpop]
+    intervals = hit_rate_bootstrap.get_intervals(group_values,
+                                                 confidence=confidence,
+                                                 num_resamples=num_resamples,
+                                                 seed=seed,
+                                                 threads=threads)
+
+    superpop_intervals = {}
+    subpop_intervals = {}
+    for (superpop, level), (low, high) in intervals.items():
+        level_intervals = superpop_intervals if level == 'superpop' else subpop_intervals
+        level_intervals[superpop] = {k_i: (float(low[k_i - 1]), float(high[k_i - 1])) for k_i in range(1, k + 1)}
+    return superpop_intervals, subpop_intervals
+
+def write_genosis_scores(genosis_superpop_percents,
+                         genosis_subpop_percents,
+                         output_file):
+    '''
+    Write the genosis scores to a file
+    @param genosis_subpop_percents:
+    @param genosis_superpop_percents:
+    @param output_file:
+    @return:
+    '''
+
+    # format: k, %superpop, %subpop, %output
+    o = open(output_file, 'w')
+    o.write('pop,k,%superpop,%subpop,%outgroup,k\n')
+
+    for pop in genosis_superpop_percents.keys():
+        for k in genosis_superpop_percents[pop].keys():
+            superpop_percent = genosis_superpop_percents[pop][k]
+            subpop_percent = genosis_subpop_percents[pop][k]
+            outgroup_percent = 1 - superpop_percent
+            # write to file
+            o.write(f'{pop},{k},{superpop_percent},{subpop_percent},{outgroup_percent}\n')
+
+    return 0
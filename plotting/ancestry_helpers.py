@@ -1,5 +1,11 @@
 from collections import defaultdict
+import os
+import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import parsed_cache
+
+@parsed_cache.cached()
 def get_population_maps(population_file):
     """
     Make four mappings of population codes
@@ -38,6 +44,7 @@ def get_population_maps(population_file):
     f.close()
     return sample_subpopulations, sub_to_super, super_to_sub
 
+@parsed_cache.cached()
 def get_knn_results(knn_results):
     """
     Get KNN results
@@ -119,6 +126,7 @@ SUBPOPULATIONS = ['ASW', 'LWK', 'GWD', 'MSL', 'ESN', 'YRI', 'ACB', 'CLM', 'PEL',
 
 SUB_SUPERPOPULATIONS = {'ASW': 'AFR', 'LWK': 'AFR', 'GWD': 'AFR', 'MSL': 'AFR', 'ESN': 'AFR', 'YRI': 'AFR', 'ACB': 'AFR', 'CLM': 'AMR', 'PEL': 'AMR', 'MXL': 'AMR', 'PUR': 'AMR', 'CDX': 'EAS', 'CHB': 'EAS', 'JPT': 'EAS', 'KHV': 'EAS', 'CHS': 'EAS', 'CEU': 'EUR', 'TSI': 'EUR', 'FIN': 'EUR', 'GBR': 'EUR', 'IBS': 'EUR', 'BEB': 'SAS', 'GIH': 'SAS', 'ITU': 'SAS', 'PJL': 'SAS', 'STU': 'SAS'}
 
+@parsed_cache.cached()
 def get_subpopulations(ancestry_file):
     sample_subpopulations = {}
     with open(ancestry_file) as f:
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Pre-binned rendering for plots with millions of points.
+# Points are counted into a (x bins) x (y bins) grid with NumPy and the grid is drawn as one image,
+# so drawing time depends on the number of bins, not the number of points. Empty cells are
+# transparent, so several groups (e.g. in and out of population) can be layered on one axis.
+
+def bin_points(x, y, bins, x_range, y_range):
+    '''
+    Count points into a 2D grid
+    @param bins: (x bins, y bins)
+    @param x_range, y_range: (min, max) of the grid, shared by every group drawn on one axis
+    @return: x bins x y bins counts, x edges, y edges
+    '''
+    x_bins, y_bins = bins
+    x_edges = np.linspace(x_range[0], x_range[1], x_bins + 1)
+    y_edges = np.linspace(y_range[0], y_range[1], y_bins + 1)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # the max of a range falls in the last bin
+    x_idx = np.clip(((x - x_range[0]) / max(x_range[1] - x_range[0], 1e-12) * x_bins).astype(np.int64), 0, x_bins - 1)
+    y_idx = np.clip(((y - y_range[0]) / max(y_range[1] - y_range[0], 1e-12) * y_bins).astype(np.int64), 0, y_bins - 1)
+    counts = np.bincount(x_idx * y_bins + y_idx, minlength=x_bins * y_bins).reshape(x_bins, y_bins)
+    return counts, x_edges, y_edges
+
+def get_range(values, pad=0.0):
+    values = np.asarray(values)
+    low, high = float(values.min()), float(values.max())
+    if high == low:
+        high = low + 1
+    return low - pad * (high - low), high + pad * (high - low)
+
+def draw_counts(ax, counts, x_edges, y_edges, color, alpha=0.8, log=True):
+    '''
+    Draw a count grid as an image shaded from transparent (no points) to color (most points)
+    @param log: shade by log(1 + count), so single points stay visible next to dense areas
+    '''
+    from matplotlib.colors import LinearSegmentedColormap, to_rgb
+
+    r, g, b = to_rgb(color)
+    cmap = LinearSegmentedColormap.from_list('binned_' + str(color), [(r, g, b, 0.0), (r, g, b, alpha)])
+    values = np.log1p(counts) if log else counts.astype(np.float64)
+    # any point at all is at least faintly visible
+    values = np.where(counts > 0, np.maximum(values, values.max() * 0.15), 0)
+    return ax.imshow(values.T,
+                     origin='lower',
+                     extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+                     aspect='auto',
+                     interpolation='nearest',
+                     cmap=cmap,
+                     vmin=0,
+                     vmax=max(values.max(), 1e-12))
+
+def draw_histogram(ax, values, bins, **kwargs):
+    '''
+    ax.hist(values, bins) from np.histogram counts, drawn as one filled step patch
+    '''
+    counts, edges = np.histogram(values, bins=bins)
+    ax.stairs(counts, edges, fill=True, **kwargs)
+    return counts, edges
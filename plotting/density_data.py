@@ -0,0 +1,159 @@
+from collections import defaultdict
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import compressed_io
+import pairwise_parquet
+
+# Data helpers for plot_density.py that do not need the plotting libraries, so src/ scripts
+# can use them without importing matplotlib, seaborn or pandas.
+
+def get_sample_densities(chrm_dir, density_file, sample_densities):
+    segment = density_file.split('.')[1].replace('segment', '')
+    seg_idx = int(segment)
+    with open(chrm_dir + density_file, 'r') as f:
+        for line in f:
+            line = line.strip().split('\t')
+            sample = line[0]
+            density = float(line[1])
+            # if density < 100:
+            #     print(sample, density, segment)
+            sample_densities[sample][seg_idx] = density
+    return sample_densities
+
+def get_segment_densities(chrm_dir, density_file, segment_densities):
+    segment_idx = density_file.split('.')[1].replace('segment', '')
+    with open(chrm_dir + density_file, 'r') as f:
+        for line in f:
+            line = line.strip().split('\t')
+            sample = line[0]
+            density = float(line[1])
+            segment_densities[segment_idx].append(density)
+    return segment_densities
+
+def get_sample_distances(distance_file):
+    if pairwise_parquet.is_parquet(distance_file):
+        return pairwise_parquet.get_distance_dicts(distance_file)
+    enc_distances = defaultdict(dict)
+    emb_distances = defaultdict(dict)
+    with compressed_io.open_text(distance_file) as f:
+        header = f.readline()
+        for line in f:
+            line = line.strip().split()
+            sampleA = line[0]
+            sampleB = line[1]
+            enc_dist = float(line[2])
+            emb_dist = float(line[3])
+            enc_distances[sampleA][sampleB] = enc_dist
+            emb_distances[sampleA][sampleB] = emb_dist
+    return enc_distances, emb_distances
+
+def get_single_r2(enc_distances, emb_distances):
+    '''
+    Calculate the r^2 value for a single sample
+    @param enc_distances:
+    @param emb_distances:
+    @return:
+    '''
+
+    import scipy.stats as stats
+
+    sample_r2 = {}
+    # compare one sample to all others and get the single samples r^2 value
+    for sampleA in enc_distances:
+        encoding_distances = []
+        embedding_distances = []
+        for sampleB in enc_distances[sampleA]:
+            encoding_distances.append(enc_distances[sampleA][sampleB])
+            embedding_distances.append(emb_distances[sampleA][sampleB])
+
+        r2 = stats.pearsonr(encoding_distances, embedding_distances)[0] ** 2
+        sample_r2[sampleA] = r2
+
+    return sample_r2
+
+def get_distance_matrices(distance_file):
+    '''
+    Read a segment distance file into N x N encoding and embedding distance matrices
+    @param distance_file: binary .dist.npz from compute_distances.py --binary, or a text .dist file
+    @return: list of sample IDs, encoding distances, embedding distances (NaN where a pair is missing)
+    '''
+    if distance_file.endswith('.npz'):
+        data = np.load(distance_file)
+        return list(data['samples']), data['enc'], data['emb']
+
+    enc_distances, emb_distances = get_sample_distances(distance_file)
+    samples = sorted(set(enc_distances.keys()).union(*[set(d.keys()) for d in enc_distances.values()]))
+    index = {sample: i for i, sample in enumerate(samples)}
+    enc = np.full((len(samples), len(samples)), np.nan)
+    emb = np.full((len(samples), len(samples)), np.nan)
+    for sampleA in enc_distances:
+        i = index[sampleA]
+        cols = [index[sampleB] for sampleB in enc_distances[sampleA]]
+        enc[i, cols] = list(enc_distances[sampleA].values())
+        emb[i, cols] = [emb_distances[sampleA][sampleB] for sampleB in enc_distances[sampleA]]
+    return samples, enc, emb
+
+def get_matrix_r2(enc, emb, block=1024):
+    '''
+    Calculate every sample's r^2 at once with row-wise centered dot products
+    @param enc: N x N encoding distances (NaN for missing pairs)
+    @param emb: N x N embedding distances (NaN for missing pairs)
+    @param block: number of rows computed together
+    @return: array of r^2 for each row (self pairs on the diagonal are ignored)
+    '''
+    num_rows = enc.shape[0]
+    r2 = np.empty(num_rows)
+    for start in range(0, num_rows, block):
+        x = np.array(enc[start:start + block], dtype=np.float64)
+        y = np.array(emb[start:start + block], dtype=np.float64)
+        mask = ~(np.isnan(x) | np.isnan(y))
+        rows = np.arange(x.shape[0])
+        diagonal = rows + start
+        mask[rows[diagonal < x.shape[1]], diagonal[diagonal < x.shape[1]]] = False
+        n = mask.sum(axis=1)
+        x = np.where(mask, x, 0)
+        y = np.where(mask, y, 0)
+        x -= (x.sum(axis=1) / n)[:, None]
+        y -= (y.sum(axis=1) / n)[:, None]
+        x[~mask] = 0
+        y[~mask] = 0
+        r = np.einsum('ij,ij->i', x, y) / np.sqrt(np.einsum('ij,ij->i', x, x) * np.einsum('ij,ij->i', y, y))
+        r2[start:start + block] = r ** 2
+    return r2
+
+def get_single_r2_matrix(distance_file):
+    '''
+    Matrix version of get_single_r2 for one distance file
+    @param distance_file: binary .dist.npz or text .dist file
+    @return: dictionary of sample: r^2
+    '''
+    samples, enc, emb = get_distance_matrices(distance_file)
+    return dict(zip(samples, get_matrix_r2(enc, emb)))
+
+def get_segments_r2(distance_files):
+    '''
+    Evaluate r^2 for a batch of segments (e.g. every segment of a chromosome)
+    @param distance_files: dictionary of segment index: distance file
+    @return: list of sample IDs, segments, samples x segments array of r^2 (NaN where a sample is missing)
+    '''
+    segment_r2 = {seg_idx: get_single_r2_matrix(distance_files[seg_idx]) for seg_idx in distance_files}
+    segments = sorted(segment_r2.keys())
+    samples = sorted(set().union(*[set(r2.keys()) for r2 in segment_r2.values()]))
+    r2 = np.full((len(samples), len(segments)), np.nan)
+    for j, seg_idx in enumerate(segments):
+        for i, sample in enumerate(samples):
+            if sample in segment_r2[seg_idx]:
+                r2[i, j] = segment_r2[seg_idx][sample]
+    return samples, segments, r2
+
+def read_colors(color_file):
+    colors = {}
+    with open(color_file, 'r') as f:
+        for line in f:
+            line = line.strip().split(',')
+            colors[line[0]] = line[1]
+    return colors
@@ -8,7 +8,10 @@ from scipy.stats import norm
 import sys
 
 sys.path.append(os.path.abspath('plotting/'))
+sys.path.append(os.path.abspath('src/'))
 import ancestry_helpers
+import compressed_io
+import parsed_cache
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -60,6 +63,7 @@ def get_num_meiosis(relationship):
                       'unrelated': 10,}
     return number_meiosis[relationship]
 
+@parsed_cache.cached()
 def read_decode_data(decode_data_file):
     '''
     Read file with decode data scores
@@ -84,6 +88,7 @@ def read_decode_data(decode_data_file):
     return decode_scores
 
 
+@parsed_cache.cached()
 def read_1kg_data(scores_file, population):
     '''
     Read file with 1kg data scores
@@ -91,7 +96,7 @@ def read_1kg_data(scores_file, population):
     @return: dictionary where key=number of meiosis, and value=list of scores
     '''
     population_scores = {}
-    with open(scores_file, 'r') as f:
+    with compressed_io.open_text(scores_file) as f:
         # read header
         header = f.readline().strip().split()
         for line in f:
@@ -1,13 +1,12 @@
 import argparse
-from collections import defaultdict
-import matplotlib.pyplot as plt
 import os
-import pandas as pd
-import seaborn as sns
 import sys
 
 sys.path.append(os.path.abspath('plotting/'))
 import ancestry_helpers
+from ancestry_data import (read_ancestry_group_scores, read_top_K, get_percent_in_top_k,
+                           get_pop_counts, get_population_percents, get_population_intervals,
+                           write_genosis_scores)
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -28,6 +27,12 @@ def parse_args():
     # Output
     parser.add_argument('--png_dist', help='Output png file with density plots', required=True)
     parser.add_argument('--png_k', help='Output png file with top k percents', required=True)
+    # Confidence intervals
+    parser.add_argument('--bootstrap', type=int, default=0,
+                        help='bootstrap resamples for top k confidence bands (0 for no bands)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the bands')
+    parser.add_argument('--seed', type=int, default=0, help='bootstrap seed')
+    parser.add_argument('--threads', type=int, default=None, help='bootstrap worker processes')
 
     return parser.parse_args()
 
@@ -38,183 +43,14 @@ def get_category_colors(colors, superpop):
         'outgroup': colors['outgroup']
     }
 
-def read_ancestry_group_scores(ancestry_group_scores_file):
-    '''
-    Read scores for superpop, subpop, and outpop labels.
-    @param ancestry_group_scores_file: path to scores file for 1KG data
-    @return: dictionary of scores for each superpop
-    '''
-    # superpop: category: [scores...]
-    scores = defaultdict(dict)
-    with open(ancestry_group_scores_file, 'r') as f:
-        header = f.readline().strip().split(',')
-        for line in f:
-            line = line.strip().split(',')
-            superpop = line[0]
-            category = line[1]
-            scores[superpop][category] = [float(x) for x in line[2].strip().split()]
-    return scores
-
-def read_top_K(top_k_file,
-               subpopulations,
-               header=True):
-    '''
-    Read top K scores and return top K samples, and populations
-    @param top_k_file: path top k scores
-    @param subpopulations: dictionary of subpopulations for each sample
-    @return: dictionary of top K samples and populations for each query
-    '''
-    top_K_samples = {}
-    top_K_subpopulations = {}
-    f = open(top_k_file, 'r')
-    if header:
-        f.readline()
-    for line in f:
-        line = line.strip().split()
-        query = line[0]
-        top_K_samples[query] = []
-        top_K_subpopulations[query] = []
-        matches = line[1:]
-        for match_score in matches:
-            match = match_score.split(',')[0]
-            top_K_samples[query].append(match)
-            try:
-                top_K_subpopulations[query].append(subpopulations[match])
-            except:
-                pass # header
-    return top_K_samples, top_K_subpopulations
-
-def get_percent_in_top_k(top_K_samples,
-                         subpopulations):
-    '''
-
-    @param top_K_samples: dictionary with key = sample and value = list of top k samples
-    @param top_K_subpopulations: dictionary with key = sample and value = list of top k subpopulations
-
-    @return: dictionary with key = sample and value = percent in top k that are subpop, superpop, outgroup
-    '''
-    sample_percents = {}
-    for query in top_K_samples.keys():
-        k = len(top_K_samples[query])
-        query_subpop = subpopulations[query]
-        query_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[query_subpop]
-        subpop_count = 0
-        superpop_count = 0
-        outgroup_count = 0
-        for match in top_K_samples[query]:
-            match_subpop = subpopulations[match]
-            match_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[match_subpop]
-            if query_subpop == match_subpop:
-                subpop_count += 1
-                superpop_count += 1
-            elif query_superpop == match_superpop:
-                superpop_count += 1
-            else:
-                outgroup_count += 1
-        sample_percents[query] = {'subpop': subpop_count / k,
-                                    'superpop': superpop_count / k,
-                                    'outgroup': outgroup_count / k}
-    return sample_percents
-
-
-def get_pop_counts(sample_percents,
-                   subpopulations):
-    '''
-    Get the counts of samples in the same subpopulation, superpopulation, and outgroup
-    @param sample_percents:
-    @return:
-    '''
-    counts = defaultdict(dict)
-    for sample in sample_percents.keys():
-        # get superpop of sample
-        sample_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[subpopulations[sample]]
-        for category in sample_percents[sample].keys():
-            if category not in counts[sample_superpop]:
-                counts[sample_superpop][category] = []
-            counts[sample_superpop][category].append(sample_percents[sample][category])
-    return counts
-
-
-
-
-def get_population_percents(top_K_subpopulations,
-                            k,
-                            subpopulations):
-    '''
-    Get the percent of matches in the same subpopulation and superpopulation
-    @param top_K_subpopulations:
-    @param k: k used for knn
-    @return:
-    '''
-    num_samples = {'AFR': 0,
-                     'AMR': 0,
-                     'EAS': 0,
-                     'EUR': 0,
-                     'SAS': 0}
-
-    # start with k as k, and move down to k = 1
-    superpop_counts = {'AFR': {k_i:0 for k_i in range(1,21)},
-                       'AMR': {k_i:0 for k_i in range(1,21)},
-                       'EAS': {k_i:0 for k_i in range(1,21)},
-                       'EUR': {k_i:0 for k_i in range(1,21)},
-                       'SAS': {k_i:0 for k_i in range(1,21)}}
-    subpop_counts = {'AFR': {k_i:0 for k_i in range(1,21)},
-                       'AMR': {k_i:0 for k_i in range(1,21)},
-                       'EAS': {k_i:0 for k_i in range(1,21)},
-                       'EUR': {k_i:0 for k_i in range(1,21)},
-                       'SAS': {k_i:0 for k_i in range(1,21)}}
-    cohort_size = k
-    while cohort_size >= 1:
-        for query in top_K_subpopulations.keys():
-            query_subpop = subpopulations[query]
-            query_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[query_subpop]
-            if cohort_size == k:
-                num_samples[query_superpop] += 1
-            match_index = 0
-            for match_subpop in top_K_subpopulations[query]:
-                if match_index >= cohort_size:
-                    continue
-                match_superpop = ancestry_helpers.SUB_SUPERPOPULATIONS[match_subpop]
-                if query_subpop == match_subpop:
-                    try:
-                        superpop_counts[query_superpop][cohort_size] += 1
-                        subpop_counts[query_superpop][cohort_size] += 1
-                    except KeyError:
-                        superpop_counts[query_superpop]
-                        subpop_counts[query_superpop][cohort_size] = 1
-                elif query_superpop == match_superpop:
-                    try:
-                        superpop_counts[query_superpop][cohort_size] += 1
-                    except KeyError:
-                        superpop_counts[query_superpop][cohort_size] = 1
-
-                match_index += 1
-
-        cohort_size -= 1
-
-    # get percents
-    superpop_percents = {'AFR': {p: superpop_counts['AFR'][p] / (p * num_samples['AFR']) for p in superpop_counts['AFR'].keys()},
-                         'AMR': {p: superpop_counts['AMR'][p] / (p * num_samples['AMR']) for p in superpop_counts['AMR'].keys()},
-                         'EAS': {p: superpop_counts['EAS'][p] / (p * num_samples['EAS']) for p in superpop_counts['EAS'].keys()},
-                         'EUR': {p: superpop_counts['EUR'][p] / (p * num_samples['EUR']) for p in superpop_counts['EUR'].keys()},
-                         'SAS': {p: superpop_counts['SAS'][p] / (p * num_samples['SAS']) for p in superpop_counts['SAS'].keys()}
-                         }
-    subpop_percents = {'AFR': {p: subpop_counts['AFR'][p] / (p * num_samples['AFR']) for p in subpop_counts['AFR'].keys()},
-                       'AMR': {p: subpop_counts['AMR'][p] / (p * num_samples['AMR']) for p in subpop_counts['AMR'].keys()},
-                       'EAS': {p: subpop_counts['EAS'][p] / (p * num_samples['EAS']) for p in subpop_counts['EAS'].keys()},
-                       'EUR': {p: subpop_counts['EUR'][p] / (p * num_samples['EUR']) for p in subpop_counts['EUR'].keys()},
-                       'SAS': {p: subpop_counts['SAS'][p] / (p * num_samples['SAS']) for p in subpop_counts['SAS'].keys()}
-                       }
-
-    return superpop_percents, subpop_percents
-
-
 def plot_ancestry_group_distributions(genosis_scores,
                                       dst_scores,
                                       pihat_scores,
                                       kinship_scores,
                                       colors,
                                       png_file):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
     alpha_value = 0.5
 
@@ -418,13 +254,31 @@ def plot_ancestry_group_distributions(genosis_scores,
     plt.tight_layout()
     combined_figure.savefig(png_file)
 
+def fill_intervals(ax, k_intervals, color, alpha=0.2):
+    '''
+    Confidence band of a top k line
+    @param k_intervals: {k: (low, high)}
+    '''
+    x = list(k_intervals.keys())
+    low = [k_intervals[k][0] for k in x]
+    high = [k_intervals[k][1] for k in x]
+    ax.fill_between(x, low, high, color=color, alpha=alpha, linewidth=0)
+
 def plot_ancestry_top_k(genosis_scores,
                         genosis_superpop_percents, genosis_subpop_percents,
                         dst_superpop_percents, dst_subpop_percents,
                         pihat_superpop_percents, pihat_subpop_percents,
                         kinship_superpop_percents, kinship_subpop_percents,
                         colors,
-                        png_file):
+                        png_file,
+                        intervals=None):
+    '''
+    @param intervals: optional {method: (superpop_intervals, subpop_intervals)} from get_population_intervals,
+                      for methods 'genosis', 'dst', 'pihat' and 'kinship', drawn as bands around the lines
+    '''
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
 
     # Create the combined figure
     combined_figure, axes = plt.subplots(5, 3, figsize=(15, 15), dpi=300)
@@ -666,6 +520,15 @@ def plot_ancestry_top_k(genosis_scores,
         # add text at top
         # plt.suptitle('Super Population Cohort Structure\n1KG Data (k=20)', fontsize=30, fontweight='bold')
 
+    if intervals is not None:
+        for j, method in enumerate(['dst', 'pihat', 'kinship']):
+            for i, superpop in enumerate(genosis_superpop_percents.keys()):
+                intermediate_colors = get_category_colors(colors, superpop)
+                for name in ['genosis', method]:
+                    superpop_intervals, subpop_intervals = intervals[name]
+                    fill_intervals(axes[i, j], superpop_intervals[superpop], intermediate_colors['superpop'])
+                    fill_intervals(axes[i, j], subpop_intervals[superpop], intermediate_colors['subpop'])
+
     # # for all legends, make two columns and remove frame
     # for col_j in range(3):
     #     axes[5, col_j].legend(ncol=2, frameon=False)
@@ -697,33 +560,6 @@ def plot_ancestry_top_k(genosis_scores,
     plt.tight_layout()
     combined_figure.savefig(png_file)
 
-def write_genosis_scores(genosis_superpop_percents,
-                         genosis_subpop_percents,
-                         output_file):
-    '''
-    Write the genosis scores to a file
-    @param genosis_subpop_percents:
-    @param genosis_superpop_percents:
-    @param output_file:
-    @return:
-    '''
-
-    # format: k, %superpop, %subpop, %output
-    o = open(output_file, 'w')
-    o.write('pop,k,%superpop,%subpop,%outgroup,k\n')
-
-    for pop in genosis_superpop_percents.keys():
-        for k in genosis_superpop_percents[pop].keys():
-            superpop_percent = genosis_superpop_percents[pop][k]
-            subpop_percent = genosis_subpop_percents[pop][k]
-            outgroup_percent = 1 - superpop_percent
-            # write to file
-            o.write(f'{pop},{k},{superpop_percent},{subpop_percent},{outgroup_percent}\n')
-
-    return 0
-
-
-
 def main():
     args = parse_args()
 
@@ -775,13 +611,31 @@ def main():
     #                      genosis_subpop_percents,
     #                      'data/1kg_top_hits/genosis_scores.csv')
 
+    intervals = None
+    if args.bootstrap > 0:
+        print('bootstrapping top k confidence intervals...')
+        intervals = {}
+        for name, top_k_subpopulations in [('genosis', genosis_top_k_subpopulations),
+                                           ('dst', dst_top_k_subpopulations),
+                                           ('pihat', pihat_top_k_subpopulations),
+                                           ('kinship', kinship_top_k_subpopulations)]:
+            intervals[name] = get_population_intervals(top_k_subpopulations,
+                                                       int(args.k),
+                                                       subpopulations,
+                                                       confidence=args.confidence,
+                                                       num_resamples=args.bootstrap,
+                                                       seed=args.seed,
+                                                       threads=args.threads)
+        print('done...')
+
     plot_ancestry_top_k(genosis_group_scores,
                         genosis_superpop_percents, genosis_subpop_percents,
                         dst_superpop_percents, dst_subpop_percents,
                         pihat_superpop_percents, pihat_subpop_percents,
                         kinship_superpop_percents, kinship_subpop_percents,
                         colors,
-                        args.png_k)
+                        args.png_k,
+                        intervals)
 
 if __name__ == '__main__':
     main()
@@ -10,7 +10,9 @@ import seaborn as sns
 import sys
 
 sys.path.append(os.path.abspath('plotting/'))
+sys.path.append(os.path.abspath('src/'))
 import ancestry_helpers
+import compressed_io
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -52,7 +54,7 @@ def read_subpop_counts_old(subpop_counts_file):
     '''
     ## query_subpop	match_subpop,count...
     subpop_counts = defaultdict(dict)
-    f = open(subpop_counts_file, 'r')
+    f = compressed_io.open_text(subpop_counts_file)
     f.readline()
     for line in f:
         line = line.strip().split()
@@ -72,7 +74,7 @@ def read_subpop_counts(subpop_counts_file,
     '''
     # query_subpop	match_subpop,count...
     subpop_counts = defaultdict(dict)
-    f = open(subpop_counts_file, 'r')
+    f = compressed_io.open_text(subpop_counts_file)
     if header:
         f.readline()
     for line in f:
@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+
+import numpy as np
+
+# Bootstrap confidence intervals for top K hit rates.
+# The hits of every query are first reduced to a (query x rank) category matrix
+# (SUBPOP: match in the query's subpopulation, SUPERPOP: in its superpopulation only, OUTPOP: neither),
+# and from it a (query x k) matrix of the fraction of the first k hits that are in the query's group.
+# The mean hit rate of a population at every k is then the mean of its rows, and one bootstrap resample
+# is the mean of n rows drawn with replacement. A resample is an integer index array into the rows,
+# turned into row counts with one bincount, so a chunk of resamples for every k is a single
+# (resamples x n) @ (n x k) product. Chunks run in a process pool, each with its own child of one
+# SeedSequence, so the intervals only depend on the seed and not on the number of processes.
+
+SUBPOP = 2
+SUPERPOP = 1
+OUTPOP = 0
+MISSING = -1
+
+def get_categories(query_subpops, match_subpops, k, sub_to_super):
+    '''
+    (query x rank) category matrix
+    @param query_subpops: subpopulation of every query
+    @param match_subpops: for every query, the subpopulations of its matches in rank order
+    @param k: number of ranks kept
+    @param sub_to_super: subpopulation -> superpopulation
+    @return: queries x k int8 array, MISSING where a query has fewer than k matches
+    '''
+    categories = np.full((len(query_subpops), k), MISSING, dtype=np.int8)
+    for i, (query_subpop, matches) in enumerate(zip(query_subpops, match_subpops)):
+        query_superpop = sub_to_super[query_subpop]
+        for j, match_subpop in enumerate(matches[:k]):
+            if match_subpop == query_subpop:
+                categories[i, j] = SUBPOP
+            elif sub_to_super[match_subpop] == query_superpop:
+                categories[i, j] = SUPERPOP
+            else:
+                categories[i, j] = OUTPOP
+    return categories
+
+def get_hit_rates(categories, level, skip_missing=False):
+    '''
+    Fraction of the first k matches of every query at or above a category level, for every k
+    @param level: SUBPOP or SUPERPOP (SUBPOP matches are in the superpopulation too)
+    @param skip_missing: NaN where the query has fewer than k matches (otherwise they count as misses)
+    @return: queries x k float array
+    '''
+    rates = np.cumsum(categories >= level, axis=1) / np.arange(1, categories.shape[1] + 1)
+    if skip_missing:
+        rates[categories == MISSING] = np.nan
+    return rates
+
+def resample_means(values, num_resamples, rng):
+    '''
+    Means of bootstrap resamples of the rows of values, for every column (NaNs are left out)
+    @return: num_resamples x columns float array
+    '''
+    n = len(values)
+    if n == 0:
+        return np.full((num_resamples, values.shape[1]), np.nan)
+    rows = rng.integers(0, n, size=(num_resamples, n))
+    # times every row is drawn in every resample
+    weights = np.bincount((rows + n * np.arange(num_resamples)[:, None]).ravel(),
+                          minlength=num_resamples * n).reshape(num_resamples, n).astype(np.float64)
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(present, values, 0)) / (weights @ present)
+
+def resample_chunk(args):
+    '''
+    One chunk of resamples for every group, with the chunk's own random generator
+    @param args: ({group: rows x k values}, resamples in the chunk, SeedSequence of the chunk)
+    @return: {group: resamples x k means}
+    '''
+    group_values, num_resamples, seed_sequence = args
+    rng = np.random.default_rng(seed_sequence)
+    # groups in a fixed order so the same seed gives the same draws
+    return {group: resample_means(group_values[group], num_resamples, rng) for group in sorted(group_values)}
+
+def bootstrap(group_values, num_resamples=1000, seed=0, chunk_size=100, threads=None):
+    '''
+    Bootstrap means of every group, resampling the rows of each group independently
+    @param group_values: {group: rows x k values}, a row per query
+    @param chunk_size: resamples per task
+    @param threads: worker processes (1 runs in this process)
+    @return: {group: num_resamples x k means}
+    '''
+    group_values = {group: np.asarray(values, dtype=np.float64) for group, values in group_values.items()}
+    chunk_sizes = [min(chunk_size, num_resamples - start) for start in range(0, num_resamples, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [(group_values, size, seed_sequence) for size, seed_sequence in zip(chunk_sizes, seed_sequences)]
+    if threads == 1 or len(tasks) <= 1:
+        chunks = [resample_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            chunks = list(executor.map(resample_chunk, tasks))
+    return {group: np.concatenate([chunk[group] for chunk in chunks]) for group in group_values}
+
+def get_intervals(group_values, confidence=0.95, num_resamples=1000, seed=0, chunk_size=100, threads=None):
+    '''
+    Percentile bootstrap confidence interval of the mean of every group at every k
+    @param group_values: {group: rows x k values}
+    @param confidence: central fraction of the resampled means inside the interval
+    @return: {group: (k lows, k highs)}
+    '''
+    means = bootstrap(group_values, num_resamples, seed, chunk_size, threads)
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for group, group_means in means.items():
+        with warnings.catch_warnings():
+            # k with no values at all (an empty group) is NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanquantile(group_means, [tail, 1 - tail], axis=0)
+        intervals[group] = (low, high)
+    return intervals
@@ -0,0 +1,116 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+
+# Cache of parsed input files shared by the plotting scripts.
+# A parser decorated with @cached(version) is keyed by (parser, version, path, size, mtime, other args);
+# results are pickled under GENOSIS_CACHE_DIR (default ~/.cache/genosis) and also kept in memory for
+# repeated loads within one run. Bump the version when a parser's output changes.
+# The cache is on by default only for the scripts in plotting/; command line tools elsewhere (src/, benchmarks/)
+# that import a decorated parser read the file every time unless GENOSIS_CACHE=1.
+#   GENOSIS_CACHE=0|1             turn the cache off or on for any script
+#   GENOSIS_CACHE_DIR=path        cache directory
+#   GENOSIS_CACHE_MAX_MB=2048     least recently used entries are removed above this total size
+
+CACHE_DIR = os.environ.get('GENOSIS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'genosis'))
+MAX_BYTES = int(float(os.environ.get('GENOSIS_CACHE_MAX_MB', 2048)) * 1024 * 1024)
+
+# in-process memo: key -> pickled result (loads hands every caller its own copy)
+MEMO = {}
+
+PLOTTING_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def enabled():
+    setting = os.environ.get('GENOSIS_CACHE')
+    if setting is not None:
+        return setting != '0'
+    main_script = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else ''
+    return os.path.dirname(main_script) == PLOTTING_DIR
+
+def get_key(func, version, path, args, kwargs):
+    stat = os.stat(path)
+    sha = hashlib.sha1()
+    sha.update(f'{func.__module__}.{func.__qualname__}:{version}'.encode())
+    sha.update(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    sha.update(pickle.dumps((args, sorted(kwargs.items()))))
+    return sha.hexdigest()
+
+def evict(cache_dir, max_bytes):
+    '''
+    remove least recently used entries until the cache fits in max_bytes
+    '''
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith('.pkl'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_name))
+    total = sum(size for mtime, size, file_name in entries)
+    for mtime, size, file_name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def load(key):
+    if key in MEMO:
+        return pickle.loads(MEMO[key])
+    cache_file = os.path.join(CACHE_DIR, key + '.pkl')
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        result = pickle.loads(data)
+    except Exception:
+        # partial or stale entry: parse again
+        return None
+    # mark as recently used
+    os.utime(cache_file)
+    MEMO[key] = data
+    return result
+
+def store(key, result):
+    try:
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return
+    MEMO[key] = data
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_file = os.path.join(CACHE_DIR, key + '.pkl')
+    tmp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, cache_file)
+    evict(CACHE_DIR, MAX_BYTES)
+
+def cached(version=1):
+    '''
+    Cache a parser whose first argument is the path of the file it reads
+    @param version: parser version, part of the key
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(path, *args, **kwargs):
+            if not enabled() or path is None or not os.path.isfile(path):
+                return func(path, *args, **kwargs)
+            try:
+                key = get_key(func, version, path, args, kwargs)
+            except (pickle.PicklingError, AttributeError, TypeError):
+                return func(path, *args, **kwargs)
+            result = load(key)
+            if result is None:
+                result = func(path, *args, **kwargs)
+                store(key, result)
+            return result
+        return wrapper
+    return decorator
@@ -1,5 +1,6 @@
 import argparse
 import ancestry_helpers as ah
+import hit_rate_bootstrap as hb
 import violin_plot as vp
 import numpy as np
 import matplotlib.pyplot as plt
@@ -14,43 +15,36 @@ def parse_args():
     parser.add_argument("--width",  type=int, default=10, help="figure width")
     parser.add_argument("--y_min",  type=float, help="min y-axis value")
     parser.add_argument("--y_max",  type=float, help="max y-axis value")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="bootstrap resamples for confidence bands (0 for no bands)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the bands")
+    parser.add_argument("--seed", type=int, default=0, help="bootstrap seed")
+    parser.add_argument("--threads", type=int, help="bootstrap worker processes")
     return parser.parse_args()
 
 def get_hit_rates(sample_knn, sample_subpopulations, sub_to_super):
+    '''
+    @return: {subpopulation or superpopulation: samples x K array with the fraction of the first k hits
+              of every sample of that population in its population, NaN past the sample's last hit}
+    '''
+    samples = list(sample_knn.keys())
+    subpops = [sample_subpopulations[sample] for sample in samples]
+    k = max(len(hits) for hits in sample_knn.values())
+    categories = hb.get_categories(subpops,
+                                   [[sample_subpopulations[hit] for hit, score in sample_knn[sample]]
+                                    for sample in samples],
+                                   k,
+                                   sub_to_super)
+    subpop_rates = hb.get_hit_rates(categories, hb.SUBPOP, skip_missing=True)
+    suppop_rates = hb.get_hit_rates(categories, hb.SUPERPOP, skip_missing=True)
+
+    subpops = np.array(subpops)
+    suppops = np.array([sub_to_super[subpop] for subpop in subpops])
     hit_rates = {}
-    for sample in sample_knn:
-        s_subpop = sample_subpopulations[sample]
-        s_suppop = sub_to_super[sample_subpopulations[sample]]
-
-        hits = sorted(sample_knn[sample], key=lambda x: x[1], reverse=True)
-
-        if s_subpop not in hit_rates:
-            hit_rates[s_subpop] = [[] for h in hits]
-
-        if s_suppop not in hit_rates:
-            hit_rates[s_suppop] = [[] for h in hits]
-
-        i = 1
-        in_subpop = 0
-        in_suppop = 0
-        subpop_rates = []
-        suppop_rates = []
-        for hit, score in sample_knn[sample]:
-            h_subpop = sample_subpopulations[hit]
-            h_suppop = sub_to_super[sample_subpopulations[hit]]
-            if h_subpop == s_subpop:
-                in_subpop += 1
-            if h_suppop in s_suppop:
-                in_suppop += 1
-            #else:
-                #print(sample, s_suppop, hit, h_suppop)
-            subpop_rates.append(in_subpop/i)
-            suppop_rates.append(in_suppop/i)
-            i+=1
-
-        for j in range(len(subpop_rates)):
-            hit_rates[s_subpop][j].append(subpop_rates[j])
-            hit_rates[s_suppop][j].append(suppop_rates[j])
+    for subpop in np.unique(subpops):
+        hit_rates[subpop] = subpop_rates[subpops == subpop]
+    for suppop in np.unique(suppops):
+        hit_rates[suppop] = suppop_rates[suppops == suppop]
     return hit_rates
 
 def main():
@@ -87,11 +81,24 @@ def main():
 
 
     colors = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red', 'tab:purple']
+    if args.bootstrap > 0:
+        knn_intervals = hb.get_intervals({pop: knn_rates[pop] for pop in spops},
+                                         confidence=args.confidence,
+                                         num_resamples=args.bootstrap,
+                                         seed=args.seed,
+                                         threads=args.threads)
+        plink_intervals = hb.get_intervals({pop: plink_rates[pop] for pop in spops},
+                                           confidence=args.confidence,
+                                           num_resamples=args.bootstrap,
+                                           seed=args.seed,
+                                           threads=args.threads)
+        for pop in spops:
+            for low, high in [knn_intervals[pop], plink_intervals[pop]]:
+                ax.fill_between(range(len(low)), low, high, color=spop_colors[pop], alpha=0.2, linewidth=0)
+
     color_i = 0
     for pop in spops:
-        rates = []
-        for i in range(len(knn_rates[pop])):
-            rates.append(np.mean(knn_rates[pop][i]))
+        rates = np.nanmean(knn_rates[pop], axis=0)
         ax.plot(rates, label= pop, c=spop_colors[pop])
         color_i += 1
 
@@ -102,9 +109,7 @@ def main():
 
     color_i = 0
     for pop in spops:
-        rates = []
-        for i in range(len(plink_rates[pop])):
-           rates.append(np.mean(plink_rates[pop][i]))
+        rates = np.nanmean(plink_rates[pop], axis=0)
         ax.plot(rates, label= 'Plink:' + pop,c=spop_colors[pop], linestyle='--')
 
         color_i += 1
@@ -4,7 +4,10 @@ import matplotlib.pyplot as plt
 import random
 
 from plotting import ancestry_helpers
+from plotting import parsed_cache
+from src import compressed_io
 from src import get_relations
+from src import write_trio_scores
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -18,11 +21,12 @@ def get_args():
     return parser.parse_args()
 
 SUB_SUPERPOPULATIONS = ancestry_helpers.SUB_SUPERPOPULATIONS
+@parsed_cache.cached()
 def get_dist(dist_file):
     dist_dict = defaultdict(dict)
     label_dict = defaultdict(dict)
 
-    with open(dist_file, 'r') as f:
+    with compressed_io.open_text(dist_file) as f:
         for line in f:
             line = line.strip().split(' ')
             try:
@@ -34,10 +38,11 @@ def get_dist(dist_file):
 
     return dist_dict, label_dict
 
+@parsed_cache.cached()
 def get_hits(hits_file):
     hits_dict = defaultdict(dict)
 
-    with open(hits_file, 'r') as f:
+    with compressed_io.open_text(hits_file) as f:
         for line in f:
             line = line.strip().split()
             query = line[0]
@@ -57,12 +62,14 @@ def combine_dicts(hits_dict, dist_dict):
 
     for query in hits_dict:
         for match in hits_dict[query]:
-            if dist_dict[query][match] == 0:
+            # sparse label files (get_relations --sparse) leave out unconnected pairs, -1 in dense files
+            dist = dist_dict.get(query, {}).get(match, -1)
+            if dist == 0:
                 if match != query:
-                    print(query, match, dist_dict[query][match], hits_dict[query][match])
+                    print(query, match, dist, hits_dict[query][match])
                 if hits_dict[query][match] < 4000:
-                    print(query, match, dist_dict[query][match], hits_dict[query][match])
-            combined_dict[query].update({match: (hits_dict[query][match], dist_dict[query][match])})
+                    print(query, match, dist, hits_dict[query][match])
+            combined_dict[query].update({match: (hits_dict[query][match], dist)})
 
     return combined_dict
 
@@ -102,11 +109,8 @@ def plot_1KG_trios(hits_dict, dist_dict, label_dict, pop, color, subpopulations,
     for query in samples:
         for match in hits_dict[query]:
             # dist = dist_dict[query][match]
-            try:
-                label = label_dict[query][match]
-                if label == 'outpop':
-                    label = SUB_SUPERPOPULATIONS[subpopulations[match]]
-            except KeyError:
+            label = write_trio_scores.get_relationship_label(label_dict, query, match, subpopulations)
+            if label == 'outpop':
                 label = SUB_SUPERPOPULATIONS[subpopulations[match]]
 
             try:
@@ -198,7 +202,7 @@ def plot_1KG_trios(hits_dict, dist_dict, label_dict, pop, color, subpopulations,
 def main():
     args = get_args()
     pop = args.pop
-    dist_dict, label_dict = get_dist(args.dist + '_' + pop + '.txt')
+    dist_dict, label_dict = get_dist(compressed_io.resolve(args.dist + '_' + pop + '.txt'))
     hits_dict = get_hits(args.hits)
     subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
     samples = get_relations.get_samples(args.ped, pop, subpopulations)
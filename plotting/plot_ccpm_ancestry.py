@@ -8,6 +8,9 @@ import pandas as pd
 import seaborn as sns
 import sys
 
+sys.path.append(os.path.abspath('src/'))
+import compressed_io
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--ancestry', help='ccpm ancestry labels', required=True)
@@ -43,7 +46,7 @@ def read_ccpm_ancestries(chrm_ancestry_file,
     @return: dictionary with ccpm_id, as key and match ids as values
     '''
 
-    with open(chrm_ancestry_file, 'r') as f:
+    with compressed_io.open_text(chrm_ancestry_file) as f:
         # Skip header
         f.readline()
         for line in f:
@@ -93,7 +96,7 @@ def read_ccpm_genosis_scores(chrm_genosis_file,
     @param ccpm_genosis_scores: dictionary with query id as key and match id and genosis score as values
     @return: dictionary with query id as key and match id and genosis score as values
     '''
-    with open(chrm_genosis_file, 'r') as f:
+    with compressed_io.open_text(chrm_genosis_file) as f:
         # Skip header
         f.readline()
         for line in f:
@@ -544,12 +547,17 @@ def main():
         print(f'{a}: {list(ccpm_ancestry.values()).count(a)}')
 
     for chrm_file in os.listdir(ancestry_dir):
-        if chrm_file.endswith('_anc.txt'):
+        # also .gz / .zst outputs of write_ccpm_ancestry.py --compress
+        if compressed_io.get_compression(chrm_file) is not None:
+            chrm_name = os.path.splitext(chrm_file)[0]
+        else:
+            chrm_name = chrm_file
+        if chrm_name.endswith('_anc.txt'):
             print('Reading ccpm ancestries for {}'.format(chrm_file))
             chrm_ancestry_file = os.path.join(ancestry_dir, chrm_file)
             ccpm_ancestry_data = read_ccpm_ancestries(chrm_ancestry_file,
                                                 ccpm_ancestry_data)
-        elif chrm_file.endswith('_scores.txt'):
+        elif chrm_name.endswith('_scores.txt'):
             print('Reading ccpm scores for {}'.format(chrm_file))
             chrm_genosis_file = os.path.join(ancestry_dir, chrm_file)
             ccpm_genosis_scores = read_ccpm_genosis_scores(chrm_genosis_file,
@@ -1,15 +1,17 @@
 import argparse
 from collections import defaultdict
-import matplotlib.pyplot as plt
 import os
+import sys
 
 import numpy as np
-import seaborn as sns
-import scipy.stats as stats
-import statistics
-import pandas as pd
 
 from plotting import ancestry_helpers
+from plotting.density_data import (get_sample_densities, get_segment_densities, get_sample_distances,
+                                   get_single_r2, get_distance_matrices, get_matrix_r2,
+                                   get_single_r2_matrix, get_segments_r2, read_colors)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import haplotype_ids
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -21,76 +23,20 @@ def get_args():
 
     return parser.parse_args()
 
-def get_sample_densities(chrm_dir, density_file, sample_densities):
-    segment = density_file.split('.')[1].replace('segment', '')
-    seg_idx = int(segment)
-    with open(chrm_dir + density_file, 'r') as f:
-        for line in f:
-            line = line.strip().split('\t')
-            sample = line[0]
-            density = float(line[1])
-            # if density < 100:
-            #     print(sample, density, segment)
-            sample_densities[sample][seg_idx] = density
-    return sample_densities
-
-def get_segment_densities(chrm_dir, density_file, segment_densities):
-    segment_idx = density_file.split('.')[1].replace('segment', '')
-    with open(chrm_dir + density_file, 'r') as f:
-        for line in f:
-            line = line.strip().split('\t')
-            sample = line[0]
-            density = float(line[1])
-            segment_densities[segment_idx].append(density)
-    return segment_densities
-
-def get_sample_distances(distance_file):
-    enc_distances = defaultdict(dict)
-    emb_distances = defaultdict(dict)
-    with open(distance_file, 'r') as f:
-        header = f.readline()
-        for line in f:
-            line = line.strip().split()
-            sampleA = line[0]
-            sampleB = line[1]
-            enc_dist = float(line[2])
-            emb_dist = float(line[3])
-            enc_distances[sampleA][sampleB] = enc_dist
-            emb_distances[sampleA][sampleB] = emb_dist
-    return enc_distances, emb_distances
-
-def get_single_r2(enc_distances, emb_distances):
-    '''
-    Calculate the r^2 value for a single sample
-    @param enc_distances:
-    @param emb_distances:
-    @return:
-    '''
-
-    sample_r2 = {}
-    # compare one sample to all others and get the single samples r^2 value
-    for sampleA in enc_distances:
-        encoding_distances = []
-        embedding_distances = []
-        for sampleB in enc_distances[sampleA]:
-            encoding_distances.append(enc_distances[sampleA][sampleB])
-            embedding_distances.append(emb_distances[sampleA][sampleB])
-
-        r2 = stats.pearsonr(encoding_distances, embedding_distances)[0] ** 2
-        sample_r2[sampleA] = r2
-
-    return sample_r2
-
 def plot_density_by_ancestry(sample_densities,
                              sample_subpopulations,
                              sub_to_super,
                              colors,
                              chrm,
                              out):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import statistics
 
     # one subplot per superpopulation
     superpops = sorted(set(sub_to_super.values()))
     num_superpops = len(superpops)
+    ids, hap_densities = haplotype_ids.get_haplotype_matrix(sample_densities)
 
     # title = ('Density by Ancestry'
     #          '\nChromosome ' + chrm + ', segments (0,' + str(len(sample_densities['HG00096_0'])) + ')')
@@ -104,16 +50,10 @@ def plot_density_by_ancestry(sample_densities,
     for superpop, ax in zip(superpops, axes):
         # get sample IDs for this superpopulation
         color = colors[superpop]
-        pop_densities = []
-        samples = [sample for sample, subpop in sample_subpopulations.items() if sub_to_super[subpop] == superpop]
-        for sample in samples:
-            # haplotypes
-            sample_0 = sample + '_0'
-            sample_1 = sample + '_1'
-            pop_densities.extend(sample_densities[sample_0])
-            pop_densities.extend(sample_densities[sample_1])
-            # if 0 in sample_densities[sample_0] or 0 in sample_densities[sample_1]:
-            #     print(superpop, sample_0, sample_1)
+        samples = [sample for sample, subpop in sample_subpopulations.items()
+                   if sub_to_super[subpop] == superpop and sample in ids.index]
+        # rows of both haplotypes of every sample
+        pop_densities = hap_densities[ids.haplotype_codes(samples)].ravel().tolist()
 
         # plot densities with histograms
         sns.histplot(pop_densities,
@@ -157,12 +97,21 @@ def plot_density_by_segment(segment_densities,
                             colors,
                             chrm,
                             out):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+    import statistics
 
 
     superpops = sorted(set(sub_to_super.values()))
     num_superpops = len(superpops)
 
     sorted_segments = sorted(segment_densities.keys(), key=lambda x: int(x))
+    ids, hap_densities = haplotype_ids.get_haplotype_matrix(sample_densities)
+    # rows of both haplotypes of every sample, per superpopulation
+    pop_codes = {superpop: ids.haplotype_codes([sample for sample, subpop in sample_subpopulations.items()
+                                                if sub_to_super[subpop] == superpop and sample in ids.index])
+                 for superpop in superpops}
 
     # heatmap where x is segment idx and y is superpop
     print('Plotting heatmap of median density by segment...', chrm)
@@ -171,14 +120,7 @@ def plot_density_by_segment(segment_densities,
     for segment in sorted_segments:
         densities = segment_densities[segment]
         for superpop in superpops:
-            pop_densities = []
-            samples = [sample for sample, subpop in sample_subpopulations.items() if sub_to_super[subpop] == superpop]
-            for sample in samples:
-                # haplotypes
-                sample_0 = sample + '_0'
-                sample_1 = sample + '_1'
-                pop_densities.append(sample_densities[sample_0][int(segment)])
-                pop_densities.append(sample_densities[sample_1][int(segment)])
+            pop_densities = hap_densities[pop_codes[superpop], int(segment)].tolist()
 
             # get median density for this segment
             median_density = statistics.median(pop_densities)
@@ -257,14 +199,7 @@ def plot_density_by_segment(segment_densities,
         other_densities = []
         median_densities = []
         for segment in sorted_segments:
-            pop_densities = []
-            samples = [sample for sample, subpop in sample_subpopulations.items() if sub_to_super[subpop] == superpop]
-            for sample in samples:
-                # haplotypes
-                sample_0 = sample + '_0'
-                sample_1 = sample + '_1'
-                pop_densities.append(sample_densities[sample_0][int(segment)])
-                pop_densities.append(sample_densities[sample_1][int(segment)])
+            pop_densities = hap_densities[pop_codes[superpop], int(segment)].tolist()
 
             # get mode density for this segment
             other_density = statistics.mode(pop_densities)
@@ -296,6 +231,9 @@ def plot_encoding_embedding(good_segment_enc, good_segment_emb,
                             colors,
                             chrm,
                             out):
+    import matplotlib.pyplot as plt
+    import scipy.stats as stats
+
     # plot encoding vs. embedding distances by ancestry
     print('Plotting encoding vs. embedding distances by ancestry...', chrm)
     superpops = sorted(set(sub_to_super.values()))
@@ -373,6 +311,8 @@ def plot_eur_afr_density(sample_densities,
                          sub_to_super,
                          chrm,
                          out):
+    import matplotlib.pyplot as plt
+    import statistics
 
     # x-axis: EUR density
     # y-axis: AFR density
@@ -451,6 +391,8 @@ def plot_r2_density(good_segment_r2,
                     colors,
                     chrm,
                     out):
+    import matplotlib.pyplot as plt
+
     # plot r2 vs. density by ancestry
     # x = density
     # y = r2
@@ -507,14 +449,6 @@ def plot_r2_density(good_segment_r2,
         plt.close()
 
 
-def read_colors(color_file):
-    colors = {}
-    with open(color_file, 'r') as f:
-        for line in f:
-            line = line.strip().split(',')
-            colors[line[0]] = line[1]
-    return colors
-
 def main():
     args = get_args()
     ancestry_file = args.ancestry_file
@@ -561,10 +495,7 @@ def main():
                 seg_idx = int(distance_file.split('.')[1].replace('segment', ''))
                 if seg_idx not in good_segments:
                     continue
-                enc_distances, emb_distances = get_sample_distances(dist_chrm_dir + distance_file)
-                sample_r2 = get_single_r2(enc_distances, emb_distances)
-                good_segment_enc[seg_idx] = enc_distances
-                good_segment_emb[seg_idx] = emb_distances
+                sample_r2 = get_single_r2_matrix(dist_chrm_dir + distance_file)
                 good_segment_r2[seg_idx] = sample_r2
 
             else:
@@ -1,57 +1,42 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import plotting.ancestry_helpers
-
-def get_percent_in_pop(top, pop, subpopulations, k_subset):
-    subpop_percents = []
-    superpop_percents = []
-    outpop_percents = []
-
-    for query in top:
-        subpop = 0
-        superpop = 0
-        outpop = 0
-        query_subpop = subpopulations[query]
-        query_superpop = plotting.ancestry_helpers.SUB_SUPERPOPULATIONS[query_subpop]
-        if query_superpop == pop:
-            # check matches in top k_subset
-            for i in range(k_subset):
-                match, score = top[query][i]
-                match_subpop = subpopulations[match]
-                match_superpop = plotting.ancestry_helpers.SUB_SUPERPOPULATIONS[match_subpop]
-                if match_subpop == query_subpop:
-                    subpop += 1
-                    superpop += 1
-                elif match_superpop == query_superpop:
-                    superpop += 1
-                else:
-                    outpop += 1
-        else:
-            # skip this query
-            continue
-        subpop_percents.append(subpop/k_subset)
-        superpop_percents.append(superpop/k_subset)
-        outpop_percents.append(outpop/k_subset)
-    return np.mean(subpop_percents), np.mean(superpop_percents), np.mean(outpop_percents)
-
-
+import plotting.hit_rate_bootstrap
+
+def get_rates(top, pop, k, subpopulations):
+    '''
+    Fraction of the first k matches in the query's subpopulation, superpopulation and neither,
+    for every query of the superpopulation pop and every k
+    @return: subpop, superpop, outpop rates, each queries x k
+    '''
+    queries = [query for query in top
+               if plotting.ancestry_helpers.SUB_SUPERPOPULATIONS[subpopulations[query]] == pop]
+    categories = plotting.hit_rate_bootstrap.get_categories([subpopulations[query] for query in queries],
+                                                            [[subpopulations[match] for match, score in top[query]]
+                                                             for query in queries],
+                                                            k,
+                                                            plotting.ancestry_helpers.SUB_SUPERPOPULATIONS)
+    outpop_rates = np.cumsum(categories == plotting.hit_rate_bootstrap.OUTPOP, axis=1) / np.arange(1, k + 1)
+    return (plotting.hit_rate_bootstrap.get_hit_rates(categories, plotting.hit_rate_bootstrap.SUBPOP),
+            plotting.hit_rate_bootstrap.get_hit_rates(categories, plotting.hit_rate_bootstrap.SUPERPOP),
+            outpop_rates)
 
 def get_y_values(top, pop, k, subpopulations):
-    subpop_y = []
-    superpop_y = []
-    outpop_y = []
-    for i in range(1, k+1):
-        # get percent in population for k = i
-        percent_sub, percent_super, percent_out = get_percent_in_pop(top, pop, subpopulations, i)
-        subpop_y.append(percent_sub)
-        superpop_y.append(percent_super)
-        outpop_y.append(percent_out)
-
-    return subpop_y, superpop_y, outpop_y
-
-
-
-
+    subpop_rates, superpop_rates, outpop_rates = get_rates(top, pop, k, subpopulations)
+    return (list(subpop_rates.mean(axis=0)),
+            list(superpop_rates.mean(axis=0)),
+            list(outpop_rates.mean(axis=0)))
+
+def get_y_intervals(top, pop, k, subpopulations, num_resamples, seed=0):
+    '''
+    Bootstrap confidence intervals of get_y_values (subpop and superpop)
+    @return: (subpop lows, subpop highs), (superpop lows, superpop highs)
+    '''
+    subpop_rates, superpop_rates, outpop_rates = get_rates(top, pop, k, subpopulations)
+    intervals = plotting.hit_rate_bootstrap.get_intervals({'subpop': subpop_rates, 'superpop': superpop_rates},
+                                                          num_resamples=num_resamples,
+                                                          seed=seed)
+    return intervals['subpop'], intervals['superpop']
 
 def plot_plink_genosis_compare(population_file,
                                genosis_top,
@@ -59,7 +44,11 @@ def plot_plink_genosis_compare(population_file,
                                plink_pihat,
                                plink_kin,
                                pop, k,
-                               color):
+                               color,
+                               num_resamples=0):
+    '''
+    @param num_resamples: bootstrap resamples for 95% confidence bands (0 for no bands)
+    '''
 
     subpopulations = plotting.ancestry_helpers.get_subpopulations(population_file)
 
@@ -123,6 +112,14 @@ def plot_plink_genosis_compare(population_file,
     axs[2].spines['top'].set_visible(False)
     axs[2].spines['right'].set_visible(False)
 
+    if num_resamples > 0:
+        genosis_intervals = get_y_intervals(genosis_top, pop, k, subpopulations, num_resamples)
+        for ax, plink_top in zip(axs, [plink_dst, plink_pihat, plink_kin]):
+            plink_intervals = get_y_intervals(plink_top, pop, k, subpopulations, num_resamples)
+            for intervals in [genosis_intervals, plink_intervals]:
+                for (low, high), band_color in zip(intervals, [subpop_color, superpop_color]):
+                    ax.fill_between(x, low, high, color=band_color, alpha=0.2, linewidth=0)
+
     # one legend for all subplots
     # axs[0].legend()
     # tight layout
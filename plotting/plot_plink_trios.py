@@ -5,6 +5,7 @@ import numpy as np
 import random
 
 from plotting import ancestry_helpers
+from src import compressed_io
 from src import get_relations
 
 def get_args():
@@ -23,7 +24,7 @@ def get_dist(dist_file):
     dist_dict = defaultdict(dict)
     label_dict = defaultdict(dict)
 
-    with open(dist_file, 'r') as f:
+    with compressed_io.open_text(dist_file) as f:
         for line in f:
             line = line.strip().split(' ')
             try:
@@ -37,7 +38,7 @@ def get_dist(dist_file):
 
 def get_plink_scores(plink_file):
     plink_dict = defaultdict(dict)
-    f = open(plink_file, 'r')
+    f = compressed_io.open_text(plink_file)
     header = f.readline().strip().split('\t')
     for line in f:
         line = line.strip().split()
@@ -185,7 +186,7 @@ def plot_1KG_trios(plink_dict, dist_dict, label_dict, pop, color, subpopulations
 def main():
     args = get_args()
     pop = args.pop
-    dist_dict, label_dict = get_dist(args.dist + '_' + pop + '.txt')
+    dist_dict, label_dict = get_dist(compressed_io.resolve(args.dist + '_' + pop + '.txt'))
     plink_dict = get_plink_scores(args.plink)
     subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
     samples = get_relations.get_samples(args.ped, pop, subpopulations)
@@ -4,12 +4,16 @@ import glob
 import sys
 import random
 
+import numpy as np
+
+import binned_plots
+
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-i', type=str, help='Path to input file')
     parser.add_argument('-o', type=str, help='Path to output file')
     parser.add_argument('-F', type=int, help='Number of files')
-    parser.add_argument('-N', type=int, help='Size of the sample')
+    parser.add_argument('-N', type=int, help='Size of the sample (default: all scores)')
     parser.add_argument('--width',
                         type=int,
                         default=6,
@@ -34,6 +38,7 @@ def main():
     i = 1
     for file in files:
         print(round(i/len(files),2), file, file=sys.stderr)
+        scores = []
         with open(file, 'r') as f:
             query = None
             for line in f:
@@ -42,15 +47,18 @@ def main():
                 if line.startswith('Query'):
                     query = line.split()[1]
                 else:
-                    svs_scores.append(float(line.split()[1]))
+                    scores.append(line.split()[1])
+        svs_scores.append(np.array(scores, dtype=np.float64))
         i += 1
 
-    svs_scores = random.sample(svs_scores, args.N)
+    svs_scores = np.concatenate(svs_scores) if len(svs_scores) > 0 else np.array([])
+    if args.N is not None:
+        svs_scores = np.random.default_rng().choice(svs_scores, args.N, replace=False)
 
     fig, axs = plt.subplots(1, 2, figsize=(args.width, args.height))
 
     ax = axs[0]
-    ax.hist(svs_scores, bins=args.bins)
+    binned_plots.draw_histogram(ax, svs_scores, args.bins)
     ax.set_xlabel('SVS score')
     ax.set_ylabel('Freq.')
     ax.spines['top'].set_visible(False)
@@ -59,7 +67,7 @@ def main():
     #svs_scores = [x for x in svs_scores if x < 5.0]
 
     ax = axs[1]
-    ax.hist(svs_scores, bins=args.bins*3)
+    binned_plots.draw_histogram(ax, svs_scores, args.bins*3)
     ax.set_xlabel('SVS score')
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
@@ -7,18 +7,18 @@ import random
 
 from plotting import ancestry_helpers
 from src import get_relations
+from src import timing_ingest
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--times', type=str, help='times dir', required=True)
     parser.add_argument('--out', type=str, help='output directory', required=True)
+    parser.add_argument('--num_samples', type=int, help='number of samples searched', default=73346)
 
     return parser.parse_args()
 
 SYSTEM='eureka'
 DATA='CCPM'
-NUM_SAMPLES=73346
-#146692
 
 def get_segment_search_times(segment_file):
     read_embeddings_times = []
@@ -28,38 +28,17 @@ def get_segment_search_times(segment_file):
     full_times = []
     sorting_time = 0
 
-    f = open(segment_file, 'r')
-    for line in f:
-        if 'config' in line: # chrm8.segment117.config
-            segment_idx = int(line.strip().split('segment')[1].split('.')[0])
-            print(segment_idx)
-            continue
-        if 'reading' in line:
-            time = float(line.strip().split(':')[1].split()[0])
-            read_embeddings_times.append(time)
-            continue
-        if 'loading' in line:
-            time = float(line.strip().split(':')[1].split()[0])
-            loading_index_times.append(time)
-            continue
-        if 'searching' in line:
-            time = float(line.strip().split(':')[1].split()[0])
-            searching_index_times.append(time)
-            continue
-        if 'scoring' in line:
-            time = float(line.strip().split(':')[1].split()[0])
-            scoring_times.append(time)
-            continue
-        if 'full' in line:
-            time = float(line.strip().split(':')[1].split()[0])
-            full_times.append(time)
-            continue
-        if 'sorting' in line:
-            time = float(line.strip().split(':')[1].split()[0])
+    stage_times = {'reading': read_embeddings_times,
+                   'loading': loading_index_times,
+                   'searching': searching_index_times,
+                   'scoring': scoring_times,
+                   'full': full_times}
+    chromosome, rows = timing_ingest.parse_log(segment_file)
+    for segment_idx, stage, time in rows:
+        if stage == 'sorting':
             sorting_time = time
-            continue
-
-    f.close()
+        elif stage in stage_times:
+            stage_times[stage].append(time)
     return read_embeddings_times, loading_index_times, searching_index_times, scoring_times, full_times, sorting_time
 
 def plot_segment_search_times(reading_embeddings_times,
@@ -70,14 +49,15 @@ def plot_segment_search_times(reading_embeddings_times,
                               sorting_time,
                               out,
                               chrm,
-                              sample):
+                              sample,
+                              num_samples):
 
     # sns.set(style='whitegrid')
     # 5 subplots
     fig, axs = plt.subplots(2, 1, figsize=(15, 10), dpi=300)
 
     num_segments = len(reading_embeddings_times)
-    num_queries = NUM_SAMPLES * 2
+    num_queries = num_samples * 2
     # title = DATA + '-chrm ' + chrm + '\nTIMING BY SEGMENT\n' + SYSTEM
     # fig.suptitle(title, fontsize=25, fontweight='bold')
     out_file = out + 'chrm' + chrm + '_segment_timing.png'
@@ -89,7 +69,7 @@ def plot_segment_search_times(reading_embeddings_times,
         searching_index_times = [x/num_queries for x in searching_index_times]
         scoring_times = [x/num_queries for x in scoring_times]
         full_times = [x/num_queries for x in full_times]
-        num_queries = NUM_SAMPLES * 2
+        num_queries = num_samples * 2
         # title = DATA + '-chrm ' + chrm + '\nTIMING BY QUERY\n' + SYSTEM
         # fig.suptitle(title, fontsize=25, fontweight='bold')
         out_file = out + 'chrm' + chrm + '_sample_timing.png'
@@ -150,7 +130,8 @@ def plot_search_times(loading_index_times,
                       scoring_times,
                       out,
                       chrm,
-                      sample):
+                      sample,
+                      num_samples):
     # combine searching and scoring times
     full_times = [x + y + z for x, y, z in zip(searching_index_times, scoring_times, loading_index_times)]
     # plot histogram of full times
@@ -161,7 +142,7 @@ def plot_search_times(loading_index_times,
     out_file = out + 'chrm' + chrm + '_segment_full_timing.png'
 
     num_segments = len(full_times)
-    num_queries = NUM_SAMPLES * 2
+    num_queries = num_samples * 2
 
     if sample:
         # full_times = [x / num_queries for x in full_times]
@@ -191,7 +172,8 @@ def plot_search_times(loading_index_times,
 def plot_outer_loop_timing(full_times,
                             out,
                             chrm,
-                            sample):
+                            sample,
+                            num_samples):
     # just plot outer loop (full) times
     fig, ax = plt.subplots(figsize=(8, 5), dpi=200)
     title = DATA + '-chrm ' + chrm + '\nTIMING BY SEGMENT\n' + SYSTEM
@@ -199,7 +181,7 @@ def plot_outer_loop_timing(full_times,
     out_file = out + 'chrm' + chrm + '_segment_full_timing.png'
 
     num_segments = len(full_times)
-    num_queries = NUM_SAMPLES * 2
+    num_queries = num_samples * 2
 
 
     if sample:
@@ -275,7 +257,7 @@ def main():
     #                           full_times_list,
     #                           sorting_times_list,
     #                           out,
-    #                           chrm, False)
+    #                           chrm, False, args.num_samples)
     # plot_segment_search_times(read_embeddings_times_list,
     #                           loading_index_times_list,
     #                           searching_index_times_list,
@@ -283,13 +265,13 @@ def main():
     #                           full_times_list,
     #                           sorting_times_list,
     #                           out,
-    #                           chrm, True)
+    #                           chrm, True, args.num_samples)
 
-    # plot_outer_loop_timing(full_times_list, out, chrm, False)
-    # plot_outer_loop_timing(full_times_list, out, chrm, True)
+    # plot_outer_loop_timing(full_times_list, out, chrm, False, args.num_samples)
+    # plot_outer_loop_timing(full_times_list, out, chrm, True, args.num_samples)
 
-    plot_search_times(loading_index_times_list, searching_index_times_list, scoring_times_list, out, chrm, False)
-    plot_search_times(loading_index_times_list, searching_index_times_list, scoring_times_list, out, chrm, True)
+    plot_search_times(loading_index_times_list, searching_index_times_list, scoring_times_list, out, chrm, False, args.num_samples)
+    plot_search_times(loading_index_times_list, searching_index_times_list, scoring_times_list, out, chrm, True, args.num_samples)
 
 
 
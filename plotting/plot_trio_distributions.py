@@ -6,6 +6,7 @@ import scipy.stats as stats
 import random
 
 from plotting import ancestry_helpers
+from src import compressed_io
 from src import get_relations
 
 def get_args():
@@ -20,7 +21,7 @@ def get_args():
 def read_trios(trios_file):
     trios_dict = {}
 
-    with open(trios_file, 'r') as f:
+    with compressed_io.open_text(trios_file) as f:
         header = f.readline()
         for line in f:
             line = line.strip().split()
@@ -280,7 +281,7 @@ def combine_population_scores():
 
     for pop in all_populations:
         # open file for population
-        with open(data_dir + file_prefix + pop + file_suffix, 'r') as f:
+        with compressed_io.open_text(compressed_io.resolve(data_dir + file_prefix + pop + file_suffix)) as f:
             header = f.readline()
             for line in f:
                 line = line.strip().split()
@@ -1,9 +1,10 @@
 import argparse
-import gzip
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import utils
+import binned_plots
+import compressed_io
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -15,6 +16,10 @@ def get_args():
     parser.add_argument('--out_file', type=str, required=True)
     parser.add_argument('--height', type=int, default=5)
     parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--density', default=False, action='store_true',
+                        help='draw hits as a 2D count grid instead of one marker per hit (fast for millions of hits)')
+    parser.add_argument('--bins', type=int, nargs=2, default=[600, 200],
+                        help='position and score bins of the --density grid')
     return parser.parse_args()
 
 
@@ -29,29 +34,30 @@ def get_ranks(L):
 def get_svs_target_results(svs_file, target, K):
     hits = {}
     seen_dict = {}
-    with gzip.open(svs_file, 'rt') as lines:
-        for line in lines:
-            A = line.rstrip().split()
-            chrm = A[0]
-            start = int(A[1])
-            end = int(A[2])
-            s1 = A[3]
+    for line in compressed_io.iter_lines(svs_file):
+        # most lines belong to other targets, skip them before splitting
+        if target not in line: continue
+        A = line.rstrip().split()
+        chrm = A[0]
+        start = int(A[1])
+        end = int(A[2])
+        s1 = A[3]
 
-            if s1 != target: continue
+        if s1 != target: continue
 
-            s2 = A[4]
+        s2 = A[4]
 
-            if s1==s2: continue
+        if s1==s2: continue
 
-            sim = float(A[5])
+        sim = float(A[5])
 
 
-            if (start,end) not in hits:
-                hits[(start,end)] = {}
-            hits[(start,end)][s2] = sim
-            if s2 not in seen_dict:
-                seen_dict[s2] = 0
-            seen_dict[s2] = seen_dict[s2] + 1
+        if (start,end) not in hits:
+            hits[(start,end)] = {}
+        hits[(start,end)][s2] = sim
+        if s2 not in seen_dict:
+            seen_dict[s2] = 0
+        seen_dict[s2] = seen_dict[s2] + 1
 
     seen_list = sorted([(s2, seen_dict[s2]) for s2 in seen_dict],
                        key = lambda x: x[1],
@@ -59,6 +65,22 @@ def get_svs_target_results(svs_file, target, K):
 
     return hits, seen_list[:K]
 
+def get_points(svs_results):
+    '''
+    Hits of the target as arrays
+    @param svs_results: {(start, end): {s2: sim}}
+    @return: segment starts, scores, matched samples
+    '''
+    X = []
+    Y = []
+    S = []
+    for start, end in svs_results:
+        matches = svs_results[(start, end)]
+        X.extend([start] * len(matches))
+        Y.extend(matches.values())
+        S.extend(matches.keys())
+    return np.array(X, dtype=np.int64), np.array(Y, dtype=np.float64), np.array(S, dtype=str)
+
 def main():
     args = get_args()
 
@@ -74,33 +96,35 @@ def main():
 
     print(top_k_samples)
 
-    X = []
-    Y = []
-    X_in = []
-    X_out = []
-    Y_in = []
-    Y_out = []
-
-    for start, end in svs_results:
-        for s2 in svs_results[(start, end)]:
-            if spop_map is not None:
-
-                if spop_map[args.target] == spop_map[s2]:
-                    X_in.append(start)
-                    Y_in.append(svs_results[(start,end)][s2])
-                else:
-                    X_out.append(start)
-                    Y_out.append(svs_results[(start,end)][s2])
-            else:
-                X.append(start)
-                Y.append(svs_results[(start,end)][s2])
+    X, Y, S = get_points(svs_results)
 
+    groups = []
+    if spop_map is not None:
+        # superpopulation of every distinct match, compared once per sample instead of once per hit
+        samples, sample_idx = np.unique(S, return_inverse=True)
+        in_pop = np.array([spop_map[s2] == spop_map[args.target] for s2 in samples], dtype=bool)[sample_idx]
+        groups.append((~in_pop, 'C1', 'Out population'))
+        groups.append((in_pop, 'C0', 'In population'))
 
     fig, ax = plt.subplots( figsize=(args.width, args.height), dpi=250 )
 
-
-    if spop_map is not None:
-        ax.plot(X_out,Y_out,
+    if args.density and len(X) > 0:
+        if len(groups) == 0:
+            groups.append((np.ones(len(X), dtype=bool), 'black', None))
+        x_range = binned_plots.get_range(X)
+        y_range = binned_plots.get_range(Y, pad=0.02)
+        for mask, color, label in groups:
+            counts, x_edges, y_edges = binned_plots.bin_points(X[mask], Y[mask], args.bins, x_range, y_range)
+            binned_plots.draw_counts(ax, counts, x_edges, y_edges, color)
+        if spop_map is not None:
+            plt.legend(handles=[Line2D([0], [0], marker='s', lw=0, color=color, label=label)
+                                for mask, color, label in groups],
+                       frameon=False,
+                       fontsize=10,
+                       loc='upper right')
+    elif spop_map is not None:
+        out_pop, in_pop = groups[0][0], groups[1][0]
+        ax.plot(X[out_pop],Y[out_pop],
                 'o',
                 ms=2,
                 markerfacecolor='None',
@@ -109,7 +133,7 @@ def main():
                 alpha=0.5,
                 label='Out population')
 
-        ax.plot(X_in,Y_in,
+        ax.plot(X[in_pop],Y[in_pop],
                 'o',
                 ms=2,
                 markerfacecolor='None',
@@ -138,19 +162,11 @@ def main():
                   'green',
                   'steelblue']
         labels = ['1st', '2nd', '3rd', '4th', '5th']
-        X = []
-        Y = []
-        C = []
-        for start, end in svs_results:
-            for s2 in svs_results[(start, end)]:
-                if s2 not in top_k_samples: continue
-                X.append(start)
-                Y.append(svs_results[(start,end)][s2])
-                C.append(colors[top_k_samples.index(s2)])
-
-
+        # only the hits of the top K samples are drawn as markers
+        top_k_mask = np.isin(S, top_k_samples)
+        C = [colors[top_k_samples.index(s2)] for s2 in S[top_k_mask]]
 
-        ax.scatter(X,Y,
+        ax.scatter(X[top_k_mask],Y[top_k_mask],
                    s=10,
                    lw=1,
                    c=C)
@@ -3,6 +3,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 
+from src import timing_ingest
+
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--in_file', type=str, required=True)
@@ -13,18 +15,8 @@ def get_args():
     return parser.parse_args()
 
 def read_time_file(file):
-    times = []
-    with open(file) as lines:
-        for line in lines:
-            if line[:4] == 'real':
-                time_str = line.rstrip().split()[1]
-                parts = time_str.replace('s', '').split('m')
-                minutes = float(parts[0])
-                seconds = float(parts[1])
-                total_seconds = minutes * 60 + seconds
-                times.append(total_seconds)
-
-    return times
+    chromosome, rows = timing_ingest.parse_log(file)
+    return [seconds for segment, stage, seconds in rows if stage == 'real']
 
 
 def main():
@@ -3,8 +3,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 import matplotlib.gridspec as gridspec
-import gzip
+import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import compressed_io
 
 
 def get_args():
@@ -17,15 +21,14 @@ def get_args():
 
 def read_score_file(file):
     scores = []
-    with gzip.open(file, 'rt') as lines:
-        for line in lines:
-            A = line.rstrip().split()
-            file_name = A[0].split('/')[1]
-            numbers = re.findall(r'\d+', file_name)
-            chrm = int(numbers[0])
-            segment = int(numbers[1])
-            mean = np.mean([float(x) for x in A[1:]])
-            scores.append((chrm,segment,mean))
+    for line in compressed_io.iter_lines(file):
+        A = line.rstrip().split()
+        file_name = A[0].split('/')[1]
+        numbers = re.findall(r'\d+', file_name)
+        chrm = int(numbers[0])
+        segment = int(numbers[1])
+        mean = np.mean([float(x) for x in A[1:]])
+        scores.append((chrm,segment,mean))
 
     return scores
 
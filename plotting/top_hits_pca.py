@@ -1,8 +1,5 @@
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import cm
-from sklearn.decomposition import PCA
 import utils
 
 def get_args():
@@ -10,17 +7,30 @@ def get_args():
     parser.add_argument('--in_file', type=str, required=True)
     parser.add_argument('--label_file', type=str, required=True)
     parser.add_argument('--out_file', type=str, required=True)
+    parser.add_argument('--method', type=str, default='svd', choices=['svd', 'spectral'],
+                        help='truncated SVD or spectral embedding of the sparse kNN graph')
     return parser.parse_args()
 
+def normalize_graph(graph):
+    '''
+    Symmetrically normalize a sparse adjacency (D^-1/2 A D^-1/2)
+    '''
+    from scipy import sparse
+
+    degrees = np.asarray(graph.sum(axis=1)).ravel()
+    degrees[degrees == 0] = 1
+    d = sparse.diags(1 / np.sqrt(degrees))
+    return (d @ graph @ d).tocsr()
+
 def main():
     args = get_args()
 
-    top_hits = utils.get_top_hits(args.in_file, integerize=True)
-    ids = sorted(top_hits.keys())
+    import matplotlib.pyplot as plt
+    from matplotlib import cm
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.manifold import SpectralEmbedding
 
-    D = []
-    for i in ids:
-        D.append(top_hits[i])
+    ids, graph, knn_indices, knn_dists = utils.get_knn_graph(args.in_file)
 
     label_map = utils.get_label_map(args.label_file, 'Superpopulation code')
    
@@ -32,8 +42,12 @@ def main():
 
     label_idxs = [label_id_map[label] for label in labels]
 
-    pca = PCA(n_components=2)
-    principal_components = pca.fit_transform(D)
+    if args.method == 'spectral':
+        reducer = SpectralEmbedding(n_components=2, affinity='precomputed')
+        principal_components = reducer.fit_transform(graph)
+    else:
+        reducer = TruncatedSVD(n_components=2)
+        principal_components = reducer.fit_transform(normalize_graph(graph))
 
     colormap = cm.get_cmap('tab10', len(unique_labels))
 
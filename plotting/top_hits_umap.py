@@ -1,8 +1,6 @@
 import argparse
 import numpy as np
-import umap
-import matplotlib.pyplot as plt
-from matplotlib import cm
+import utils
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -11,24 +9,6 @@ def get_args():
     parser.add_argument('--out_file', type=str, required=True)
     return parser.parse_args()
 
-def get_top_hits(file):
-    str_hits = {}
-    ids = {}
-
-    with open(file) as lines:
-        for line in lines:
-            A = line.rstrip().split()
-            q = A[0]
-            ids[q] = len(ids)
-            str_hits[q] = [a.split(',')[0] for a in A[1:]]
-
-    hits = {}
-
-    for str_h in str_hits:
-        hits[ str_h ]  = [ids[i] for i in str_hits[str_h]]
-
-    return hits
-
 def get_label_map(file_name):
     labels = {}
     header = None
@@ -48,12 +28,12 @@ def get_label_map(file_name):
 def main():
     args = get_args()
 
-    top_hits = get_top_hits(args.in_file)
-    ids = sorted(top_hits.keys())
+    import umap
+    import matplotlib.pyplot as plt
+    from matplotlib import cm
 
-    D = []
-    for i in ids:
-        D.append(top_hits[i])
+    # sparse kNN graph weighted by score, so UMAP reuses the top hits as its neighbor graph
+    ids, graph, knn_indices, knn_dists = utils.get_knn_graph(args.in_file)
 
     label_map = get_label_map(args.label_file)
    
@@ -65,8 +45,9 @@ def main():
 
     label_idxs = [label_id_map[label] for label in labels]
 
-    reducer = umap.UMAP()
-    embedding = reducer.fit_transform(D)
+    reducer = umap.UMAP(n_neighbors=knn_indices.shape[1],
+                        precomputed_knn=(knn_indices, knn_dists, None))
+    embedding = reducer.fit_transform(graph)
 
     colormap = cm.get_cmap('tab10', len(unique_labels))
 
@@ -1,6 +1,13 @@
-from scipy.stats import gaussian_kde
 import numpy as np
+import os
+import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import compressed_io
+import parsed_cache
+
+@parsed_cache.cached()
 def get_related_map(ped_file):
     if ped_file is None: return None
 
@@ -25,11 +32,12 @@ def get_related_map(ped_file):
                 related[mid][sid] = 1
     return related
 
+@parsed_cache.cached()
 def get_top_hits(file, integerize=False, get_scores=False):
     str_hits = {}
     ids = {}
 
-    with open(file) as lines:
+    with compressed_io.open_text(file) as lines:
         for line in lines:
             A = line.rstrip().split()
             q = A[0]
@@ -50,6 +58,45 @@ def get_top_hits(file, integerize=False, get_scores=False):
     else:
         return str_hits
 
+def get_knn_graph(file):
+    '''
+    Build a sparse kNN graph from a top hits file
+    @param file: top hits file (query match,score match,score ...)
+    @return: sorted query IDs,
+             N x N CSR adjacency weighted by score (symmetrized),
+             N x K neighbor indexes with self first (-1 pads short rows),
+             N x K distances (0 for self, 1 - score / max score otherwise)
+    '''
+    str_hits = get_top_hits(file, get_scores=True)
+    ids = sorted(str_hits.keys())
+    index = {q: i for i, q in enumerate(ids)}
+    k = max([len(h) for h in str_hits.values()], default=0)
+    max_score = max([s for h in str_hits.values() for m, s in h], default=1.0)
+
+    rows = []
+    cols = []
+    weights = []
+    knn_indices = np.full((len(ids), k), -1, dtype=np.int64)
+    knn_dists = np.full((len(ids), k), np.inf, dtype=np.float32)
+    for q in ids:
+        i = index[q]
+        hits = [(index[m], s) for m, s in str_hits[q] if m in index and m != q]
+        # UMAP expects each sample to be its own first neighbor
+        hits = [(i, max_score)] + hits[:k - 1]
+        for j, (m, s) in enumerate(hits):
+            knn_indices[i, j] = m
+            knn_dists[i, j] = 0.0 if m == i else 1.0 - s / max_score
+            if m != i:
+                rows.append(i)
+                cols.append(m)
+                weights.append(s)
+
+    from scipy import sparse
+    graph = sparse.csr_matrix((weights, (rows, cols)), shape=(len(ids), len(ids)))
+    graph = graph.maximum(graph.T).tocsr()
+    return ids, graph, knn_indices, knn_dists
+
+@parsed_cache.cached()
 def get_label_map(file_name, col_name):
     labels = {}
     header = None
@@ -68,6 +115,7 @@ def get_label_map(file_name, col_name):
             labels[sample] = label
     return labels
 
+@parsed_cache.cached()
 def get_pair_map(file):
     pairs = {}
     header = None
@@ -92,6 +140,8 @@ def get_pair_map(file):
     return pairs
 
 def draw_smooth_histo(data, ax, color, label, lw):
+    from scipy.stats import gaussian_kde
+
     kde = gaussian_kde(data)
     kde.set_bandwidth(bw_method=kde.factor / 3.)
     x_range = np.linspace(min(data), max(data), 500)
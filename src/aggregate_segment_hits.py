@@ -0,0 +1,180 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import re
+
+import numpy as np
+import profiling
+
+# per-segment .knn file format:
+# Query: query_id
+# match_id score
+# match_id score
+# ...
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Aggregate per-segment .knn hits into genome-wide top K hits')
+    parser.add_argument('--knn', type=str, required=True,
+                        help='path pattern for the per-segment knn files (e.g. "svs_results/chrm*.segment*.knn")')
+    parser.add_argument('--ids', type=str, required=True, help='file with one haplotype ID per line')
+    parser.add_argument('--k', type=int, default=20, help='number of genome-wide hits to keep per query')
+    parser.add_argument('--score', type=str, default='count', choices=['count', 'sum'],
+                        help='count segments a match is a hit in, or sum its segment scores')
+    parser.add_argument('--samples', default=False, action='store_true',
+                        help='collapse haplotypes (ID_0, ID_1) to samples')
+    parser.add_argument('--threads', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--out_file', type=str, required=True, help='genome-wide top hits file')
+    return parser.parse_args()
+
+@profiling.profiled()
+def get_id_index(ids_file, samples):
+    '''
+    Map every haplotype ID to an integer
+    @param ids_file: file with one haplotype ID per line
+    @param samples: map both haplotypes of a sample to the same integer
+    @return: list of IDs, dictionary of haplotype ID to integer
+    '''
+    ids = []
+    id_index = {}
+    with open(ids_file, 'r') as f:
+        for line in f:
+            hap_id = line.strip()
+            if len(hap_id) == 0:
+                continue
+            name = hap_id[:-2] if samples else hap_id
+            if name not in id_index:
+                id_index[name] = len(ids)
+                ids.append(name)
+            id_index[hap_id] = id_index[name]
+    return ids, id_index
+
+def get_chromosome_files(knn_pattern):
+    '''
+    Group per-segment knn files by chromosome
+    @param knn_pattern: glob pattern for the knn files
+    @return: dictionary of chromosome to list of knn files
+    '''
+    pattern = re.compile(r'.*chrm(\d+)\.segment(\d+)\.knn$')
+    chromosome_files = defaultdict(list)
+    for file_name in glob.glob(knn_pattern):
+        match = pattern.search(file_name)
+        if match is None:
+            continue
+        chromosome_files[int(match.group(1))].append(file_name)
+    return chromosome_files
+
+@profiling.profiled()
+def accumulate_chromosome(knn_files, id_index, score):
+    '''
+    Accumulate segment hits for every (query, match) pair on one chromosome
+    @param knn_files: per-segment knn files for the chromosome
+    @param id_index: dictionary of haplotype ID to integer
+    @param score: 'count' or 'sum'
+    @return: sorted pair keys (query * N + match), accumulated values
+    '''
+    num_ids = max(id_index.values()) + 1
+    pair_values = defaultdict(float)
+    for file_name in knn_files:
+        query = None
+        with open(file_name) as f:
+            for line in f:
+                if len(line) <= 1:
+                    continue
+                elif line.startswith('Query:'):
+                    query = id_index[line.rstrip().split()[1]] * num_ids
+                else:
+                    A = line.rstrip().split()
+                    if score == 'count':
+                        pair_values[query + id_index[A[0]]] += 1
+                    else:
+                        pair_values[query + id_index[A[0]]] += float(A[1])
+
+    keys = np.fromiter(pair_values.keys(), dtype=np.int64, count=len(pair_values))
+    values = np.fromiter(pair_values.values(), dtype=np.float64, count=len(pair_values))
+    order = np.argsort(keys)
+    return keys[order], values[order]
+
+def merge_accumulators(A, B):
+    '''
+    Add two sparse accumulators together
+    @param A: (keys, values)
+    @param B: (keys, values)
+    @return: sorted merged (keys, values)
+    '''
+    keys = np.concatenate((A[0], B[0]))
+    values = np.concatenate((A[1], B[1]))
+    merged_keys, inverse = np.unique(keys, return_inverse=True)
+    merged_values = np.bincount(inverse, weights=values, minlength=len(merged_keys))
+    return merged_keys, merged_values
+
+@profiling.profiled()
+def tree_merge(accumulators, executor):
+    '''
+    Merge accumulators pairwise until one is left
+    @param accumulators: list of (keys, values)
+    @param executor: process pool for the pairwise merges
+    @return: one (keys, values)
+    '''
+    if len(accumulators) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    while len(accumulators) > 1:
+        pairs = list(zip(accumulators[0::2], accumulators[1::2]))
+        merged = list(executor.map(merge_accumulators, [p[0] for p in pairs], [p[1] for p in pairs]))
+        if len(accumulators) % 2 == 1:
+            merged.append(accumulators[-1])
+        accumulators = merged
+    return accumulators[0]
+
+@profiling.profiled()
+def get_top_k(keys, values, num_ids, k):
+    '''
+    Select the top k matches for every query with a partial sort
+    @param keys: sorted pair keys (query * N + match)
+    @param values: accumulated values
+    @param num_ids: number of IDs (N)
+    @param k: number of hits to keep
+    @return: list of (query, [(match, value), ...])
+    '''
+    queries = keys // num_ids
+    matches = keys % num_ids
+    starts = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+
+    top_k = []
+    for start, end in zip(starts, ends):
+        query_values = values[start:end]
+        if end - start > k:
+            idx = np.argpartition(-query_values, k - 1)[:k]
+        else:
+            idx = np.arange(end - start)
+        idx = idx[np.argsort(-query_values[idx], kind='stable')]
+        top_k.append((queries[start], [(matches[start + i], query_values[i]) for i in idx]))
+    return top_k
+
+@profiling.profiled(rows_arg=0)
+def write_top_k(top_k, ids, out_file):
+    with open(out_file, 'w') as f:
+        for query, hits in top_k:
+            str_hits = [ids[match] + ',' + str(value) for match, value in hits]
+            f.write('\t'.join([ids[query]] + str_hits) + '\n')
+
+def main():
+    args = get_args()
+
+    ids, id_index = get_id_index(args.ids, args.samples)
+    chromosome_files = get_chromosome_files(args.knn)
+    print('chromosomes...', sorted(chromosome_files.keys()))
+
+    with ProcessPoolExecutor(max_workers=args.threads) as executor:
+        futures = [executor.submit(accumulate_chromosome,
+                                   chromosome_files[chrm], id_index, args.score)
+                   for chrm in sorted(chromosome_files)]
+        accumulators = [future.result() for future in futures]
+        keys, values = tree_merge(accumulators, executor)
+
+    top_k = get_top_k(keys, values, len(ids), args.k)
+    write_top_k(top_k, ids, args.out_file)
+
+if __name__ == '__main__':
+    main()
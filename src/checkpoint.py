@@ -0,0 +1,133 @@
+import contextlib
+import json
+import os
+import time
+import traceback
+
+import compressed_io
+
+# Resumable loops over independent work units (segments, query/database directories, batches of files).
+# Every unit writes its outputs atomically (tmp file + rename) and, once they are all in place, a line
+# in an append-only journal with the size and mtime of its inputs. A restarted job skips units that are
+# done (whose outputs still exist and whose inputs have not changed) and runs everything else again,
+# including units that failed last time. A job killed in the middle of a unit leaves no partial output
+# behind, only a unit without a journal entry.
+
+class Journal:
+    '''
+    Completion journal of one job: one JSON line per finished or failed unit, last line wins
+    @param journal_file: path to the journal (created if missing)
+    @param restart: ignore earlier entries and start from zero
+    '''
+    def __init__(self, journal_file, restart=False):
+        self.journal_file = journal_file
+        self.status = {}
+        if restart and os.path.exists(journal_file):
+            os.remove(journal_file)
+        if os.path.exists(journal_file):
+            with open(journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line cut off by a kill
+                        continue
+                    self.status[entry['unit']] = entry
+
+    def is_done(self, unit, inputs=()):
+        '''
+        @param inputs: input files or directories of the unit; a changed input makes the unit run again
+        '''
+        entry = self.status.get(unit)
+        if entry is None or entry['status'] != 'done':
+            return False
+        if not all(os.path.exists(o) for o in entry['outputs']):
+            return False
+        return entry.get('inputs', {}) == get_stamps(inputs)
+
+    def record(self, unit, status, outputs=(), error=None, inputs=()):
+        entry = {'unit': unit, 'status': status, 'outputs': list(outputs), 'inputs': get_stamps(inputs),
+                 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        if error is not None:
+            entry['error'] = error
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_file)), exist_ok=True)
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.status[unit] = entry
+
+def get_stamps(paths):
+    '''
+    {path: [size, mtime in ns]} of files, and of every file in directories (None if missing)
+    '''
+    stamps = {}
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path))
+        for file in files:
+            try:
+                stat = os.stat(file)
+                stamps[file] = [stat.st_size, stat.st_mtime_ns]
+            except FileNotFoundError:
+                stamps[file] = None
+    return stamps
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w'):
+    '''
+    Open path for writing through a temporary file that replaces it only if the block finishes
+    (text files ending in .gz or .zst are compressed, see compressed_io)
+    '''
+    tmp_file = path + '.' + str(os.getpid()) + '.tmp'
+    if 'b' in mode:
+        f = open(tmp_file, mode)
+    else:
+        f = compressed_io.open_text(tmp_file, mode, compression=compressed_io.get_compression(path))
+    try:
+        yield f
+        f.close()
+        os.replace(tmp_file, path)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def save_unit(path, result):
+    '''
+    Save a JSON serializable unit result for a later run
+    '''
+    with atomic_open(path) as f:
+        json.dump(result, f)
+
+def load_unit(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def run_units(units, journal):
+    '''
+    Run every unit that is not done yet; a failed unit does not stop the others
+    @param units: list of (unit name, output files, function with no arguments[, input files or directories])
+    @param journal: Journal, or None to run everything without checkpoints
+    @return: list of failed unit names
+    '''
+    failed = []
+    for unit, outputs, func, *inputs in units:
+        inputs = inputs[0] if inputs else ()
+        if journal is not None and journal.is_done(unit, inputs):
+            print('done...', unit)
+            continue
+        print('running...', unit)
+        try:
+            func()
+        except Exception as e:
+            print('failed...', unit, '(' + type(e).__name__ + ': ' + str(e) + ')')
+            if journal is not None:
+                journal.record(unit, 'failed', error=traceback.format_exc(limit=3))
+            failed.append(unit)
+            continue
+        if journal is not None:
+            journal.record(unit, 'done', outputs, inputs=inputs)
+    return failed
@@ -1,8 +1,11 @@
 import argparse
 
+import haplotype_ids
 import read_plink
 import read_genosis
 import plotting.plot_genosis_plink
+import profiling
+import topk_agreement
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Compare genosis and plink output")
@@ -13,8 +16,12 @@ def parse_args():
     parser.add_argument("-a", "--ancestry", help="ancestry file")
     parser.add_argument("-p", "--pop", help="population to investigate")
     parser.add_argument("-c", "--color", help="color for plot")
+    parser.add_argument("-o", "--agreement", help="optional output: per-query top K agreement (topk_agreement.py)")
+    parser.add_argument("--haplotypes", default=False, action="store_true",
+                        help="genosis IDs are haplotypes, collapse them to samples for the agreement")
     return parser.parse_args()
 
+@profiling.profiled()
 def get_plink_top_hits(plink_dict, K):
     # for each query, return top K samples
     top_hits_dict = {}
@@ -44,6 +51,25 @@ def main():
                                                            args.pop,
                                                            int(args.top_k), args.color)
 
+    if args.agreement:
+        ids = haplotype_ids.HaplotypeIds()
+        method_queries = {}
+        method_matrices = {}
+        for method, top_hits_dict in [('genosis', genosis_K_dict),
+                                      ('plink_DST', plink_DST_K_dict),
+                                      ('plink_pihat', plink_pihat_K_dict),
+                                      ('plink_kin', plink_kin_K_dict)]:
+            method_queries[method], method_matrices[method] = topk_agreement.get_topk_matrix(
+                top_hits_dict, ids, int(args.top_k), args.haplotypes and method == 'genosis')
+        queries, rows = topk_agreement.align_queries(method_queries)
+        method_matrices = {method: method_matrices[method][rows[method]] for method in method_matrices}
+        agreements = topk_agreement.get_pair_agreements(method_matrices)
+        query_names = ids.sample_names(queries)
+        topk_agreement.write_query_agreement(query_names,
+                                             agreements,
+                                             args.agreement,
+                                             topk_agreement.get_query_populations(args.ancestry, query_names))
+
     # plotting.plot_genosis_plink.plot_plink_genosis_compare(args.ancestry,
     #                                                        genosis_K_dict,
     #                                                        plink_pihat_K_dict,
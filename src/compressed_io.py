@@ -0,0 +1,181 @@
+import gzip
+import io
+import os
+import shutil
+import subprocess
+
+# Transparent compression for the intermediate files, chosen by file name:
+#   *.zst / *.zstd       zstd (python package zstandard, or the zstd command line tool)
+#   *.gz / *.bgz         block gzip (pysam.BGZFile or bgzip when available, otherwise plain gzip);
+#                        bgzip output is still an ordinary gzip file for every reader
+#   anything else        plain text, opened with open()
+# Reading gzip uses pigz or bgzip in a separate process when installed, so decompression runs on other
+# cores while the reader parses. iter_lines() parses decompressed data in large chunks instead of
+# calling readline() on the compressed stream, the slow path of gzip.open(..., 'rt').
+# zstandard and pysam are optional: pip install zstandard pysam
+
+CHUNK_SIZE = 1 << 22
+THREADS = max(1, min(4, os.cpu_count() or 1))
+
+SUFFIXES = {'gz': '.gz', 'zst': '.zst'}
+
+def get_compression(path):
+    '''
+    @return: 'gz', 'zst' or None for plain text
+    '''
+    name = str(path).lower()
+    if name.endswith(('.zst', '.zstd')):
+        return 'zst'
+    if name.endswith(('.gz', '.bgz', '.bgzf')):
+        return 'gz'
+    return None
+
+def add_suffix(path, compression):
+    '''
+    path with the suffix of a compression ('gz', 'zst' or None)
+    '''
+    if compression is None or get_compression(path) == compression:
+        return path
+    return path + SUFFIXES[compression]
+
+def resolve(path):
+    '''
+    path, or its compressed version if only that exists (for input names built by the scripts)
+    '''
+    if os.path.exists(path):
+        return path
+    for suffix in ('.gz', '.zst', '.bgz', '.zstd'):
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+class ProcessFile(io.RawIOBase):
+    '''
+    Binary stream through a (de)compression command, checked for errors on close
+    '''
+    def __init__(self, command, path, mode):
+        super().__init__()
+        self.mode = mode
+        self.command = command
+        if 'r' in mode:
+            self.file = None
+            self.process = subprocess.Popen(command + [path], stdout=subprocess.PIPE)
+            self.stream = self.process.stdout
+        else:
+            self.file = open(path, 'wb')
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self.file)
+            self.stream = self.process.stdin
+
+    def readable(self):
+        return 'r' in self.mode
+
+    def writable(self):
+        return 'w' in self.mode
+
+    def readinto(self, buffer):
+        return self.stream.readinto(buffer)
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        # a reader that stops early leaves the command writing into a closed pipe
+        stopped_early = 'r' in self.mode and self.stream.read(1) != b''
+        self.stream.close()
+        returncode = self.process.wait()
+        if self.file is not None:
+            self.file.close()
+        super().close()
+        if returncode != 0 and not stopped_early:
+            raise IOError(' '.join(self.command) + ' failed with exit code ' + str(returncode))
+
+def open_zst(path, mode, threads, level):
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+    if zstandard is not None:
+        if 'r' in mode:
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        compressor = zstandard.ZstdCompressor(level=level or 3, threads=threads)
+        return compressor.stream_writer(open(path, 'wb'), closefd=True)
+    if shutil.which('zstd') is not None:
+        if 'r' in mode:
+            return ProcessFile(['zstd', '-dcq'], path, mode)
+        return ProcessFile(['zstd', '-cq', '-T' + str(threads), '-' + str(level or 3)], path, mode)
+    raise ImportError('reading or writing ' + path + ' needs zstd: pip install zstandard')
+
+def open_gz(path, mode, threads, level):
+    if 'r' in mode:
+        if threads > 1 and shutil.which('pigz') is not None:
+            return ProcessFile(['pigz', '-dc', '-p', str(threads)], path, mode)
+        if threads > 1 and shutil.which('bgzip') is not None:
+            return ProcessFile(['bgzip', '-dc', '-@', str(threads)], path, mode)
+        return gzip.open(path, 'rb')
+    # block gzip so the output can be indexed (tabix) and read in parallel
+    try:
+        import pysam
+    except ImportError:
+        pysam = None
+    if pysam is not None:
+        return pysam.BGZFile(path, 'wb')
+    if shutil.which('bgzip') is not None:
+        return ProcessFile(['bgzip', '-c', '-@', str(threads), '-l', str(level or 6)], path, mode)
+    return gzip.open(path, 'wb', compresslevel=level or 6)
+
+def open_binary(path, mode='rb', threads=THREADS, level=None, compression='auto'):
+    '''
+    Open a plain or compressed file as a binary stream
+    @param mode: 'rb' or 'wb'
+    @param threads: (de)compression threads where the codec supports them
+    @param level: compression level (codec default if None)
+    @param compression: 'gz', 'zst', None, or 'auto' to decide by file name
+    '''
+    if compression == 'auto':
+        compression = get_compression(path)
+    if compression is None:
+        return open(path, mode)
+    if compression == 'zst':
+        stream = open_zst(path, mode, threads, level)
+    elif compression == 'gz':
+        stream = open_gz(path, mode, threads, level)
+    else:
+        raise ValueError('unknown compression ' + str(compression))
+    if 'r' in mode:
+        return io.BufferedReader(stream, buffer_size=CHUNK_SIZE)
+    return io.BufferedWriter(stream, buffer_size=CHUNK_SIZE)
+
+def open_text(path, mode='r', threads=THREADS, level=None, compression='auto'):
+    '''
+    Open a plain or compressed text file; a drop-in for open(path, mode)
+    @param mode: 'r', 'w' (or 'rt', 'wt')
+    '''
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    if compression == 'auto':
+        compression = get_compression(path)
+    if compression is None:
+        return open(path, mode.replace('b', ''))
+    return io.TextIOWrapper(open_binary(path, binary_mode, threads, level, compression))
+
+def iter_lines(path, threads=THREADS, chunk_size=CHUNK_SIZE):
+    '''
+    Lines of a plain or compressed text file without trailing newlines, parsed in chunks
+    '''
+    with open_binary(path, 'rb', threads) as f:
+        rest = b''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            end = chunk.rfind(b'\n')
+            if end < 0:
+                rest = chunk
+                continue
+            rest = chunk[end + 1:]
+            # one decode per chunk, the partial last line waits for the next chunk
+            yield from chunk[:end].decode().split('\n')
+        if rest:
+            yield rest.decode()
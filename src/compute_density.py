@@ -1,32 +1,52 @@
 import argparse
 import numpy as np
 import os
+import sys
+
+from segment_store import SegmentStore
+import checkpoint
+import profiling
 
 def get_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--encodings', type=str, required=True)
+    parser.add_argument('--encodings', type=str)
+    parser.add_argument('--store', type=str, help='chrmN.store/ directory from segment_store.py')
     parser.add_argument('--chrm', type=str, required=True)
     parser.add_argument('--out', type=str, required=True)
+    parser.add_argument('--journal', type=str,
+                        help='completion journal; a job run again skips segments whose inputs have not changed')
+    parser.add_argument('--restart', default=False, action='store_true',
+                        help='ignore the journal and recompute every segment')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.store is None and args.encodings is None:
+        parser.error('give --store or --encodings')
+    return args
 
+@profiling.profiled(rows=None)
 def compute_segment_density(segment_file, density_file):
     '''
     write sample and segment density out to file
     '''
-    try:
-        with open(segment_file, 'r') as sf:
-            df = open(density_file, 'w')
-            for line in sf:
-                L = line.strip().split()
-                sample_ID = L[0]
-                encoding = [int(i) for i in L[1:]]
-                density = np.sum(encoding)
-                df.write(f'{sample_ID}\t{density}\n')
-        df.close()
-    except:
-        print('cannot open...' + segment_file)
-        
+    with open(segment_file, 'r') as sf, checkpoint.atomic_open(density_file) as df:
+        for line in sf:
+            L = line.strip().split()
+            sample_ID = L[0]
+            encoding = [int(i) for i in L[1:]]
+            density = np.sum(encoding)
+            df.write(f'{sample_ID}\t{density}\n')
+
+@profiling.profiled(rows=None)
+def compute_store_density(store, seg, density_file):
+    '''
+    write sample densities for one segment of a segment store
+    '''
+    # samples missing from the segment are left out, as they are from a .gt file
+    samples = store.get_samples(seg)
+    densities = store.get_densities(seg, samples)
+    with checkpoint.atomic_open(density_file) as df:
+        for sample_ID, density in zip(samples, densities):
+            df.write(f'{sample_ID}\t{density}\n')
 
 def main():
     args = get_args()
@@ -35,14 +55,33 @@ def main():
     chrm = args.chrm
     out_dir = args.out
 
-    segments = range(0,170)
-    for seg in segments:
-        seg = str(seg)
-        gt_file = encodings_dir + 'chrm'+chrm+'.segment'+seg+'.gt'
-        density_file = out_dir + 'chrm'+chrm+'.segment'+seg+'.density'
-    
-        print(gt_file)
-        compute_segment_density(gt_file, density_file)    
+    # with --journal, finished segments are skipped when an interrupted job is run again
+    journal = checkpoint.Journal(args.journal, restart=args.restart) if args.journal else None
+    units = []
+
+    if args.store is not None:
+        store = SegmentStore(args.store)
+        for seg in store.segments:
+            density_file = out_dir + 'chrm'+chrm+'.segment'+str(seg)+'.density'
+            units.append(('segment' + str(seg), [density_file],
+                          lambda seg=seg, density_file=density_file: compute_store_density(store, seg, density_file),
+                          [args.store]))
+    else:
+        segments = range(0,170)
+        for seg in segments:
+            seg = str(seg)
+            gt_file = encodings_dir + 'chrm'+chrm+'.segment'+seg+'.gt'
+            # chromosomes have fewer segments than the range; only queue the ones that exist
+            if not os.path.exists(gt_file):
+                continue
+            density_file = out_dir + 'chrm'+chrm+'.segment'+seg+'.density'
+            units.append(('segment' + seg, [density_file],
+                          lambda gt_file=gt_file, density_file=density_file: compute_segment_density(gt_file, density_file),
+                          [gt_file]))
+
+    failed = checkpoint.run_units(units, journal)
+    if len(failed) > 0:
+        sys.exit(f'Error: {len(failed)} segments failed, run again to retry them')
 
 if __name__ == '__main__':
     main()
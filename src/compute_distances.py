@@ -1,53 +1,78 @@
 import argparse
 import numpy as np
 import os
+import sys
+
+from segment_store import SegmentStore
+import checkpoint
+import compressed_io
+import profiling
 
 def get_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--encodings', type=str, required=True)
-    parser.add_argument('--embeddings', type=str, required=True)
+    parser.add_argument('--encodings', type=str)
+    parser.add_argument('--embeddings', type=str)
+    parser.add_argument('--store', type=str, help='chrmN.store/ directory from segment_store.py')
     parser.add_argument('--chrm', type=str, required=True)
     parser.add_argument('--out', type=str, required=True)
+    parser.add_argument('--binary', default=False, action='store_true',
+                        help='write N x N distance matrices to .dist.npz instead of text pairs')
+    parser.add_argument('--journal', type=str,
+                        help='completion journal; a job run again skips segments whose inputs have not changed')
+    parser.add_argument('--restart', default=False, action='store_true',
+                        help='ignore the journal and recompute every segment')
+    parser.add_argument('--compress', choices=['gz', 'zst'], help='compress text distance files (block gzip or zstd)')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.store is None and (args.encodings is None or args.embeddings is None):
+        parser.error('give --store or both --encodings and --embeddings')
+    return args
 
+@profiling.profiled()
 def compute_segment_distances(gt_file,
                             emb_file):
     '''
     compute pairwise sample encoding and embedding distances
     '''
-    try:
-        gtf = open(gt_file, 'r')
-        gt_dict = dict()
-        for enc in gtf:
-            L_enc = enc.strip().split()
-            sample_ID = L_enc[0]
-            encoding = [int(i) for i in L_enc[1:]]
-            gt_dict[sample_ID] = encoding
-        gtf.close()
-
-        embf = open(emb_file, 'r')
-        emb_dict = dict()
-        for emb in embf:
-            L_emb = emb.strip().split()
-            sample_ID = L_emb[0]
-            print('emb: ' + sample_ID)
-            embedding = [float(i) for i in L_emb[1:]]
-            emb_dict[sample_ID] = embedding
-        embf.close()
-
-    except:
-        print('cannot open...' + gt_file + ' or ' + emb_file)
-    
+    gtf = open(gt_file, 'r')
+    gt_dict = dict()
+    for enc in gtf:
+        L_enc = enc.strip().split()
+        sample_ID = L_enc[0]
+        encoding = [int(i) for i in L_enc[1:]]
+        gt_dict[sample_ID] = encoding
+    gtf.close()
+
+    embf = open(emb_file, 'r')
+    emb_dict = dict()
+    for emb in embf:
+        L_emb = emb.strip().split()
+        sample_ID = L_emb[0]
+        embedding = [float(i) for i in L_emb[1:]]
+        emb_dict[sample_ID] = embedding
+    embf.close()
+
     return gt_dict, emb_dict
 
+def keep_shared_samples(gt_dict, emb_dict):
+    '''
+    only samples with both an encoding and an embedding in the segment
+    '''
+    shared = [sample for sample in gt_dict if sample in emb_dict]
+    return {sample: gt_dict[sample] for sample in shared}, {sample: emb_dict[sample] for sample in shared}
+
 def compute_sample_dist(gt_dict,
                         emb_dict, 
                         out_file):
     '''
     compute distances and write out to file
     '''
-    df = open(out_file, 'w')
+    with checkpoint.atomic_open(out_file) as df:
+        write_sample_dist(gt_dict, emb_dict, df)
+
+def write_sample_dist(gt_dict,
+                      emb_dict,
+                      df):
     for sample_A in gt_dict:
         for sample_B in gt_dict:
             if sample_A == sample_B:
@@ -56,8 +81,36 @@ def compute_sample_dist(gt_dict,
                 enc_dist = euclidean_dist(gt_dict[sample_A], gt_dict[sample_B])
                 emb_dist = euclidean_dist(emb_dict[sample_A], emb_dict[sample_B])
                 df.write(sample_A + '\t' + sample_B + '\t' + str(enc_dist) + '\t' + str(emb_dist) + '\n')
-                
-    df.close()
+
+def pairwise_dist(vectors):
+    '''
+    compute all pairwise euclidean distances between the rows of a matrix
+    '''
+    X = np.array(vectors, dtype=np.float64)
+    sq_norms = np.einsum('ij,ij->i', X, X)
+    sq_dist = sq_norms[:, None] - 2 * (X @ X.T) + sq_norms[None, :]
+    np.maximum(sq_dist, 0, out=sq_dist)
+    np.fill_diagonal(sq_dist, 0)
+    return np.sqrt(sq_dist)
+
+@profiling.profiled()
+def compute_distance_matrices(gt_dict,
+                              emb_dict):
+    '''
+    compute N x N encoding and embedding distance matrices
+    '''
+    samples = list(gt_dict.keys())
+    enc = pairwise_dist([gt_dict[s] for s in samples])
+    emb = pairwise_dist([emb_dict[s] for s in samples])
+    return samples, enc, emb
+
+@profiling.profiled(rows_arg=0)
+def write_distance_matrices(samples, enc, emb, out_file):
+    '''
+    write distance matrices to a binary .npz file
+    '''
+    with checkpoint.atomic_open(out_file, 'wb') as f:
+        np.savez(f, samples=np.array(samples), enc=enc, emb=emb)
 
 def euclidean_dist(vector1, vector2): 
     '''
@@ -73,19 +126,48 @@ def main():
     chrm = args.chrm
     out_dir = args.out
 
+    store = SegmentStore(args.store) if args.store is not None else None
+
+    # with --journal, finished segments are skipped when an interrupted job is run again
+    journal = checkpoint.Journal(args.journal, restart=args.restart) if args.journal else None
+
+    def compute_segment(seg, distance_file):
+        if store is not None:
+            gt_dict = store.get_encoding_dict(int(seg))
+            emb_dict = store.get_embedding_dict(int(seg))
+        else:
+            gt_file = encodings_dir + 'chrm'+chrm+'.segment'+seg+'.gt'
+            emb_file = embeddings_dir + 'chrm'+chrm+'.segment'+seg+'.emb'
+            print(gt_file)
+            gt_dict, emb_dict = compute_segment_distances(gt_file,
+                                                            emb_file)
+        # samples missing from either file (or store segment) are left out
+        gt_dict, emb_dict = keep_shared_samples(gt_dict, emb_dict)
+
+        if args.binary:
+            samples, enc, emb = compute_distance_matrices(gt_dict, emb_dict)
+            write_distance_matrices(samples, enc, emb, distance_file)
+        else:
+            compute_sample_dist(gt_dict, emb_dict,
+                                distance_file)
+
+    units = []
     segments = [81]
     for seg in segments:
         seg = str(seg)
-        gt_file = encodings_dir + 'chrm'+chrm+'.segment'+seg+'.gt'
-        emb_file = embeddings_dir + 'chrm'+chrm+'.segment'+seg+'.emb'
         distance_file = out_dir + 'chrm'+chrm+'.segment'+seg+'.dist'
-    
-        print(gt_file)
-        gt_dict, emb_dict = compute_segment_distances(gt_file,
-                                                        emb_file)
+        distance_file = distance_file + '.npz' if args.binary else compressed_io.add_suffix(distance_file, args.compress)
+        if store is not None:
+            inputs = [args.store]
+        else:
+            inputs = [encodings_dir + 'chrm'+chrm+'.segment'+seg+'.gt', embeddings_dir + 'chrm'+chrm+'.segment'+seg+'.emb']
+        units.append(('segment' + seg, [distance_file],
+                      lambda seg=seg, distance_file=distance_file: compute_segment(seg, distance_file),
+                      inputs))
 
-        compute_sample_dist(gt_dict, emb_dict,
-                            distance_file)
+    failed = checkpoint.run_units(units, journal)
+    if len(failed) > 0:
+        sys.exit(f'Error: {len(failed)} segments failed, run again to retry them')
 
 if __name__ == '__main__':
     main()
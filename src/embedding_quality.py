@@ -0,0 +1,106 @@
+import argparse
+import glob
+import os
+import re
+
+import numpy as np
+
+import compute_distances
+from plotting import density_data
+import profiling
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Per-sample encoding/embedding distance r^2 for whole chromosomes')
+    parser.add_argument('--chrms', type=str, nargs='+', required=True)
+    parser.add_argument('--distances', type=str,
+                        help='directory with chrmN.segmentM.dist or .dist.npz files')
+    parser.add_argument('--encodings', type=str, help='directory with .gt files (compute distances directly)')
+    parser.add_argument('--embeddings', type=str, help='directory with .emb files (compute distances directly)')
+    parser.add_argument('--out', type=str, required=True, help='output directory')
+    args = parser.parse_args()
+    if args.distances is None and (args.encodings is None or args.embeddings is None):
+        parser.error('give --distances or both --encodings and --embeddings')
+    return args
+
+def get_distance_files(distance_dir, chrm):
+    '''
+    find the distance file for every segment of a chromosome, preferring binary files
+    '''
+    pattern = re.compile(r'chrm' + chrm + r'\.segment(\d+)\.dist(\.npz)?$')
+    distance_files = {}
+    for file_name in sorted(glob.glob(os.path.join(distance_dir, 'chrm' + chrm + '.segment*.dist*'))):
+        match = pattern.search(file_name)
+        if match is None:
+            continue
+        seg_idx = int(match.group(1))
+        if seg_idx not in distance_files or file_name.endswith('.npz'):
+            distance_files[seg_idx] = file_name
+    return distance_files
+
+@profiling.profiled()
+def get_segments_r2_from_vectors(encodings_dir, embeddings_dir, chrm):
+    '''
+    r^2 for every segment computed straight from encodings and embeddings
+    '''
+    pattern = re.compile(r'\.segment(\d+)\.gt$')
+    segment_r2 = {}
+    for gt_file in glob.glob(encodings_dir + 'chrm' + chrm + '.segment*.gt'):
+        seg = pattern.search(gt_file).group(1)
+        emb_file = embeddings_dir + 'chrm' + chrm + '.segment' + seg + '.emb'
+        gt_dict, emb_dict = compute_distances.keep_shared_samples(
+            *compute_distances.compute_segment_distances(gt_file, emb_file))
+        samples, enc, emb = compute_distances.compute_distance_matrices(gt_dict, emb_dict)
+        segment_r2[int(seg)] = dict(zip(samples, density_data.get_matrix_r2(enc, emb)))
+
+    segments = sorted(segment_r2.keys())
+    samples = sorted(set().union(*[set(r2.keys()) for r2 in segment_r2.values()]))
+    r2 = np.full((len(samples), len(segments)), np.nan)
+    for j, seg_idx in enumerate(segments):
+        for i, sample in enumerate(samples):
+            if sample in segment_r2[seg_idx]:
+                r2[i, j] = segment_r2[seg_idx][sample]
+    return samples, segments, r2
+
+@profiling.profiled(rows_arg=0)
+def write_r2(samples, segments, r2, out_file):
+    '''
+    write samples x segments r^2 table
+    '''
+    with open(out_file, 'w') as f:
+        f.write('sample\t' + '\t'.join(['segment' + str(s) for s in segments]) + '\n')
+        for sample, row in zip(samples, r2):
+            f.write(sample + '\t' + '\t'.join([str(round(x, 6)) for x in row]) + '\n')
+
+def write_r2_summary(segments, r2, out_file):
+    '''
+    write per-segment and chromosome-wide r^2 summaries
+    '''
+    with open(out_file, 'w') as f:
+        f.write('segment\tnum_samples\tmean\tmedian\tmin\tp05\n')
+        for j, seg_idx in enumerate(segments):
+            col = r2[:, j][~np.isnan(r2[:, j])]
+            if len(col) == 0:
+                continue
+            f.write(f'{seg_idx}\t{len(col)}\t{np.mean(col)}\t{np.median(col)}\t'
+                    f'{np.min(col)}\t{np.percentile(col, 5)}\n')
+        values = r2[~np.isnan(r2)]
+        if len(values) > 0:
+            f.write(f'all\t{r2.shape[0]}\t{np.mean(values)}\t{np.median(values)}\t'
+                    f'{np.min(values)}\t{np.percentile(values, 5)}\n')
+
+def main():
+    args = get_args()
+
+    for chrm in args.chrms:
+        print('chromosome...', chrm)
+        if args.distances is not None:
+            distance_files = get_distance_files(args.distances, chrm)
+            samples, segments, r2 = density_data.get_segments_r2(distance_files)
+        else:
+            samples, segments, r2 = get_segments_r2_from_vectors(args.encodings, args.embeddings, chrm)
+
+        write_r2(samples, segments, r2, args.out + 'chrm' + chrm + '_r2.tsv')
+        write_r2_summary(segments, r2, args.out + 'chrm' + chrm + '_r2_summary.tsv')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import sys
+
+from pipeline import Node, run_pipeline
+
+# Preprocessing steps and publication figures from the README as one pipeline.
+# Run from anywhere: python src/figures_pipeline.py [--targets figure2 ...] [--dry_run]
+# Raw inputs that are not part of the repository (plink .genome/.kin0, trio labels, quality data)
+# are only needed when the outputs built from them are missing.
+
+POPULATIONS = ['AFR', 'AMR', 'EAS', 'EUR', 'SAS']
+K = '20'
+
+ANCESTRY = 'data/1kg_info/1kg_ancestry.tsv'
+COLORS = 'pub_figures/colors.txt'
+GENOSIS_K = 'data/1kg_top_hits/TOP_HITS_' + K + '.txt'
+PLINK_GENOME = 'data/plink/1kg.genome'
+PLINK_KIN = 'data/plink/1kg.kin0'
+PLINK_K = {'DST': 'data/1kg_plink_topK/plink_DST_top_' + K + '.txt',
+           'pihat': 'data/1kg_plink_topK/plink_pihat_top_' + K + '.txt',
+           'kin': 'data/1kg_plink_topK/plink_kin_top_' + K + '.txt'}
+TRIO_LABELS = ['data/1KG_trios_' + pop + '.txt' for pop in POPULATIONS]
+TRIO_SCORES = ['GenoSiS', 'plink_DST', 'plink_pihat', 'plink_kin']
+SUBPOP_COUNTS = {'genosis': 'data/subpop_counts/genosis_counts.tsv',
+                 'dst': 'data/subpop_counts/dst_counts.tsv',
+                 'pihat': 'data/subpop_counts/pihat_counts.tsv',
+                 'kinship': 'data/subpop_counts/kinship_counts.tsv'}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Rebuild out-of-date preprocessing outputs and figures')
+    parser.add_argument('--targets', nargs='+', help='nodes to bring up to date (default: all)')
+    parser.add_argument('--threads', type=int, default=None, help='number of nodes run at once')
+    parser.add_argument('--force', action='store_true', help='rerun nodes even if up to date')
+    parser.add_argument('--dry_run', action='store_true', help='only print what would run')
+    parser.add_argument('--list', action='store_true', help='list nodes and exit')
+    return parser.parse_args()
+
+def trio_file(score_type, pop, kind):
+    return 'data/1kg_trio_data/' + score_type + '_' + pop + '_trio_' + kind + '_' + K + '.txt'
+
+def get_nodes():
+    nodes = []
+
+    nodes.append(Node('write_plink_top_k',
+                      [sys.executable, 'src/write_plink_top_k.py',
+                       '--plink_dst', PLINK_GENOME, '--plink_pihat', PLINK_GENOME, '--plink_kin', PLINK_KIN,
+                       '--knn', K, '--out', 'data/1kg_plink_topK'],
+                      [PLINK_GENOME, PLINK_KIN],
+                      list(PLINK_K.values())))
+
+    nodes.append(Node('write_trio_data',
+                      [sys.executable, 'src/write_trio_data.py',
+                       '--input', GENOSIS_K, PLINK_K['DST'], PLINK_K['pihat'], PLINK_K['kin'],
+                       '--score'] + TRIO_SCORES +
+                      ['--knn', K, '--ancestry', ANCESTRY, '--labels', 'data/', '--out', 'data/1kg_trio_data'],
+                      [GENOSIS_K, ANCESTRY] + list(PLINK_K.values()) + TRIO_LABELS,
+                      [trio_file(score_type, pop, kind) for score_type in TRIO_SCORES
+                       for pop in POPULATIONS for kind in ('scores', 'ranks')]))
+
+    nodes.append(Node('write_subpop_counts',
+                      [sys.executable, 'src/write_subpop_counts.py',
+                       '--ancestry', ANCESTRY, '--genosis', GENOSIS_K,
+                       '--dst', PLINK_K['DST'], '--pihat', PLINK_K['pihat'], '--kinship', PLINK_K['kin'],
+                       '--output_dir', 'data/subpop_counts/'],
+                      [ANCESTRY, GENOSIS_K] + list(PLINK_K.values()),
+                      list(SUBPOP_COUNTS.values())))
+
+    figure2_args = []
+    figure2_inputs = []
+    for option, score_type in (('genosis', 'GenoSiS'), ('dst', 'plink_DST'),
+                               ('pihat', 'plink_pihat'), ('kin', 'plink_kin')):
+        for pop in POPULATIONS:
+            figure2_args += ['--' + pop + '_' + option, trio_file(score_type, pop, 'scores')]
+            figure2_inputs.append(trio_file(score_type, pop, 'scores'))
+    nodes.append(Node('figure2',
+                      [sys.executable, 'plotting/figure2_related.py', '--colors', COLORS,
+                       '--decode_genosis', 'data/decode/decode_POP.txt',
+                       '--decode_ibd', 'data/decode/decode_IBD.txt'] + figure2_args +
+                      ['--png', 'pub_figures/figure2_family.png'],
+                      [COLORS, 'data/decode/decode_POP.txt', 'data/decode/decode_IBD.txt'] + figure2_inputs,
+                      ['pub_figures/figure2_family.png']))
+
+    figure3_groups = {'genosis': 'data/1KG_pop_hits.txt',
+                      'dst': 'data/1kg_plink_topK/plink_DST_' + K + '_groups.txt',
+                      'pihat': 'data/1kg_plink_topK/plink_pihat_' + K + '_groups.txt',
+                      'kinship': 'data/1kg_plink_topK/plink_kin_' + K + '_groups.txt'}
+    nodes.append(Node('figure3',
+                      [sys.executable, 'plotting/figure3_ancestry.py',
+                       '--ancestry', ANCESTRY, '--k', K, '--colors', COLORS,
+                       '--genosis_groups', figure3_groups['genosis'], '--genosis_k', GENOSIS_K,
+                       '--dst_groups', figure3_groups['dst'], '--pihat_groups', figure3_groups['pihat'],
+                       '--kinship_groups', figure3_groups['kinship'],
+                       '--dst_k', PLINK_K['DST'], '--pihat_k', PLINK_K['pihat'], '--kinship_k', PLINK_K['kin'],
+                       '--png_dist', 'pub_figures/figure3_distribution.png',
+                       '--png_k', 'pub_figures/figure3_topk.png'],
+                      [ANCESTRY, COLORS, GENOSIS_K] + list(figure3_groups.values()) + list(PLINK_K.values()),
+                      ['pub_figures/figure3_distribution.png', 'pub_figures/figure3_topk.png']))
+
+    nodes.append(Node('figure_sup_subpops',
+                      [sys.executable, 'plotting/figure_sup_subpops.py',
+                       '--ancestry', ANCESTRY, '--k', K, '--colors', COLORS,
+                       '--genosis', SUBPOP_COUNTS['genosis'], '--dst', SUBPOP_COUNTS['dst'],
+                       '--pihat', SUBPOP_COUNTS['pihat'], '--kinship', SUBPOP_COUNTS['kinship'],
+                       '--png', 'pub_figures/'],
+                      [ANCESTRY, COLORS] + list(SUBPOP_COUNTS.values()),
+                      ['pub_figures/' + name + '_counts.png' for name in SUBPOP_COUNTS]))
+
+    fst_files = ['data/genosis.fst.txt', 'data/kinship.fst.txt', 'data/dst.fst.txt', 'data/pihat.fst.txt']
+    nodes.append(Node('subpop_fst',
+                      [sys.executable, 'plotting/plot_subpop_fst.py', '--output', 'pub_figures/subpop_fst.png',
+                       '--inputs'] + fst_files +
+                      ['--labels', 'GenoSiS', 'King-robust', 'DST', 'Pi-Hat',
+                       '--height', '4', '--width', '9', '--colors', COLORS],
+                      [COLORS] + fst_files,
+                      ['pub_figures/subpop_fst.png']))
+
+    nodes.append(Node('figure5_quality',
+                      [sys.executable, 'plotting/figure5_quality.py',
+                       '--ancestry', ANCESTRY, '--k', K, '--colors', COLORS,
+                       '--quality_dir', 'data/quality_data/', '--png', 'pub_figures/figure5_'],
+                      [ANCESTRY, COLORS, 'data/quality_data'],
+                      ['pub_figures/figure5_super_histogram.png']))
+
+    nodes.append(Node('ccpm_fst',
+                      [sys.executable, 'plotting/plot_ccpm_fst.py',
+                       '--ccpm_fst', 'data/ccpm_data/plink_fst_my_fst.txt.fst.summary', '--out_dir', 'pub_figures/'],
+                      ['data/ccpm_data/plink_fst_my_fst.txt.fst.summary'],
+                      ['pub_figures/ccpm_fst.png']))
+    return nodes
+
+def main():
+    args = parse_args()
+    nodes = get_nodes()
+
+    if args.list:
+        for node in nodes:
+            print(node.name, '->', ' '.join(node.outputs))
+        return
+
+    failed = run_pipeline(nodes, args.targets, args.threads, args.force, args.dry_run)
+    if len(failed) > 0:
+        sys.exit('failed: ' + ' '.join(failed))
+
+if __name__ == '__main__':
+    main()
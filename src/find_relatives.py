@@ -0,0 +1,232 @@
+import argparse
+import sys
+
+import numpy as np
+
+import compressed_io
+import haplotype_ids
+import profiling
+
+# Relative discovery from genome-wide top hits.
+# 1. every hit score is divided by the query's score against itself, so scores from any number of
+#    segments are on the scale of the deCODE scores divided by the deCODE self scores
+#    (a parent/child pair shares about half: ~0.5)
+# 2. hits are collapsed to samples (best haplotype pair) and only reciprocal hits are kept
+#    (b in the top K of a and a in the top K of b), scored by the lower of the two directions
+# 3. an edge must score above the unrelated deCODE pairs (1 - --fpr quantile); its degree is the
+#    degree whose deCODE scores it is closest to (cut points halfway between the degree medians)
+# 4. an array-based union-find joins the edges into families
+# Everything after reading is NumPy or one pass over the edges, so it runs in near-linear time.
+
+# deCODE relationship -> degree of relatedness
+RELATIONSHIP_DEGREES = {'parent': 1, 'child': 1, 'sibling': 1,
+                        'grandparent': 2, 'grandchild': 2, 'aunt-uncle': 2, 'niece-nephew': 2,
+                        'great-grandparent': 3, 'great-grandchild': 3, '1-cousin': 3,
+                        'great-aunt-uncle': 3, 'great-niece-nephew': 3,
+                        '1-cousin-1-removed': 4,
+                        '2-cousin': 5}
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Find candidate families in genome-wide top hits')
+    parser.add_argument('--top_hits', type=str, required=True, help='top hits file (query match,score ...)')
+    parser.add_argument('--decode', type=str, required=True, help='deCODE GenoSiS scores (decode_POP.txt)')
+    parser.add_argument('--k', type=int, default=20, help='hits per query used for the reciprocal graph')
+    parser.add_argument('--haplotypes', default=False, action='store_true',
+                        help='IDs are haplotypes (<sample>_0, <sample>_1), collapse them to samples')
+    parser.add_argument('--fpr', type=float, default=0.001,
+                        help='fraction of unrelated deCODE pairs allowed above the relative threshold')
+    parser.add_argument('--pairs', type=str, required=True, help='output: related pairs with degree estimates')
+    parser.add_argument('--families', type=str, required=True, help='output: one candidate family per line')
+    return parser.parse_args()
+
+def read_decode_scores(decode_file):
+    '''
+    @return: {relationship: array of deCODE GenoSiS scores}
+    '''
+    decode_scores = {}
+    with open(decode_file, 'r') as f:
+        for line in f:
+            line = line.strip().split(',')
+            if len(line) < 2:
+                continue
+            scores = np.array(line[1:], dtype=np.float64)
+            decode_scores[line[0]] = np.concatenate([decode_scores.get(line[0], []), scores])
+    return decode_scores
+
+def calibrate(decode_scores, fpr):
+    '''
+    Relative threshold and degree cut points, as fractions of the self score
+    @param fpr: fraction of unrelated pairs allowed above the threshold
+    @return: threshold, [(degree, lowest score of that degree)] from the closest degree down
+    '''
+    for label in ('self', 'unrelated'):
+        if label not in decode_scores:
+            sys.exit('Error: deCODE scores have no ' + label + ' pairs')
+    self_score = np.median(decode_scores['self'])
+    threshold = np.quantile(decode_scores['unrelated'], 1 - fpr) / self_score
+
+    degree_scores = {}
+    for relationship, degree in RELATIONSHIP_DEGREES.items():
+        if relationship in decode_scores:
+            degree_scores.setdefault(degree, []).append(decode_scores[relationship] / self_score)
+    degrees = sorted(degree_scores)
+    medians = [np.median(np.concatenate(degree_scores[d])) for d in degrees]
+    cut_points = []
+    for i, degree in enumerate(degrees):
+        low = (medians[i] + medians[i + 1]) / 2 if i + 1 < len(degrees) else threshold
+        low = max(low, threshold)
+        # degrees below the threshold cannot be told apart from the closest one above it
+        if len(cut_points) > 0 and cut_points[-1][1] == low:
+            continue
+        cut_points.append((degree, low))
+    return threshold, cut_points
+
+def get_degrees(scores, cut_points):
+    '''
+    @return: estimated degree of every score (0 if below every cut point)
+    '''
+    degrees = np.zeros(len(scores), dtype=np.int64)
+    # from the most distant degree up, so the closest matching degree is written last
+    for degree, low in reversed(cut_points):
+        degrees[scores >= low] = degree
+    return degrees
+
+@profiling.profiled(rows=lambda hits: len(hits[2]))
+def read_top_hits(hits_file, k, haplotypes):
+    '''
+    Top K hits as arrays, each score divided by the query's score against itself
+    @return: HaplotypeIds, query codes, match codes, scores
+    '''
+    ids = haplotype_ids.HaplotypeIds()
+    queries, matches, scores = [], [], []
+    for line in compressed_io.iter_lines(hits_file):
+        line = line.split()
+        if len(line) == 0 or line[0] == 'query':
+            continue
+        hits = [hit.split(',') for hit in line[1:k + 1]]
+        self_score = next((float(s) for m, s in hits if m == line[0]), None)
+        if self_score is None:
+            # the self hit is always the best one when it is there
+            self_score = float(line[1].split(',')[1]) if len(line) > 1 else 0
+        if self_score <= 0:
+            continue
+        queries.extend([line[0]] * len(hits))
+        matches.extend(m for m, s in hits)
+        scores.extend(float(s) / self_score for m, s in hits)
+    if haplotypes:
+        query_codes = ids.encode(queries)
+        match_codes = ids.encode(matches)
+    else:
+        # samples get codes of haplotype 0, so the sample index of a code is still code >> 1
+        ids.add_samples(queries)
+        ids.add_samples(matches)
+        query_codes = ids.encode_samples(queries) * 2
+        match_codes = ids.encode_samples(matches) * 2
+    return ids, query_codes, match_codes, np.array(scores, dtype=np.float64)
+
+@profiling.profiled(rows=lambda edges: len(edges[0]))
+def get_reciprocal_edges(query_codes, match_codes, scores):
+    '''
+    Sample pairs that are in each other's top hits
+    @return: sample a, sample b (a < b), lower of the two directed scores
+    '''
+    query, match, best = haplotype_ids.collapse_pairs(query_codes, match_codes, scores, how='max')
+    not_self = query != match
+    query, match, best = query[not_self], match[not_self], best[not_self]
+    if len(query) == 0:
+        return query, match, best
+    num_samples = int(max(query.max(), match.max())) + 1
+    # a pair found from both sides has its undirected key twice (directed pairs are unique)
+    pair_keys = np.minimum(query, match) * num_samples + np.maximum(query, match)
+    keys, groups, counts = np.unique(pair_keys, return_inverse=True, return_counts=True)
+    lowest = haplotype_ids.reduce_groups(best, groups, len(keys), 'min')
+    reciprocal = counts == 2
+    return keys[reciprocal] // num_samples, keys[reciprocal] % num_samples, lowest[reciprocal]
+
+class UnionFind:
+    '''
+    Disjoint sets of 0..n-1 in flat parent/size arrays, with union by size and path halving
+    (python lists: indexing numpy arrays one element at a time is several times slower)
+    '''
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def roots(self):
+        '''
+        @return: array with the root of every element
+        '''
+        return np.array([self.find(x) for x in range(len(self.parent))], dtype=np.int64)
+
+@profiling.profiled(rows=lambda families: len(families))
+def get_families(num_samples, sample_a, sample_b):
+    '''
+    Connected components of the relative graph with at least two samples
+    @return: list of arrays of sample indexes, largest family first
+    '''
+    union_find = UnionFind(num_samples)
+    for a, b in zip(sample_a.tolist(), sample_b.tolist()):
+        union_find.union(a, b)
+    roots = union_find.roots()
+    members = np.unique(np.concatenate([sample_a, sample_b]))
+    member_roots = roots[members]
+    order = np.argsort(member_roots, kind='stable')
+    members, member_roots = members[order], member_roots[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(member_roots) != 0])
+    families = np.split(members, starts[1:]) if len(members) > 0 else []
+    return sorted(families, key=lambda f: (-len(f), f[0]))
+
+def write_results(ids, families, sample_a, sample_b, scores, degrees, pairs_file, families_file):
+    family_of = {}
+    with compressed_io.open_text(families_file, 'w') as f:
+        f.write('family\tsize\tsamples\n')
+        for i, family in enumerate(families):
+            for sample in family.tolist():
+                family_of[sample] = i
+            f.write(f'{i}\t{len(family)}\t' + ','.join(ids.sample_names(family).tolist()) + '\n')
+
+    names_a = ids.sample_names(sample_a).tolist()
+    names_b = ids.sample_names(sample_b).tolist()
+    with compressed_io.open_text(pairs_file, 'w') as f:
+        f.write('family\tsample_A\tsample_B\tscore\tdegree\n')
+        for order in np.lexsort((-scores, [family_of[a] for a in sample_a.tolist()])):
+            f.write(f'{family_of[int(sample_a[order])]}\t{names_a[order]}\t{names_b[order]}\t'
+                    f'{scores[order]:.4f}\t{degrees[order]}\n')
+
+def main():
+    args = get_args()
+
+    threshold, cut_points = calibrate(read_decode_scores(args.decode), args.fpr)
+    print('relative threshold', round(threshold, 4), 'of the self score')
+    for degree, low in cut_points:
+        print('degree', degree, '>=', round(low, 4))
+
+    ids, query_codes, match_codes, scores = read_top_hits(args.top_hits, args.k, args.haplotypes)
+    sample_a, sample_b, scores = get_reciprocal_edges(query_codes, match_codes, scores)
+    related = scores >= threshold
+    sample_a, sample_b, scores = sample_a[related], sample_b[related], scores[related]
+    degrees = get_degrees(scores, cut_points)
+
+    families = get_families(len(ids), sample_a, sample_b)
+    print(len(sample_a), 'related pairs in', len(families), 'families')
+    write_results(ids, families, sample_a, sample_b, scores, degrees, args.pairs, args.families)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,28 @@
-import plotting.figure3_ancestry as fig3
+import argparse
 
-genosis_top_k='/Users/krsc0813/PycharmProjects/biobagg_analysis/data/1kg_top_hits/TOP_HITS_20.txt'
+from plotting import ancestry_helpers
+from plotting import ancestry_data
 
+# Percent of each query's top k matches in the same superpopulation and subpopulation,
+# for every k from 1 to --k, written in the genosis_scores.csv format.
 
+def get_args():
+    parser = argparse.ArgumentParser(description='Percent of top k matches in the same super/subpopulation')
+    parser.add_argument('--ancestry', type=str, required=True, help='1kg ancestry file')
+    parser.add_argument('--top_k', type=str, required=True, help='top k file (query match,score ...)')
+    parser.add_argument('--k', type=int, default=20, help='largest k')
+    parser.add_argument('--header', action='store_true', help='top k file has a header line')
+    parser.add_argument('--out', type=str, required=True, help='output csv')
+    return parser.parse_args()
 
-f = open(genosis_top_k, 'r')
-
+def main():
+    args = get_args()
+    subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
+    top_k_samples, top_k_subpopulations = ancestry_data.read_top_K(args.top_k, subpopulations, header=args.header)
+    superpop_percents, subpop_percents = ancestry_data.get_population_percents(top_k_subpopulations,
+                                                                              args.k,
+                                                                              subpopulations)
+    ancestry_data.write_genosis_scores(superpop_percents, subpop_percents, args.out)
 
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,15 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
 from plotting import ancestry_helpers
 from collections import deque
 
+# also imported as src.get_relations by the plotting scripts
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compressed_io
+import profiling
+
 SUB_SUPERPOPULATIONS = ancestry_helpers.SUB_SUPERPOPULATIONS
 
 def get_args():
@@ -12,9 +20,24 @@ def get_args():
                         default=False,
                         action='store_true',
                         help='PED file does not have a header')
-    parser.add_argument('--pop', type=str, help='population query', required=True)
-    return parser.parse_args()
-
+    parser.add_argument('--pop', type=str, help='population query')
+    parser.add_argument('--all_pops',
+                        default=False,
+                        action='store_true',
+                        help='build the family tree once and write every population (and ALL)')
+    parser.add_argument('--sparse',
+                        default=False,
+                        action='store_true',
+                        help='only write pairs connected in the family tree')
+    parser.add_argument('--out', type=str, help='output directory', default='')
+    parser.add_argument('--threads', type=int, help='number of populations to write at once', default=None)
+    parser.add_argument('--compress', choices=['gz', 'zst'], help='compress outputs (block gzip or zstd)')
+    args = parser.parse_args()
+    if not args.all_pops and args.pop is None:
+        parser.error('--pop is required unless --all_pops is given')
+    return args
+
+@profiling.profiled()
 def get_ped(ped_file, pop, subpopulations, no_header):
     ped = []
     with open(ped_file, 'r') as f:
@@ -36,6 +59,7 @@ class FamilyNode:
         self.parents = []
         self.children = []
 
+@profiling.profiled()
 def build_family_tree(ped):
     # build a graph of the family tree
     family_tree = {}
@@ -80,6 +104,20 @@ def min_path_length(family_tree, sample1, sample2):
                 queue.append((child, dist + 1))
     return -1
 
+def get_distances(family_tree, sample):
+    # shortest path from sample to every sample it is connected to (same as min_path_length for each pair)
+    if sample not in family_tree:
+        return {}
+    distances = {sample: 0}
+    queue = deque([sample])
+    while queue:
+        current = queue.popleft()
+        dist = distances[current] + 1
+        for relative in family_tree[current].parents + family_tree[current].children:
+            if relative not in distances:
+                distances[relative] = dist
+                queue.append(relative)
+    return distances
 
 def label_relationship(dist, sample1, sample2, family_tree, subpopulations):
     label = 'outpop'
@@ -141,25 +179,69 @@ def get_samples(ped, pop, subpopulations):
     return samples
 
 
-def main():
-
-    args = get_args()
-    subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
-    ped = get_ped(args.ped, args.pop, subpopulations, args.no_header)
-    graph = build_family_tree(ped)
-    samples = get_samples(args.ped, args.pop, subpopulations)
-
+def get_pop_samples(ped, subpopulations):
+    # partition PED samples by superpopulation, keeping file order
+    pop_samples = {'ALL': []}
+    for line in ped:
+        sample_id = line[0]
+        pop = SUB_SUPERPOPULATIONS[subpopulations[sample_id]]
+        pop_samples['ALL'].append(sample_id)
+        try:
+            pop_samples[pop].append(sample_id)
+        except KeyError:
+            pop_samples[pop] = [sample_id]
+    return pop_samples
 
-    o_file = open('1KG_trios_' + args.pop + '.txt', 'w')
+@profiling.profiled(rows_arg=0)
+def write_relations(samples, graph, subpopulations, out_file, sparse):
+    o_file = compressed_io.open_text(out_file, 'w')
 
     for i in samples:
-        for j in samples:
-            dist = min_path_length(graph, i, j)
+        distances = get_distances(graph, i)
+        if sparse:
+            # only pairs connected in the family tree; readers fall back on ancestry for the rest
+            pairs = [j for j in samples if j in distances]
+        else:
+            pairs = samples
+        for j in pairs:
+            dist = distances.get(j, -1)
             label = label_relationship(dist, i, j, graph, subpopulations)
 
             o_file.write(f'{i} {j} {dist} {label}\n')
 
     o_file.close()
+    return out_file
+
+def write_all_relations(args, subpopulations):
+    # one family tree for every population, populations written concurrently
+    ped = get_ped(args.ped, 'ALL', subpopulations, args.no_header)
+    graph = build_family_tree(ped)
+    pop_samples = get_pop_samples(ped, subpopulations)
+
+    with ProcessPoolExecutor(max_workers=args.threads) as executor:
+        futures = [executor.submit(write_relations,
+                                   pop_samples[pop], graph, subpopulations,
+                                   compressed_io.add_suffix(os.path.join(args.out, '1KG_trios_' + pop + '.txt'), args.compress),
+                                   args.sparse)
+                   for pop in sorted(pop_samples)]
+        for future in futures:
+            print('wrote', future.result())
+
+def main():
+
+    args = get_args()
+    subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
+
+    if args.all_pops:
+        write_all_relations(args, subpopulations)
+        return
+
+    ped = get_ped(args.ped, args.pop, subpopulations, args.no_header)
+    graph = build_family_tree(ped)
+    samples = get_samples(args.ped, args.pop, subpopulations)
+
+    write_relations(samples, graph, subpopulations,
+                    compressed_io.add_suffix(os.path.join(args.out, '1KG_trios_' + args.pop + '.txt'), args.compress), args.sparse)
 
 
 if __name__ == '__main__':
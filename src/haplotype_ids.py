@@ -0,0 +1,178 @@
+import numpy as np
+
+# Haplotype IDs as integers.
+# A haplotype ID is <sample>_<hap> with hap 0 or 1 (HG00096_0, HG00096_1). Its code is
+# sample_index * 2 + hap, so the sample of a code is code >> 1 and the two haplotypes of a sample are
+# adjacent. Collapsing haplotype-level values or hits to samples is then a NumPy reduction over
+# code >> 1 instead of slicing and concatenating strings, and names are only built once per sample.
+
+class HaplotypeIds:
+    '''
+    Sample names by index, and the haplotype codes of their _0/_1 haplotype IDs
+    @param samples: sample names in index order
+    '''
+    def __init__(self, samples=()):
+        self.samples = []
+        self.index = {}
+        # haplotype ID -> code, so repeated IDs cost one dict lookup
+        self.codes = {}
+        self.add_samples(samples)
+
+    @classmethod
+    def from_haplotypes(cls, hap_ids):
+        ids = cls()
+        ids.encode(list(hap_ids))
+        return ids
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add_samples(self, samples):
+        for sample in samples:
+            if sample not in self.index:
+                self.index[sample] = len(self.samples)
+                self.samples.append(sample)
+        self.sample_array = None
+        self.hap_array = None
+
+    def get_code(self, hap_id, add=True):
+        if hap_id[-2:-1] != '_' or hap_id[-1] not in '01':
+            raise ValueError('not a haplotype ID (<sample>_0 or <sample>_1): ' + hap_id)
+        sample = hap_id[:-2]
+        if sample not in self.index:
+            if not add:
+                raise KeyError(sample)
+            self.add_samples([sample])
+        code = self.index[sample] * 2 + int(hap_id[-1])
+        self.codes[hap_id] = code
+        return code
+
+    def encode(self, hap_ids, add=True):
+        '''
+        Codes of haplotype IDs
+        @param add: give unknown samples the next indexes (otherwise KeyError)
+        @return: int64 array
+        '''
+        codes = self.codes
+        # new IDs in order of first appearance, then one lookup per ID
+        for hap_id in dict.fromkeys(hap_ids):
+            if hap_id not in codes:
+                self.get_code(hap_id, add)
+        return np.fromiter(map(codes.__getitem__, hap_ids), dtype=np.int64, count=len(hap_ids))
+
+    def encode_samples(self, samples):
+        '''
+        @return: int64 array of sample indexes
+        '''
+        return np.fromiter((self.index[s] for s in samples), dtype=np.int64, count=len(samples))
+
+    def haplotype_codes(self, samples):
+        '''
+        Codes of both haplotypes of every sample: [s0_0, s0_1, s1_0, s1_1, ...]
+        '''
+        return haplotypes_of(self.encode_samples(samples))
+
+    def sample_names(self, sample_indexes):
+        if self.sample_array is None:
+            self.sample_array = np.array(self.samples, dtype=str)
+        return self.sample_array[sample_indexes]
+
+    def decode(self, codes):
+        '''
+        Haplotype IDs of codes, as a str array
+        '''
+        if self.hap_array is None:
+            self.hap_array = np.array([sample + '_' + hap for sample in self.samples for hap in '01'], dtype=str)
+        return self.hap_array[codes]
+
+def get_haplotype_matrix(hap_values, fill=0):
+    '''
+    {haplotype ID: list of values} as a matrix whose row c holds the values of code c
+    @param fill: value for the rows of haplotypes that are missing
+    @return: HaplotypeIds, (2 * samples) x values float array
+    '''
+    hap_ids = list(hap_values)
+    ids = HaplotypeIds()
+    codes = ids.encode(hap_ids)
+    width = max((len(v) for v in hap_values.values()), default=0)
+    matrix = np.full((2 * len(ids), width), fill, dtype=float)
+    for code, hap_id in zip(codes, hap_ids):
+        values = hap_values[hap_id]
+        matrix[code, :len(values)] = values
+    return ids, matrix
+
+def sample_of(codes):
+    return np.asarray(codes) >> 1
+
+def hap_of(codes):
+    return np.asarray(codes) & 1
+
+def haplotypes_of(sample_indexes):
+    '''
+    Codes of both haplotypes of every sample index, adjacent
+    '''
+    sample_indexes = np.asarray(sample_indexes, dtype=np.int64)
+    return np.stack([sample_indexes * 2, sample_indexes * 2 + 1], axis=-1).reshape(-1)
+
+def reduce_groups(values, groups, num_groups, how):
+    '''
+    Reduce the rows of values that share a group
+    @param groups: group (0..num_groups-1) of every row
+    @param how: 'max', 'min', 'sum' or 'mean'
+    @return: one row per group
+    '''
+    values = np.asarray(values)
+    if how in ('sum', 'mean'):
+        if values.ndim == 1 and values.dtype.kind == 'f':
+            # bincount adds in row order, the same sums as a python loop
+            reduced = np.bincount(groups, weights=values, minlength=num_groups)
+        else:
+            reduced = np.zeros((num_groups,) + values.shape[1:], dtype=values.dtype)
+            np.add.at(reduced, groups, values)
+        if how == 'mean':
+            counts = np.bincount(groups, minlength=num_groups)
+            reduced = reduced / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+        return reduced
+    if how not in ('max', 'min'):
+        raise ValueError('unknown reduction ' + str(how))
+    ufunc = np.maximum if how == 'max' else np.minimum
+    order = np.argsort(groups, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])
+    return ufunc.reduceat(values[order], starts, axis=0)
+
+def collapse(codes, values, how='max'):
+    '''
+    Sample-level values from haplotype-level values
+    @param codes: haplotype code of every row of values
+    @param how: 'max', 'min', 'sum' or 'mean' of the haplotypes of a sample
+    @return: sorted sample indexes, one row of values per sample
+    '''
+    samples, groups = np.unique(sample_of(codes), return_inverse=True)
+    return samples, reduce_groups(values, groups, len(samples), how)
+
+def collapse_pairs(query_codes, match_codes, values=None, how='max', symmetric=False):
+    '''
+    Sample-level hits from haplotype-level hits
+    @param query_codes, match_codes: haplotype codes of every hit
+    @param values: score of every hit (not needed for 'union')
+    @param how: 'max', 'min', 'sum' or 'mean' of the hits between two samples, or 'union' for every
+                sample pair once, with the number of haplotype hits between them as value
+    @param symmetric: (a, b) and (b, a) are the same pair, returned with the smaller index first
+    @return: query sample indexes, match sample indexes, values; pairs in order of first appearance
+    '''
+    query = sample_of(query_codes)
+    match = sample_of(match_codes)
+    if len(query) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([])
+    if symmetric:
+        query, match = np.minimum(query, match), np.maximum(query, match)
+    num_samples = int(max(query.max(), match.max())) + 1
+    keys, first, groups = np.unique(query * num_samples + match, return_index=True, return_inverse=True)
+    if how == 'union':
+        reduced = np.bincount(groups, minlength=len(keys))
+    else:
+        reduced = reduce_groups(values, groups, len(keys), how)
+    order = np.argsort(first, kind='stable')
+    keys = keys[order]
+    return keys // num_samples, keys % num_samples, reduced[order]
@@ -0,0 +1,325 @@
+import argparse
+from collections import defaultdict
+import sqlite3
+import sys
+
+import compressed_io
+import pairwise_parquet
+import plotting.ancestry_helpers as ancestry_helpers
+import profiling
+
+# Top hits, pairwise scores, relationship labels and ancestry in one SQLite file.
+# Samples get integer keys and every other table refers to them by key; a pair is stored once with
+# sample_a < sample_b. Indexes are built after loading, so a cross-method question (e.g. all pairs
+# GenoSiS ranks in the top 5 that plink calls unrelated) is one indexed join from QUERIES instead of
+# a walk over nested dicts.
+#   samples(id, name, subpop, superpop)
+#   methods(id, name)                                       genosis, plink_dst, plink_pihat, kinship, ilash, ...
+#   hits(method_id, query_id, rank, match_id, score)        rank 1 is the best hit
+#   scores(metric_id, sample_a, sample_b, score)            plink DST / PI_HAT, kinship, iLASH cM
+#   relations(sample_a, sample_b, distance, label)          1KG_trios_POP.txt labels
+
+BATCH_SIZE = 100000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, subpop TEXT, superpop TEXT);
+CREATE TABLE IF NOT EXISTS methods (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS hits (method_id INTEGER NOT NULL, query_id INTEGER NOT NULL, rank INTEGER NOT NULL,
+                                 match_id INTEGER NOT NULL, score REAL,
+                                 PRIMARY KEY (method_id, query_id, rank)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (metric_id INTEGER NOT NULL, sample_a INTEGER NOT NULL, sample_b INTEGER NOT NULL,
+                                   score REAL, PRIMARY KEY (metric_id, sample_a, sample_b)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS relations (sample_a INTEGER NOT NULL, sample_b INTEGER NOT NULL, distance INTEGER,
+                                      label TEXT, PRIMARY KEY (sample_a, sample_b)) WITHOUT ROWID;
+'''
+
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS hits_pair ON hits (method_id, query_id, match_id);
+CREATE INDEX IF NOT EXISTS samples_pop ON samples (superpop, subpop);
+'''
+
+# pairwise table kind -> [(metric name, column of pairwise_parquet.iter_rows)]
+PAIR_METRICS = {'genome': [('plink_pihat', 2), ('plink_dst', 3)],
+                'kin0': [('kinship', 2)],
+                'ilash': [('ilash', 2)]}
+
+# prepared joins; :method, :other and :metric are method names, :top the number of hits per query
+QUERIES = {
+    # hits with the score a metric gives the same pair (plot_1kg_trios.combine_dicts)
+    'hits_with_scores': '''
+        SELECT q.name AS query, m.name AS match, h.rank, h.score, s.score AS metric_score
+        FROM hits h
+        JOIN samples q ON q.id = h.query_id
+        JOIN samples m ON m.id = h.match_id
+        LEFT JOIN scores s ON s.metric_id = (SELECT id FROM methods WHERE name = :metric)
+            AND s.sample_a = MIN(h.query_id, h.match_id) AND s.sample_b = MAX(h.query_id, h.match_id)
+        WHERE h.method_id = (SELECT id FROM methods WHERE name = :method) AND h.rank <= :top
+        ORDER BY h.query_id, h.rank''',
+    # top hits the metric scores below :threshold or not at all (self hits are not loaded, see read_hits)
+    'unrelated_hits': '''
+        SELECT q.name AS query, m.name AS match, h.rank, h.score, s.score AS metric_score
+        FROM hits h
+        JOIN samples q ON q.id = h.query_id
+        JOIN samples m ON m.id = h.match_id
+        LEFT JOIN scores s ON s.metric_id = (SELECT id FROM methods WHERE name = :metric)
+            AND s.sample_a = MIN(h.query_id, h.match_id) AND s.sample_b = MAX(h.query_id, h.match_id)
+        WHERE h.method_id = (SELECT id FROM methods WHERE name = :method) AND h.rank <= :top
+            AND (s.score IS NULL OR s.score < :threshold)
+        ORDER BY h.query_id, h.rank''',
+    # hits with their relationship label (parent, sibling, subpop, ...); pairs missing from the labels
+    # (get_relations --sparse only writes pairs connected in the family tree) are subpop, superpop or outpop
+    'hits_with_labels': '''
+        SELECT q.name AS query, m.name AS match, h.rank, h.score, r.distance,
+               COALESCE(r.label, CASE WHEN m.subpop = q.subpop THEN 'subpop'
+                                      WHEN m.superpop = q.superpop THEN 'superpop'
+                                      ELSE 'outpop' END) AS label
+        FROM hits h
+        JOIN samples q ON q.id = h.query_id
+        JOIN samples m ON m.id = h.match_id
+        LEFT JOIN relations r ON r.sample_a = MIN(h.query_id, h.match_id) AND r.sample_b = MAX(h.query_id, h.match_id)
+        WHERE h.method_id = (SELECT id FROM methods WHERE name = :method) AND h.rank <= :top
+        ORDER BY h.query_id, h.rank''',
+    # matches in the top hits of both methods
+    'shared_hits': '''
+        SELECT q.name AS query, m.name AS match, MIN(a.rank) AS rank, MIN(b.rank) AS other_rank
+        FROM hits a
+        JOIN hits b ON b.method_id = (SELECT id FROM methods WHERE name = :other)
+            AND b.query_id = a.query_id AND b.match_id = a.match_id AND b.rank <= :top
+        JOIN samples q ON q.id = a.query_id
+        JOIN samples m ON m.id = a.match_id
+        WHERE a.method_id = (SELECT id FROM methods WHERE name = :method) AND a.rank <= :top
+        GROUP BY a.query_id, a.match_id
+        ORDER BY a.query_id, MIN(a.rank)''',
+    # fraction of the top hits in the superpopulation and subpopulation of the query
+    'same_population': '''
+        SELECT q.name AS query, q.superpop, q.subpop, COUNT(*) AS hits,
+               AVG(m.superpop = q.superpop) AS same_superpop, AVG(m.subpop = q.subpop) AS same_subpop
+        FROM hits h
+        JOIN samples q ON q.id = h.query_id
+        JOIN samples m ON m.id = h.match_id
+        WHERE h.method_id = (SELECT id FROM methods WHERE name = :method) AND h.rank <= :top
+        GROUP BY h.query_id
+        ORDER BY h.query_id''',
+}
+
+DEFAULTS = {'top': 20}
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Load hits and pairwise scores into SQLite and query them')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load = subparsers.add_parser('load', help='add files to a database (created if missing)')
+    load.add_argument('--db', type=str, required=True)
+    load.add_argument('--ancestry', type=str, help='ancestry file')
+    load.add_argument('--hits', type=str, nargs='+', default=[],
+                      help='NAME=FILE top hits files (query match,score ...), e.g. genosis=TOP_HITS_20.txt')
+    load.add_argument('--genome', type=str, nargs='+', default=[], help='plink .genome (text or .parquet)')
+    load.add_argument('--kin0', type=str, nargs='+', default=[], help='plink .kin0 (text or .parquet)')
+    load.add_argument('--ilash', type=str, nargs='+', default=[], help='sum_ilash output (text or .parquet)')
+    load.add_argument('--labels', type=str, nargs='+', default=[], help='1KG_trios_POP.txt relationship labels')
+
+    query = subparsers.add_parser('query', help='run a prepared query (or --sql) and print tsv')
+    query.add_argument('--db', type=str, required=True)
+    query.add_argument('--name', type=str, choices=sorted(QUERIES), help='prepared query')
+    query.add_argument('--sql', type=str, help='any SELECT statement instead of a prepared query')
+    query.add_argument('--method', type=str, help='hits method, e.g. genosis')
+    query.add_argument('--other', type=str, help='second hits method for shared_hits')
+    query.add_argument('--metric', type=str, help='pairwise metric, e.g. kinship, plink_dst, ilash')
+    query.add_argument('--top', type=int, default=DEFAULTS['top'], help='hits per query')
+    query.add_argument('--threshold', type=float, help='metric score below which a pair is unrelated')
+    query.add_argument('--out', type=str, help='output tsv (default: stdout)')
+    return parser.parse_args()
+
+def connect(db_file):
+    db = sqlite3.connect(db_file)
+    db.executescript(SCHEMA)
+    return db
+
+def get_sample_ids(db):
+    return dict(db.execute('SELECT name, id FROM samples'))
+
+def get_method_id(db, name):
+    db.execute('INSERT OR IGNORE INTO methods (name) VALUES (?)', (name,))
+    return db.execute('SELECT id FROM methods WHERE name = ?', (name,)).fetchone()[0]
+
+def add_samples(db, ids, names):
+    '''
+    give unknown sample names the next integer keys
+    @param ids: {name: id} of the samples table, updated in place
+    '''
+    new_names = [n for n in dict.fromkeys(names) if n not in ids]
+    if len(new_names) == 0:
+        return
+    start = db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM samples').fetchone()[0]
+    rows = [(start + i, name) for i, name in enumerate(new_names)]
+    db.executemany('INSERT INTO samples (id, name) VALUES (?, ?)', rows)
+    ids.update((name, i) for i, name in rows)
+
+def batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+def load_ancestry(db, ids, ancestry_file):
+    subpopulations = ancestry_helpers.get_subpopulations(ancestry_file)
+    add_samples(db, ids, list(subpopulations))
+    db.executemany('UPDATE samples SET subpop = ?, superpop = ? WHERE id = ?',
+                   [(subpop, ancestry_helpers.SUB_SUPERPOPULATIONS[subpop], ids[sample])
+                    for sample, subpop in subpopulations.items()])
+    return len(subpopulations)
+
+def read_hits(hits_file):
+    '''
+    (query, rank, match, score) of a top hits file, header line optional
+    The query itself (GenoSiS lists it first) is not a hit, and a match listed twice keeps its first rank,
+    so rank 1 is the best other sample for every method, as in ancestry_helpers.get_knn_results.
+    '''
+    for line in compressed_io.iter_lines(hits_file):
+        line = line.split()
+        if len(line) == 0 or line[0] == 'query':
+            continue
+        query = line[0]
+        seen = {query}
+        rank = 0
+        for hit in line[1:]:
+            match, score = hit.split(',')[:2]
+            if match in seen:
+                continue
+            seen.add(match)
+            rank += 1
+            yield query, rank, match, float(score)
+
+@profiling.profiled(rows=lambda num_rows: num_rows)
+def load_hits(db, ids, method, hits_file):
+    '''
+    Replace the hits of a method
+    @return: number of hits loaded
+    '''
+    method_id = get_method_id(db, method)
+    db.execute('DELETE FROM hits WHERE method_id = ?', (method_id,))
+    num_rows = 0
+    for batch in batches(read_hits(hits_file)):
+        add_samples(db, ids, [name for query, rank, match, score in batch for name in (query, match)])
+        db.executemany('INSERT OR REPLACE INTO hits VALUES (?, ?, ?, ?, ?)',
+                       [(method_id, ids[query], rank, ids[match], score) for query, rank, match, score in batch])
+        num_rows += len(batch)
+    return num_rows
+
+def get_pair(ids, sample_A, sample_B):
+    a, b = ids[sample_A], ids[sample_B]
+    return (a, b) if a < b else (b, a)
+
+@profiling.profiled(rows=lambda num_rows: num_rows)
+def load_pairs(db, ids, kind, pair_file, replace=True):
+    '''
+    Add the scores of a pairwise table (text or Parquet)
+    @param kind: genome, kin0 or ilash (see pairwise_parquet.TABLES)
+    @param replace: first delete the scores of the table's metrics (False adds to them)
+    @return: number of pairs loaded
+    '''
+    metrics = [(get_method_id(db, name), column) for name, column in PAIR_METRICS[kind]]
+    if replace:
+        db.executemany('DELETE FROM scores WHERE metric_id = ?', [(metric_id,) for metric_id, column in metrics])
+    num_rows = 0
+    for batch in batches(pairwise_parquet.iter_rows(kind, pair_file)):
+        add_samples(db, ids, [name for row in batch for name in row[:2]])
+        for metric_id, column in metrics:
+            db.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)',
+                           [(metric_id,) + get_pair(ids, row[0], row[1]) + (row[column],) for row in batch])
+        num_rows += len(batch)
+    return num_rows
+
+@profiling.profiled(rows=lambda num_rows: num_rows)
+def load_labels(db, ids, labels_file):
+    num_rows = 0
+    for batch in batches(pairwise_parquet.iter_rows('relations', labels_file)):
+        add_samples(db, ids, [name for row in batch for name in row[:2]])
+        db.executemany('INSERT OR REPLACE INTO relations VALUES (?, ?, ?, ?)',
+                       [get_pair(ids, row[0], row[1]) + (row[2], row[3]) for row in batch])
+        num_rows += len(batch)
+    return num_rows
+
+def load(db_file, ancestry_file=None, hits=(), genome=(), kin0=(), ilash=(), labels=()):
+    '''
+    Load files into a database, one transaction per file, and (re)build the indexes
+    @param hits: list of (method name, top hits file)
+    '''
+    db = connect(db_file)
+    # a failed load is rerun from the start, so the journal only needs to survive the process
+    db.execute('PRAGMA synchronous = OFF')
+    ids = get_sample_ids(db)
+    jobs = []
+    if ancestry_file is not None:
+        jobs.append((ancestry_file, lambda: load_ancestry(db, ids, ancestry_file)))
+    for method, hits_file in hits:
+        jobs.append((hits_file, lambda m=method, f=hits_file: load_hits(db, ids, m, f)))
+    for kind, pair_files in (('genome', genome), ('kin0', kin0), ('ilash', ilash)):
+        # the first file of a kind replaces its scores, the rest (e.g. one per chromosome) add to them
+        for i, pair_file in enumerate(pair_files):
+            jobs.append((pair_file, lambda k=kind, f=pair_file, r=(i == 0): load_pairs(db, ids, k, f, r)))
+    for labels_file in labels:
+        jobs.append((labels_file, lambda f=labels_file: load_labels(db, ids, f)))
+
+    for name, job in jobs:
+        print('running...', name)
+        with db:
+            num_rows = job()
+        print('done...', name, num_rows, 'rows')
+    with db:
+        db.executescript(INDEXES)
+        db.execute('ANALYZE')
+    db.close()
+
+def run_query(db, query, **params):
+    '''
+    Run a prepared query by name, or an SQL statement, with named parameters
+    @return: column names, list of rows
+    '''
+    sql = QUERIES.get(query, query)
+    cursor = db.execute(sql, dict(DEFAULTS, **params))
+    return [d[0] for d in cursor.description], cursor.fetchall()
+
+def get_combined_dict(db, method, metric, top=DEFAULTS['top']):
+    '''
+    {query: {match: (hit score, metric score)}}, the dict plot_1kg_trios.combine_dicts builds
+    '''
+    combined_dict = defaultdict(dict)
+    columns, rows = run_query(db, 'hits_with_scores', method=method, metric=metric, top=top)
+    for query, match, rank, score, metric_score in rows:
+        combined_dict[query][match] = (score, metric_score)
+    return combined_dict
+
+def main():
+    args = get_args()
+
+    if args.command == 'load':
+        hits = []
+        for h in args.hits:
+            if '=' not in h:
+                sys.exit('Error: --hits takes NAME=FILE, got ' + h)
+            hits.append(tuple(h.split('=', 1)))
+        load(args.db, args.ancestry, hits, args.genome, args.kin0, args.ilash, args.labels)
+    elif args.command == 'query':
+        if (args.name is None) == (args.sql is None):
+            sys.exit('Error: give either --name or --sql')
+        params = {k: v for k, v in vars(args).items()
+                  if k in ('method', 'other', 'metric', 'top', 'threshold') and v is not None}
+        db = connect(args.db)
+        try:
+            columns, rows = run_query(db, args.name or args.sql, **params)
+        except sqlite3.ProgrammingError as e:
+            sys.exit('Error: ' + str(e))
+        f = open(args.out, 'w') if args.out is not None else sys.stdout
+        f.write('\t'.join(columns) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(v) for v in row) + '\n')
+        if f is not sys.stdout:
+            f.close()
+
+if __name__ == '__main__':
+    main()
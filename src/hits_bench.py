@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+# longest response line, as LINE_LIMIT in hits_server.py
+LINE_LIMIT = 64 * 1024 * 1024
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Latency and throughput benchmark for hits_server.py')
+    parser.add_argument('--samples', type=str, required=True, help='file with sample IDs to query (first column)')
+    parser.add_argument('--op', type=str, default='topk', choices=['topk', 'ancestry', 'related'])
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--n', type=int, default=10000, help='number of requests')
+    parser.add_argument('--batch', type=int, default=100, help='samples per batched request')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', type=str, help='connect to this unix socket instead of host/port')
+    return parser.parse_args()
+
+def read_samples(samples_file):
+    samples = []
+    with open(samples_file, 'r') as f:
+        for line in f:
+            line = line.strip().split()
+            if len(line) > 0:
+                samples.append(line[0])
+    return samples
+
+async def connect(host, port, socket_path):
+    if socket_path is not None:
+        return await asyncio.open_unix_connection(socket_path, limit=LINE_LIMIT)
+    return await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def run_benchmark(args, samples):
+    reader, writer = await connect(args.host, args.port, args.socket)
+
+    # one request at a time: round trip latency
+    latencies = []
+    for _ in range(args.n):
+        message = {'op': args.op, 'sample': random.choice(samples), 'k': args.k}
+        start = time.perf_counter()
+        await request(reader, writer, message)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    print('single requests...', args.n)
+    print('latency p50 (ms)', round(np.percentile(latencies, 50), 4))
+    print('latency p95 (ms)', round(np.percentile(latencies, 95), 4))
+    print('latency p99 (ms)', round(np.percentile(latencies, 99), 4))
+    print('throughput (req/s)', round(args.n / (latencies.sum() / 1000), 1))
+
+    # batched requests: samples answered per second
+    num_batches = max(1, args.n // args.batch)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        message = {'op': args.op, 'samples': random.choices(samples, k=args.batch), 'k': args.k}
+        await request(reader, writer, message)
+    elapsed = time.perf_counter() - start
+    print('batched requests...', num_batches, 'x', args.batch)
+    print('batch latency mean (ms)', round(elapsed / num_batches * 1000, 4))
+    print('batched throughput (samples/s)', round(num_batches * args.batch / elapsed, 1))
+
+    writer.close()
+    await writer.wait_closed()
+
+def main():
+    args = get_args()
+    samples = read_samples(args.samples)
+    asyncio.run(run_benchmark(args, samples))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import glob
+import json
+
+import numpy as np
+
+import compressed_io
+import plotting.ancestry_helpers as ancestry_helpers
+
+# Requests and responses are one JSON object per line.
+#   {"op": "topk", "sample": "HG00096", "k": 5}
+#   {"op": "ancestry", "sample": "HG00096", "k": 20}
+#   {"op": "related", "sample": "HG00096"}
+#   {"op": "batch", "requests": [{...}, {...}]}
+# any single request may give "samples": [...] instead of "sample" to get a list of results
+
+# relationship labels that only describe ancestry, not a pedigree relationship
+ANCESTRY_LABELS = ['subpop', 'superpop', 'outpop']
+
+# longest request or response line (asyncio's default of 64 KiB is too small for batches)
+LINE_LIMIT = 64 * 1024 * 1024
+
+OPS = ['topk', 'ancestry', 'related', 'batch']
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Serve top hits, ancestry and relationship queries')
+    parser.add_argument('--top_hits', type=str, required=True, help='top K hits file')
+    parser.add_argument('--header', default=False, action='store_true', help='top hits file has a header line')
+    parser.add_argument('--ancestry', type=str, required=True, help='ancestry file')
+    parser.add_argument('--labels', type=str, help='path pattern for 1KG_trios_POP.txt label files')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', type=str, help='serve on this unix socket instead of host/port')
+    return parser.parse_args()
+
+class HitsIndex:
+    '''
+    Top hits, ancestry and relationships held in arrays indexed by sample number
+    '''
+    def __init__(self, top_hits_file, ancestry_file, labels_pattern=None, header=False):
+        self.ids = []
+        self.index = {}
+        self.hits, self.scores = self.read_top_hits(top_hits_file, header)
+
+        subpopulations = ancestry_helpers.get_subpopulations(ancestry_file)
+        self.subpops = ancestry_helpers.SUBPOPULATIONS
+        self.superpops = sorted(set(ancestry_helpers.SUB_SUPERPOPULATIONS.values()))
+        subpop_codes = {subpop: i for i, subpop in enumerate(self.subpops)}
+        superpop_codes = {superpop: i for i, superpop in enumerate(self.superpops)}
+        # -1 for samples without an ancestry label
+        self.sample_subpop = np.array([subpop_codes.get(subpopulations.get(s), -1) for s in self.ids],
+                                      dtype=np.int16)
+        self.subpop_superpop = np.array([superpop_codes[ancestry_helpers.SUB_SUPERPOPULATIONS[s]]
+                                         for s in self.subpops], dtype=np.int16)
+
+        self.related = {}
+        if labels_pattern is not None:
+            self.read_relationships(labels_pattern)
+
+    def get_id(self, sample):
+        try:
+            return self.index[sample]
+        except KeyError:
+            self.index[sample] = len(self.ids)
+            self.ids.append(sample)
+            return self.index[sample]
+
+    def read_top_hits(self, top_hits_file, header):
+        rows = []
+        with compressed_io.open_text(top_hits_file) as f:
+            if header:
+                f.readline()
+            for line in f:
+                line = line.strip().split()
+                if len(line) == 0:
+                    continue
+                query = self.get_id(line[0])
+                row = []
+                for hit in line[1:]:
+                    match, score = hit.split(',')
+                    row.append((self.get_id(match), float(score)))
+                rows.append((query, row))
+
+        k = max([len(row) for query, row in rows], default=0)
+        hits = np.full((len(self.ids), k), -1, dtype=np.int32)
+        scores = np.full((len(self.ids), k), np.nan, dtype=np.float32)
+        for query, row in rows:
+            hits[query, :len(row)] = [match for match, score in row]
+            scores[query, :len(row)] = [score for match, score in row]
+        return hits, scores
+
+    def read_relationships(self, labels_pattern):
+        # only pedigree labels are kept, and sparse files (get_relations --sparse) list every connected pair,
+        # so dense and sparse label files give the same relatives
+        for labels_file in glob.glob(labels_pattern):
+            with compressed_io.open_text(labels_file) as f:
+                for line in f:
+                    line = line.strip().split()
+                    label = line[3]
+                    if label in ANCESTRY_LABELS or line[0] == line[1]:
+                        continue
+                    # the arrays are sized by the top hits; samples only in the label files are left out
+                    if line[0] not in self.index or line[1] not in self.index:
+                        continue
+                    sample_A = self.index[line[0]]
+                    sample_B = self.index[line[1]]
+                    try:
+                        self.related[sample_A][sample_B] = label
+                    except KeyError:
+                        self.related[sample_A] = {sample_B: label}
+
+    def top_k(self, sample, k=None):
+        query = self.index[sample]
+        row = self.hits[query, :k]
+        valid = row >= 0
+        return [[self.ids[match], float(score)]
+                for match, score in zip(row[valid], self.scores[query, :k][valid])]
+
+    def ancestry(self, sample, k=None):
+        query = self.index[sample]
+        row = self.hits[query, :k]
+        row = row[(row >= 0) & (row != query)]
+        hit_subpops = self.sample_subpop[row]
+        hit_subpops = hit_subpops[hit_subpops >= 0]
+        subpop_counts = np.bincount(hit_subpops, minlength=len(self.subpops))
+        superpop_counts = np.bincount(self.subpop_superpop[hit_subpops], minlength=len(self.superpops))
+        query_subpop = self.sample_subpop[query]
+        return {'subpop': self.subpops[query_subpop] if query_subpop >= 0 else None,
+                'subpop_counts': {self.subpops[i]: int(c) for i, c in enumerate(subpop_counts) if c > 0},
+                'superpop_counts': {self.superpops[i]: int(c) for i, c in enumerate(superpop_counts) if c > 0}}
+
+    def relatives(self, sample):
+        query = self.index[sample]
+        return [[self.ids[match], label] for match, label in self.related.get(query, {}).items()]
+
+    def answer(self, request):
+        if not isinstance(request, dict):
+            return {'error': 'bad request: not a JSON object'}
+        op = request.get('op')
+        if op not in OPS:
+            return {'error': 'unknown op: ' + str(op)}
+        if op == 'batch':
+            requests = request.get('requests', [])
+            if not isinstance(requests, list):
+                return {'error': 'bad request: requests is not a list'}
+            return [self.answer(r) for r in requests]
+        k = request.get('k')
+        if k is not None and (isinstance(k, bool) or not isinstance(k, int) or k < 1):
+            return {'error': 'bad request: k is not a positive integer'}
+        if 'samples' in request:
+            if not isinstance(request['samples'], list):
+                return {'error': 'bad request: samples is not a list'}
+            single = {key: value for key, value in request.items() if key != 'samples'}
+            return [self.answer(dict(single, sample=s)) for s in request['samples']]
+        sample = request.get('sample')
+        if not isinstance(sample, str):
+            return {'error': 'bad request: sample is not a string'}
+        try:
+            if op == 'topk':
+                return {'sample': sample, 'hits': self.top_k(sample, k)}
+            if op == 'ancestry':
+                return dict({'sample': sample}, **self.ancestry(sample, k))
+            return {'sample': sample, 'related': self.relatives(sample)}
+        except KeyError:
+            return {'sample': sample, 'error': 'unknown sample'}
+
+def get_handler(hits_index):
+    async def handle(reader, writer):
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # longer than LINE_LIMIT: the rest of the stream cannot be framed
+                writer.write(json.dumps({'error': 'request too long'}).encode() + b'\n')
+                await writer.drain()
+                break
+            if not line:
+                break
+            try:
+                response = hits_index.answer(json.loads(line))
+            except json.JSONDecodeError:
+                response = {'error': 'bad request'}
+            except Exception as e:
+                # one bad request must not close the connection
+                response = {'error': type(e).__name__ + ': ' + str(e)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        writer.close()
+    return handle
+
+async def serve(hits_index, host, port, socket_path):
+    if socket_path is not None:
+        server = await asyncio.start_unix_server(get_handler(hits_index), path=socket_path, limit=LINE_LIMIT)
+        print('listening on', socket_path)
+    else:
+        server = await asyncio.start_server(get_handler(hits_index), host, port, limit=LINE_LIMIT)
+        print('listening on', host + ':' + str(port))
+    async with server:
+        await server.serve_forever()
+
+def main():
+    args = get_args()
+    print('loading...', args.top_hits)
+    hits_index = HitsIndex(args.top_hits, args.ancestry, args.labels, args.header)
+    print('samples...', len(hits_index.ids))
+    asyncio.run(serve(hits_index, args.host, args.port, args.socket))
+
+if __name__ == '__main__':
+    main()
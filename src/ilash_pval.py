@@ -1,11 +1,10 @@
-import pysam
 import glob
 import re
 import argparse
 
-from scipy.stats import fisher_exact
-
 def perform_fishers_exact_test(ibd_segments, in_segments, all_segments):
+    from scipy.stats import fisher_exact
+
     in_and_ibd = in_segments.intersection(ibd_segments)
     in_and_not_ibd = in_segments.difference(ibd_segments)
     not_in_and_ibd = ibd_segments.difference(in_segments)
@@ -93,6 +92,8 @@ def get_ibd_intervals(ilash_file_name):
     return ibd_segments
 
 def get_ibd_segments(ibd_intervals, segment_bed_file):
+    import pysam
+
     tabix_file = pysam.TabixFile(segment_bed_file)
 
     ibd_segments = {}
@@ -0,0 +1,156 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import re
+import time
+
+import numpy as np
+import profiling
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Exact batched kNN search over segment embeddings')
+    parser.add_argument('--embeddings', type=str, required=True, help='directory with chrmN.segmentM.emb files')
+    parser.add_argument('--chrm', type=str, required=True)
+    parser.add_argument('--out', type=str, required=True, help='output directory for .knn files')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--metric', type=str, default='l2', choices=['l2', 'ip'],
+                        help='euclidean distance (smallest first) or inner product (largest first)')
+    parser.add_argument('--queries', type=str, help='file with query IDs (default: every sample is a query)')
+    parser.add_argument('--block', type=int, default=1024, help='query and database block size')
+    parser.add_argument('--threads', type=int, default=None, help='number of segments searched at once')
+    return parser.parse_args()
+
+@profiling.profiled()
+def read_embeddings(emb_file):
+    '''
+    Read a segment embedding file into float32 vectors
+    @param emb_file: path to .emb file (sample_ID v1 v2 ...)
+    @return: list of sample IDs, N x D float32 array
+    '''
+    sample_IDs = []
+    embeddings = []
+    with open(emb_file, 'r') as f:
+        for line in f:
+            L = line.strip().split()
+            if len(L) == 0:
+                continue
+            sample_IDs.append(L[0])
+            embeddings.append(L[1:])
+    return sample_IDs, np.array(embeddings, dtype=np.float32)
+
+def block_scores(Q, D, D_norms, metric):
+    # smaller is better for every metric so one selection works for both
+    if metric == 'ip':
+        return -(Q @ D.T)
+    Q_norms = np.einsum('ij,ij->i', Q, Q)
+    scores = Q_norms[:, None] - 2 * (Q @ D.T) + D_norms[None, :]
+    np.maximum(scores, 0, out=scores)
+    return scores
+
+@profiling.profiled()
+def search(Q, D, k, metric, block):
+    '''
+    Exact k nearest neighbors with blocked matrix products
+    @param Q: query vectors, M x D float32
+    @param D: database vectors, N x D float32
+    @param k: neighbors per query
+    @param metric: 'l2' or 'ip'
+    @param block: rows per query and database block
+    @return: M x k neighbor indexes, M x k scores (distance for l2, inner product for ip)
+    '''
+    k = min(k, len(D))
+    D_norms = np.einsum('ij,ij->i', D, D)
+    neighbors = np.empty((len(Q), k), dtype=np.int64)
+    scores = np.empty((len(Q), k), dtype=np.float32)
+
+    for q_start in range(0, len(Q), block):
+        Q_block = Q[q_start:q_start + block]
+        best_idx = np.empty((len(Q_block), 0), dtype=np.int64)
+        best_scores = np.empty((len(Q_block), 0), dtype=np.float32)
+        for d_start in range(0, len(D), block):
+            block_s = block_scores(Q_block, D[d_start:d_start + block], D_norms[d_start:d_start + block], metric)
+            # keep the block's top k and merge with the running top k
+            if block_s.shape[1] > k:
+                part = np.argpartition(block_s, k - 1, axis=1)[:, :k]
+                block_s = np.take_along_axis(block_s, part, axis=1)
+            else:
+                part = np.broadcast_to(np.arange(block_s.shape[1]), block_s.shape)
+            best_idx = np.concatenate((best_idx, part + d_start), axis=1)
+            best_scores = np.concatenate((best_scores, block_s), axis=1)
+            if best_scores.shape[1] > k:
+                part = np.argpartition(best_scores, k - 1, axis=1)[:, :k]
+                best_idx = np.take_along_axis(best_idx, part, axis=1)
+                best_scores = np.take_along_axis(best_scores, part, axis=1)
+
+        order = np.argsort(best_scores, axis=1, kind='stable')
+        neighbors[q_start:q_start + block] = np.take_along_axis(best_idx, order, axis=1)
+        scores[q_start:q_start + block] = np.take_along_axis(best_scores, order, axis=1)
+
+    if metric == 'ip':
+        scores = -scores
+    else:
+        scores = np.sqrt(scores)
+    return neighbors, scores
+
+@profiling.profiled(rows_arg=1)
+def write_knn(knn_file, query_IDs, sample_IDs, neighbors, scores):
+    with open(knn_file, 'w') as f:
+        for query, row, row_scores in zip(query_IDs, neighbors, scores):
+            f.write(f'Query: {query}\n')
+            for match, score in zip(row, row_scores):
+                f.write(f'{sample_IDs[match]}\t{score}\n')
+            f.write('\n')
+
+def search_segment(emb_file, knn_file, query_IDs, k, metric, block):
+    '''
+    Search one segment and write its .knn file
+    @return: segment .knn file, number of queries, seconds spent searching
+    '''
+    sample_IDs, embeddings = read_embeddings(emb_file)
+    if query_IDs is None:
+        query_IDs = sample_IDs
+        Q = embeddings
+    else:
+        index = {sample: i for i, sample in enumerate(sample_IDs)}
+        Q = embeddings[[index[q] for q in query_IDs]]
+
+    start = time.perf_counter()
+    neighbors, scores = search(Q, embeddings, k, metric, block)
+    search_time = time.perf_counter() - start
+
+    write_knn(knn_file, query_IDs, sample_IDs, neighbors, scores)
+    return knn_file, len(query_IDs), search_time
+
+def main():
+    args = get_args()
+
+    query_IDs = None
+    if args.queries is not None:
+        with open(args.queries, 'r') as f:
+            query_IDs = [line.strip() for line in f if len(line.strip()) > 0]
+
+    pattern = re.compile(r'.*segment(\d+)\.emb$')
+    emb_files = glob.glob(args.embeddings + 'chrm' + args.chrm + '.segment*.emb')
+    emb_files = sorted(emb_files, key=lambda x: int(pattern.search(x).group(1)))
+
+    total_queries = 0
+    total_time = 0
+    with ProcessPoolExecutor(max_workers=args.threads) as executor:
+        futures = []
+        for emb_file in emb_files:
+            seg = pattern.search(emb_file).group(1)
+            knn_file = args.out + 'chrm' + args.chrm + '.segment' + seg + '.knn'
+            futures.append(executor.submit(search_segment, emb_file, knn_file,
+                                           query_IDs, args.k, args.metric, args.block))
+        for future in futures:
+            knn_file, num_queries, search_time = future.result()
+            total_queries += num_queries
+            total_time += search_time
+            print(knn_file, num_queries, 'queries', round(search_time, 4), 's')
+
+    if total_time > 0:
+        print('searching: ' + str(round(total_time, 4)) + ' s')
+        print('per query (ms)', round(total_time / total_queries * 1000, 6))
+
+if __name__ == '__main__':
+    main()
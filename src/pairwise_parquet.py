@@ -0,0 +1,243 @@
+import argparse
+from collections import defaultdict
+import os
+import sys
+
+import compressed_io
+import profiling
+
+# Pairwise score tables as Parquet.
+# Every table has dictionary encoded sample_A / sample_B columns, typed value columns and, when an
+# ancestry file is given, dictionary encoded superpopulation/subpopulation columns for both samples.
+# Readers only load the columns they ask for, and filters (e.g. pop_A == EUR) are pushed down so row
+# groups whose statistics rule them out are never decoded. The text readers (read_plink,
+# get_sample_distances, read_relationship_labels) hand .parquet paths to this module.
+# pyarrow is optional: pip install pyarrow
+
+ROW_GROUP_SIZE = 1 << 20
+
+# kind -> text header line?, sample columns, [(column, text column, type)]
+TABLES = {
+    'genome': (True, (0, 2), [('PI_HAT', 9, 'float64'), ('DST', 11, 'float64')]),
+    'kin0': (True, (0, 1), [('KINSHIP', 5, 'float64')]),
+    'ilash': (False, (0, 1), [('cM', 2, 'float64')]),
+    'dist': (False, (0, 1), [('enc_dist', 2, 'float64'), ('emb_dist', 3, 'float64')]),
+    'relations': (False, (0, 1), [('distance', 2, 'int32'), ('label', 3, 'string')]),
+}
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Convert pairwise text tables to Parquet and query them')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='text table -> Parquet')
+    convert.add_argument('--kind', choices=sorted(TABLES), required=True,
+                         help='genome (plink .genome), kin0, ilash (sum_ilash output), '
+                              'dist (compute_distances pairs), relations (1KG_trios_POP.txt)')
+    convert.add_argument('--input', type=str, required=True, help='text table (.gz/.zst accepted)')
+    convert.add_argument('--output', type=str, required=True, help='Parquet file')
+    convert.add_argument('--ancestry', type=str, help='1kg ancestry file, adds pop_A/pop_B/subpop_A/subpop_B')
+
+    query = subparsers.add_parser('query', help='print selected columns and rows of a Parquet table')
+    query.add_argument('--input', type=str, required=True)
+    query.add_argument('--columns', type=str, nargs='+', help='columns to print (default: all)')
+    query.add_argument('--pops', type=str, nargs='+', help='only pairs with sample A in these superpopulations')
+    query.add_argument('--samples', type=str, nargs='+', help='only pairs with sample A in these samples')
+    query.add_argument('--either_side', default=False, action='store_true',
+                       help='--pops and --samples match sample A or sample B')
+    return parser.parse_args()
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sys.exit('Error: Parquet tables need pyarrow: pip install pyarrow')
+    return pyarrow, pyarrow.parquet
+
+def get_schema(kind, with_pops):
+    pa, pq = import_pyarrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    fields = [pa.field('sample_A', dictionary), pa.field('sample_B', dictionary)]
+    for column, text_column, column_type in TABLES[kind][2]:
+        fields.append(pa.field(column, dictionary if column_type == 'string' else pa.type_for_alias(column_type)))
+    if with_pops:
+        fields += [pa.field(name, dictionary) for name in ('pop_A', 'pop_B', 'subpop_A', 'subpop_B')]
+    return pa.schema(fields)
+
+def read_text_rows(kind, text_file):
+    '''
+    (sample_A, sample_B, value, ...) of every row of a text table
+    '''
+    header, (a_column, b_column), columns = TABLES[kind]
+    lines = compressed_io.iter_lines(text_file)
+    if header:
+        next(lines, None)
+    for line in lines:
+        line = line.split()
+        if len(line) == 0:
+            continue
+        yield tuple([line[a_column], line[b_column]] + [line[text_column] for column, text_column, t in columns])
+
+def make_batch(schema, kind, rows, subpopulations):
+    pa, pq = import_pyarrow()
+    columns = list(zip(*rows))
+    arrays = [pa.array(columns[0], pa.string()).dictionary_encode(),
+              pa.array(columns[1], pa.string()).dictionary_encode()]
+    for i, (column, text_column, column_type) in enumerate(TABLES[kind][2]):
+        values = columns[2 + i]
+        if column_type == 'string':
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        elif column_type.startswith('int'):
+            arrays.append(pa.array([int(v) for v in values], pa.type_for_alias(column_type)))
+        else:
+            arrays.append(pa.array([float(v) for v in values], pa.type_for_alias(column_type)))
+    if subpopulations is not None:
+        import plotting.ancestry_helpers as ancestry_helpers
+        subpops = [[subpopulations.get(s) for s in columns[i]] for i in (0, 1)]
+        for i in (0, 1):
+            pops = [ancestry_helpers.SUB_SUPERPOPULATIONS.get(s) for s in subpops[i]]
+            arrays.append(pa.array(pops, pa.string()).dictionary_encode())
+        for i in (0, 1):
+            arrays.append(pa.array(subpops[i], pa.string()).dictionary_encode())
+    return pa.record_batch(arrays, schema=schema)
+
+@profiling.profiled(rows=lambda num_rows: num_rows)
+def write_pairs(rows, kind, parquet_file, subpopulations=None, row_group_size=ROW_GROUP_SIZE):
+    '''
+    Write pairwise rows to Parquet, one row group per row_group_size rows
+    @param rows: iterable of (sample_A, sample_B, value, ...) in the column order of TABLES[kind]
+    @param subpopulations: {sample: subpopulation} to add population columns, or None
+    @return: number of rows written
+    '''
+    pa, pq = import_pyarrow()
+    schema = get_schema(kind, subpopulations is not None)
+    num_rows = 0
+    batch = []
+    # rows stay in input order: plink writes all pairs of one sample A together, so the row group
+    # statistics on sample_A are tight and filters on it skip most row groups
+    with pq.ParquetWriter(parquet_file + '.tmp', schema, compression='zstd') as writer:
+        for row in rows:
+            batch.append(row)
+            if len(batch) == row_group_size:
+                writer.write_batch(make_batch(schema, kind, batch, subpopulations))
+                num_rows += len(batch)
+                batch = []
+        if len(batch) > 0:
+            writer.write_batch(make_batch(schema, kind, batch, subpopulations))
+            num_rows += len(batch)
+    os.replace(parquet_file + '.tmp', parquet_file)
+    return num_rows
+
+def convert(kind, text_file, parquet_file, ancestry_file=None):
+    subpopulations = None
+    if ancestry_file is not None:
+        import plotting.ancestry_helpers as ancestry_helpers
+        subpopulations = ancestry_helpers.get_subpopulations(ancestry_file)
+    return write_pairs(read_text_rows(kind, text_file), kind, parquet_file, subpopulations)
+
+def get_filters(pops=None, samples=None, filters=None, either_side=False):
+    '''
+    pyarrow filters for pairs whose sample A is in pops and/or samples
+    @param either_side: sample A or sample B may match (plink lists every pair once, in either order)
+    @return: a list of conditions, or with either_side a list of alternative condition lists
+    '''
+    filters = list(filters or [])
+    criteria = []
+    if pops is not None:
+        criteria.append(('pop', list(pops)))
+    if samples is not None:
+        criteria.append(('sample', list(samples)))
+    if not either_side or len(criteria) == 0:
+        filters += [(column + '_A', 'in', values) for column, values in criteria]
+        return filters if len(filters) > 0 else None
+    # sample A meets every criterion, or sample B does
+    return [filters + [(column + '_' + side, 'in', values) for column, values in criteria] for side in 'AB']
+
+@profiling.profiled()
+def read_pairs(parquet_file, columns=None, pops=None, samples=None, filters=None, either_side=False):
+    '''
+    Read only the needed columns and rows of a pairwise table
+    @param columns: columns to load (default: all)
+    @param pops: keep pairs whose sample A is in these superpopulations (needs pop columns)
+    @param samples: keep pairs whose sample A is one of these samples
+    @param filters: further pyarrow filters, e.g. [('DST', '>', 0.8)]
+    @param either_side: pops and samples may match sample A or sample B
+    @return: pyarrow Table
+    '''
+    pa, pq = import_pyarrow()
+    return pq.read_table(parquet_file, columns=columns, filters=get_filters(pops, samples, filters, either_side))
+
+def get_columns(table, *names):
+    # dictionary columns come back as plain python values
+    return [table.column(name).to_pylist() for name in names]
+
+def iter_rows(kind, path):
+    '''
+    (sample_A, sample_B, value, ...) of every row of a text or Parquet table, values typed
+    '''
+    names = ['sample_A', 'sample_B'] + [column for column, text_column, t in TABLES[kind][2]]
+    if is_parquet(path):
+        yield from zip(*get_columns(read_pairs(path, names), *names))
+        return
+    types = [str if t == 'string' else int if t.startswith('int') else float for c, tc, t in TABLES[kind][2]]
+    for row in read_text_rows(kind, path):
+        yield tuple(row[:2]) + tuple(t(v) for t, v in zip(types, row[2:]))
+
+@profiling.profiled()
+def get_score_dict(parquet_file, score, pops=None, samples=None):
+    '''
+    {sample_A: {sample_B: score}} in both directions, like read_plink.get_pairwise_*_score_dict
+    @param score: column, e.g. DST, PI_HAT, KINSHIP, cM
+    @param pops, samples: keep pairs where either sample is in pops and/or samples, so every kept sample
+                          gets all of its pairs
+    '''
+    table = read_pairs(parquet_file, ['sample_A', 'sample_B', score], pops, samples, either_side=True)
+    score_dict = defaultdict(dict)
+    for sample_A, sample_B, value in zip(*get_columns(table, 'sample_A', 'sample_B', score)):
+        score_dict[sample_A][sample_B] = value
+        score_dict[sample_B][sample_A] = value
+    return score_dict
+
+def get_distance_dicts(parquet_file, samples=None):
+    '''
+    encoding and embedding distances, like density_data.get_sample_distances
+    @param samples: keep the distances from these samples (sample A only: the dicts are one-directional)
+    '''
+    table = read_pairs(parquet_file, ['sample_A', 'sample_B', 'enc_dist', 'emb_dist'], samples=samples)
+    enc_distances = defaultdict(dict)
+    emb_distances = defaultdict(dict)
+    for sample_A, sample_B, enc_dist, emb_dist in zip(*get_columns(table, 'sample_A', 'sample_B',
+                                                                   'enc_dist', 'emb_dist')):
+        enc_distances[sample_A][sample_B] = enc_dist
+        emb_distances[sample_A][sample_B] = emb_dist
+    return enc_distances, emb_distances
+
+def get_relationship_labels(parquet_file):
+    '''
+    {sample1: {sample2: relationship}} in both directions, like write_trio_scores.read_relationship_labels
+    (pairs left out of sparse label files are filled in by write_trio_scores.get_relationship_label)
+    '''
+    table = read_pairs(parquet_file, ['sample_A', 'sample_B', 'label'])
+    pop_labels = defaultdict(dict)
+    for sample_A, sample_B, label in zip(*get_columns(table, 'sample_A', 'sample_B', 'label')):
+        pop_labels[sample_A][sample_B] = label
+        pop_labels[sample_B][sample_A] = label
+    return pop_labels
+
+def is_parquet(path):
+    return str(path).endswith('.parquet')
+
+def main():
+    args = get_args()
+
+    if args.command == 'convert':
+        num_rows = convert(args.kind, args.input, args.output, args.ancestry)
+        print('wrote', num_rows, 'rows to', args.output)
+    elif args.command == 'query':
+        table = read_pairs(args.input, args.columns, args.pops, args.samples, either_side=args.either_side)
+        print('\t'.join(table.column_names))
+        for row in zip(*[table.column(name).to_pylist() for name in table.column_names]):
+            print('\t'.join(str(v) for v in row))
+
+if __name__ == '__main__':
+    main()
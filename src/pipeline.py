@@ -0,0 +1,202 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Minimal make-style runner: every step is a Node with a command, input files and output files.
+# A node depends on the nodes that produce its inputs. Its hash covers the command and the content
+# of every input, so a node only reruns when one of those changed (or an output is missing), and
+# anything downstream of it reruns only if its outputs actually changed. Independent nodes run
+# at the same time on a process pool.
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+STATE_FILE = os.path.join(REPO_DIR, '.pipeline_state.json')
+
+class Node:
+    '''
+    One step of a pipeline
+    @param name: unique node name
+    @param command: argv list, run from the repository root
+    @param inputs: files or directories the command reads
+    @param outputs: files the command writes
+    '''
+    def __init__(self, name, command, inputs, outputs):
+        self.name = name
+        self.command = [str(c) for c in command]
+        self.inputs = [os.path.normpath(i) for i in inputs]
+        self.outputs = [os.path.normpath(o) for o in outputs]
+
+    def outputs_exist(self):
+        return all(os.path.exists(os.path.join(REPO_DIR, o)) for o in self.outputs)
+
+def read_state(state_file):
+    if not os.path.exists(state_file):
+        return {'nodes': {}, 'files': {}}
+    with open(state_file, 'r') as f:
+        return json.load(f)
+
+def write_state(state, state_file):
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_file, state_file)
+
+def hash_file(path, file_hashes):
+    '''
+    sha256 of a file, reusing the stored hash while its size and mtime are unchanged
+    @param file_hashes: {path: [size, mtime_ns, hash]}, updated in place
+    '''
+    stat = os.stat(path)
+    cached = file_hashes.get(path)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    file_hashes[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return sha.hexdigest()
+
+def hash_path(path, file_hashes):
+    full_path = os.path.join(REPO_DIR, path)
+    if os.path.isdir(full_path):
+        sha = hashlib.sha256()
+        for root, dirs, files in sorted(os.walk(full_path)):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                sha.update(os.path.relpath(file_path, full_path).encode())
+                sha.update(hash_file(file_path, file_hashes).encode())
+        return sha.hexdigest()
+    return hash_file(full_path, file_hashes)
+
+def hash_node(node, file_hashes):
+    sha = hashlib.sha256()
+    sha.update(json.dumps(node.command).encode())
+    for path in sorted(node.inputs):
+        sha.update(path.encode())
+        sha.update(hash_path(path, file_hashes).encode())
+    return sha.hexdigest()
+
+def run_command(command):
+    '''
+    Run one node's command from the repository root with src/ and the root importable
+    @return: return code, seconds, tail of stderr
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_DIR, os.path.join(REPO_DIR, 'src')]
+                                        + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    env.setdefault('MPLBACKEND', 'Agg')
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    return result.returncode, time.perf_counter() - start, result.stderr[-2000:]
+
+def get_dependencies(nodes):
+    producers = {}
+    for node in nodes:
+        for output in node.outputs:
+            producers[output] = node.name
+    return {node.name: {producers[i] for i in node.inputs if i in producers and producers[i] != node.name}
+            for node in nodes}
+
+def get_selected(nodes, dependencies, targets):
+    '''
+    the target nodes and everything they depend on
+    '''
+    if targets is None:
+        return {node.name for node in nodes}
+    selected = set()
+    stack = list(targets)
+    while len(stack) > 0:
+        name = stack.pop()
+        if name in selected:
+            continue
+        if name not in dependencies:
+            sys.exit('Error: unknown node ' + name)
+        selected.add(name)
+        stack.extend(dependencies[name])
+    return selected
+
+def run_pipeline(nodes, targets=None, threads=None, force=False, dry_run=False, state_file=STATE_FILE):
+    '''
+    Run every out-of-date node once its dependencies are done
+    @param nodes: list of Node
+    @param targets: node names to bring up to date (default: all)
+    @param threads: number of nodes run at once
+    @param force: rerun nodes even if they are up to date
+    @param dry_run: only report what would run
+    @return: list of failed node names
+    '''
+    node_map = {node.name: node for node in nodes}
+    dependencies = get_dependencies(nodes)
+    pending = get_selected(nodes, dependencies, targets)
+    state = read_state(state_file)
+    done = set()
+    failed = set()
+    stale = set()
+
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        running = {}
+        while len(pending) > 0 or len(running) > 0:
+            num_pending = len(pending)
+            for name in sorted(pending):
+                node = node_map[name]
+                if len(dependencies[name] & failed) > 0:
+                    print('skipped...', name, '(dependency failed)')
+                    pending.remove(name)
+                    failed.add(name)
+                    continue
+                if not dependencies[name] <= done:
+                    continue
+                pending.remove(name)
+
+                missing = [i for i in node.inputs if not os.path.exists(os.path.join(REPO_DIR, i))]
+                if len(missing) > 0:
+                    if node.outputs_exist():
+                        # raw inputs that are not shipped with the repo: keep the committed outputs
+                        print('kept...', name, '(inputs not available: ' + ', '.join(missing) + ')')
+                        done.add(name)
+                    else:
+                        print('failed...', name, '(missing inputs: ' + ', '.join(missing) + ')')
+                        failed.add(name)
+                    continue
+
+                node_hash = hash_node(node, state['files'])
+                up_to_date = (state['nodes'].get(name) == node_hash and node.outputs_exist()
+                              and len(dependencies[name] & stale) == 0)
+                if up_to_date and not force:
+                    print('up to date...', name)
+                    done.add(name)
+                elif dry_run:
+                    print('would run...', name, ' '.join(node.command))
+                    stale.add(name)
+                    done.add(name)
+                else:
+                    print('running...', name)
+                    running[executor.submit(run_command, node.command)] = (name, node_hash)
+
+            if len(running) == 0:
+                if len(pending) == num_pending:
+                    sys.exit('Error: dependency cycle between ' + ', '.join(sorted(pending)))
+                continue
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, node_hash = running.pop(future)
+                returncode, seconds, stderr = future.result()
+                if returncode == 0 and node_map[name].outputs_exist():
+                    print('finished...', name, round(seconds, 2), 's')
+                    state['nodes'][name] = node_hash
+                    write_state(state, state_file)
+                    done.add(name)
+                else:
+                    print('failed...', name, '(exit ' + str(returncode) + ')')
+                    print(stderr)
+                    failed.add(name)
+
+    # hashes of the inputs are saved so unchanged files are not read again next time
+    if not dry_run:
+        write_state(state, state_file)
+    return sorted(failed)
@@ -0,0 +1,129 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import time
+
+# Stage-level instrumentation shared by the src/ scripts. Off unless GENOSIS_PROFILE is set:
+#   GENOSIS_PROFILE=1               one JSON line per stage on stderr
+#   GENOSIS_PROFILE=run.jsonl       JSON lines appended to run.jsonl (safe across worker processes)
+#   GENOSIS_PROFILE_DUMP=prof_dir/  also write a cProfile dump per stage (view with snakeviz or pstats)
+# Each record has the stage name, wall and CPU seconds, rows processed, rows per second and peak RSS.
+
+PROFILE_ENV = 'GENOSIS_PROFILE'
+DUMP_ENV = 'GENOSIS_PROFILE_DUMP'
+
+# only the outermost stage runs cProfile; nested stages are part of its dump
+_open_stages = [0]
+
+def enabled():
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+def get_peak_rss_mb():
+    '''
+    peak resident set size of this process in MB
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def count_rows(result):
+    '''
+    default row count for a stage's return value: length of the result, or of its first item for tuples
+    '''
+    if isinstance(result, tuple) and len(result) > 0:
+        result = result[0]
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+def emit(record):
+    destination = os.environ.get(PROFILE_ENV)
+    line = json.dumps(record) + '\n'
+    if destination in ('1', 'stderr'):
+        sys.stderr.write(line)
+        sys.stderr.flush()
+    else:
+        with open(destination, 'a') as f:
+            f.write(line)
+
+class Stage:
+    '''
+    Handle for a running stage; callers add the rows they process
+    '''
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def add_rows(self, n):
+        self.rows = (self.rows or 0) + n
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    '''
+    Time a block of code
+    @param name: stage name written to the record
+    @param rows: number of rows the stage handles, if known up front
+    '''
+    current = Stage(name, rows)
+    if not enabled():
+        yield current
+        return
+
+    dump_dir = os.environ.get(DUMP_ENV)
+    profiler = cProfile.Profile() if dump_dir and _open_stages[0] == 0 else None
+    _open_stages[0] += 1
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield current
+    finally:
+        _open_stages[0] -= 1
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        record = {'script': os.path.basename(sys.argv[0]),
+                  'stage': name,
+                  'pid': os.getpid(),
+                  'wall_s': round(wall, 6),
+                  'cpu_s': round(cpu, 6),
+                  'rows': current.rows,
+                  'rows_per_s': round(current.rows / wall, 1) if current.rows and wall > 0 else None,
+                  'peak_rss_mb': round(get_peak_rss_mb(), 1)}
+        emit(record)
+        if profiler is not None:
+            os.makedirs(dump_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(dump_dir, f'{name}.{os.getpid()}.prof'))
+
+def profiled(name=None, rows=count_rows, rows_arg=None):
+    '''
+    Decorator form of stage()
+    @param name: stage name (default: function name)
+    @param rows: function of the return value giving the row count (None to skip counting)
+    @param rows_arg: position of an argument whose length is the row count, for writers
+    '''
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with stage(stage_name) as current:
+                result = func(*args, **kwargs)
+                if rows_arg is not None:
+                    current.rows = count_rows(args[rows_arg])
+                elif rows is not None:
+                    current.rows = rows(result)
+                return result
+        return wrapper
+    return decorator
@@ -1,8 +1,11 @@
 from collections import defaultdict
+import compressed_io
+import profiling
 
 # TOP_HITS.txt file format:
 # query match_1,match_1_score match_2,match_2_score ...
 
+@profiling.profiled()
 def get_top_hits_dict(top_hits_file):
     """
     Get the top hits from a top hits file
@@ -10,7 +13,7 @@ def get_top_hits_dict(top_hits_file):
     top_hits_dict = {}
     # query: [(match_1, match_1_score), (match_2, match_2_score), ...]
 
-    with open(top_hits_file, 'r') as f:
+    with compressed_io.open_text(top_hits_file) as f:
         for line in f:
             line = line.strip().split()
             query = line[0]
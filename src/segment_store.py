@@ -0,0 +1,219 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+# A chromosome store is a directory (chrmN.store/) with:
+#   index.json      samples, and for every segment its offsets, widths and whether encodings are bit-packed
+#   encodings.bin   per segment: samples x stride bytes (bit-packed haplotype encodings, or uint8 if not 0/1)
+#   embeddings.bin  per segment: samples x dim float32
+# Rows are in the sample order of index.json for every segment, so a (segment, samples) slice is a
+# fixed-stride read that np.memmap can map without parsing. index.json lists the samples of every
+# segment file, and a segment records the samples its .gt (missing) or .emb (emb_missing) file lacks;
+# their rows are zero-filled placeholders that the readers leave out.
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Convert .gt and .emb segment files to a memory-mapped store')
+    parser.add_argument('--encodings', type=str, required=True, help='directory with chrmN.segmentM.gt files')
+    parser.add_argument('--embeddings', type=str, help='directory with chrmN.segmentM.emb files')
+    parser.add_argument('--chrm', type=str, required=True)
+    parser.add_argument('--out', type=str, required=True, help='directory to write chrmN.store/ to')
+    return parser.parse_args()
+
+def read_segment_file(segment_file, dtype):
+    '''
+    read a whitespace separated segment file (sample_ID v1 v2 ...)
+    @return: list of sample IDs, samples x values array
+    '''
+    sample_IDs = []
+    values = []
+    with open(segment_file, 'r') as f:
+        for line in f:
+            L = line.strip().split()
+            if len(L) == 0:
+                continue
+            sample_IDs.append(L[0])
+            values.append(L[1:])
+    return sample_IDs, np.array(values, dtype=dtype)
+
+def read_segment_samples(segment_file):
+    '''
+    sample IDs of a segment file, without parsing its values
+    '''
+    with open(segment_file, 'r') as f:
+        return [line.split(None, 1)[0] for line in f if line.strip()]
+
+def get_store_dir(out_dir, chrm):
+    return os.path.join(out_dir, 'chrm' + chrm + '.store')
+
+def place_rows(sample_index, seg_samples, values, dtype):
+    '''
+    place the rows of a segment file in store order, zero-filling samples the file lacks
+    @return: samples x values array, IDs of the samples the file lacks
+    '''
+    rows = np.zeros((len(sample_index), values.shape[1]), dtype=dtype)
+    rows[np.array([sample_index[s] for s in seg_samples], dtype=np.int64)] = values
+    present = set(seg_samples)
+    missing = [sample for sample in sample_index if sample not in present]
+    return rows, missing
+
+def write_store(encodings_dir, embeddings_dir, chrm, out_dir):
+    '''
+    convert every segment of a chromosome into one store
+    @return: path to the store directory
+    '''
+    pattern = re.compile(r'\.segment(\d+)\.gt$')
+    gt_files = glob.glob(encodings_dir + 'chrm' + chrm + '.segment*.gt')
+    segments = sorted([int(pattern.search(f).group(1)) for f in gt_files])
+
+    def get_gt_file(seg):
+        return encodings_dir + 'chrm' + chrm + '.segment' + str(seg) + '.gt'
+
+    def get_emb_file(seg):
+        return embeddings_dir + 'chrm' + chrm + '.segment' + str(seg) + '.emb'
+
+    # samples of every segment file, in the order they are first seen
+    sample_index = {}
+    for seg in segments:
+        seg_files = [get_gt_file(seg)] + ([get_emb_file(seg)] if embeddings_dir is not None else [])
+        for seg_file in seg_files:
+            for sample in read_segment_samples(seg_file):
+                sample_index.setdefault(sample, len(sample_index))
+    samples = list(sample_index)
+
+    store_dir = get_store_dir(out_dir, chrm)
+    os.makedirs(store_dir, exist_ok=True)
+
+    index = {'chrm': chrm, 'samples': samples, 'segments': {}}
+    enc_offset = 0
+    emb_offset = 0
+    with open(os.path.join(store_dir, 'encodings.bin'), 'wb') as enc_f, \
+            open(os.path.join(store_dir, 'embeddings.bin'), 'wb') as emb_f:
+        for seg in segments:
+            print('segment...', seg)
+            seg_samples, encodings = read_segment_file(get_gt_file(seg), np.uint8)
+            # every segment is stored in the same sample order
+            rows, missing = place_rows(sample_index, seg_samples, encodings, np.uint8)
+            if len(missing) > 0:
+                print(f'Warning: {len(missing)} samples missing from segment {seg} encodings', file=sys.stderr)
+
+            packed = bool(encodings.size == 0 or encodings.max() <= 1)
+            if packed:
+                rows = np.packbits(rows, axis=1)
+            enc_f.write(np.ascontiguousarray(rows).tobytes())
+            segment_index = {'enc_offset': enc_offset,
+                             'enc_width': int(encodings.shape[1]),
+                             'enc_stride': int(rows.shape[1]),
+                             'packed': packed,
+                             'missing': missing}
+            enc_offset += rows.nbytes
+
+            if embeddings_dir is not None:
+                emb_samples, embeddings = read_segment_file(get_emb_file(seg), np.float32)
+                emb_rows, emb_missing = place_rows(sample_index, emb_samples, embeddings, np.float32)
+                if len(emb_missing) > 0:
+                    print(f'Warning: {len(emb_missing)} samples missing from segment {seg} embeddings',
+                          file=sys.stderr)
+                emb_f.write(np.ascontiguousarray(emb_rows).tobytes())
+                segment_index['emb_offset'] = emb_offset
+                segment_index['emb_dim'] = int(embeddings.shape[1])
+                segment_index['emb_missing'] = emb_missing
+                emb_offset += emb_rows.nbytes
+
+            index['segments'][str(seg)] = segment_index
+
+    with open(os.path.join(store_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    return store_dir
+
+class SegmentStore:
+    '''
+    Read-only view of a chromosome store; slices are memory mapped so worker processes share pages
+    '''
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'index.json'), 'r') as f:
+            index = json.load(f)
+        self.chrm = index['chrm']
+        self.samples = index['samples']
+        self.sample_index = {sample: i for i, sample in enumerate(self.samples)}
+        self.segment_index = {int(seg): info for seg, info in index['segments'].items()}
+        self.segments = sorted(self.segment_index.keys())
+        self.enc_map = np.memmap(os.path.join(store_dir, 'encodings.bin'), dtype=np.uint8, mode='r')
+        emb_file = os.path.join(store_dir, 'embeddings.bin')
+        if os.path.getsize(emb_file) > 0:
+            self.emb_map = np.memmap(emb_file, dtype=np.uint8, mode='r')
+        else:
+            self.emb_map = None
+
+    def get_rows(self, samples):
+        if samples is None:
+            return slice(None)
+        return np.array([self.sample_index[s] for s in samples], dtype=np.int64)
+
+    def get_samples(self, segment, embeddings=False):
+        '''
+        samples that are in the segment's .gt file (or its .emb file with embeddings=True), in store order
+        '''
+        missing = set(self.segment_index[segment].get('emb_missing' if embeddings else 'missing', []))
+        if len(missing) == 0:
+            return self.samples
+        return [sample for sample in self.samples if sample not in missing]
+
+    def get_encodings(self, segment, samples=None):
+        '''
+        @param segment: segment index
+        @param samples: list of sample IDs (default: all samples in store order)
+        @return: samples x sites uint8 array
+        '''
+        info = self.segment_index[segment]
+        size = len(self.samples) * info['enc_stride']
+        block = self.enc_map[info['enc_offset']:info['enc_offset'] + size].reshape(len(self.samples),
+                                                                                   info['enc_stride'])
+        block = block[self.get_rows(samples)]
+        if info['packed']:
+            return np.unpackbits(block, axis=1, count=info['enc_width'])
+        return np.asarray(block)
+
+    def get_densities(self, segment, samples=None):
+        '''
+        number of non-reference alleles per sample (sum of the encoding)
+        @param samples: list of sample IDs (default: the samples in the segment, see get_samples)
+        '''
+        if samples is None:
+            samples = self.get_samples(segment)
+        return self.get_encodings(segment, samples).sum(axis=1, dtype=np.int64)
+
+    def get_embeddings(self, segment, samples=None):
+        '''
+        @param segment: segment index
+        @param samples: list of sample IDs (default: all samples in store order)
+        @return: samples x dim float32 array
+        '''
+        info = self.segment_index[segment]
+        size = len(self.samples) * info['emb_dim'] * 4
+        block = self.emb_map[info['emb_offset']:info['emb_offset'] + size].view(np.float32)
+        block = block.reshape(len(self.samples), info['emb_dim'])
+        return block[self.get_rows(samples)]
+
+    def get_encoding_dict(self, segment):
+        # same shape as the gt_dict built from a .gt file
+        samples = self.get_samples(segment)
+        return dict(zip(samples, self.get_encodings(segment, samples).astype(np.int64)))
+
+    def get_embedding_dict(self, segment):
+        # same shape as the emb_dict built from a .emb file
+        samples = self.get_samples(segment, embeddings=True)
+        return dict(zip(samples, self.get_embeddings(segment, samples).astype(np.float64)))
+
+def main():
+    args = get_args()
+    store_dir = write_store(args.encodings, args.embeddings, args.chrm, args.out)
+    print('wrote', store_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+import argparse
+from collections import defaultdict
+import heapq
+import json
+import os
+import subprocess
+import sys
+import zlib
+
+import compressed_io
+import profiling
+import write_ccpm_ancestry as wca
+import write_plink_top_k as wpk
+
+# Sharded top K / ancestry post-processing for inputs too large for one node.
+#   plan:  assign every query to a shard by crc32(sample id) % num_shards and write manifest.json
+#   work:  one shard (a local process or a job on another node sharing the file system) streams the
+#          inputs, keeps only the top K of its own queries and writes shard_NNN/ plus a DONE file
+#   merge: once every shard is DONE, merge the shard outputs into the files write_plink_top_k.py and
+#          write_ccpm_ancestry.py write
+#   run:   plan, work on every shard with local processes, merge
+# The results do not depend on the number of shards, and match the reference scripts:
+#   plink queries are in the order they first appear in the plink file (as write_plink_top_k.py writes them);
+#          every shard file has a .order file with those positions for the merge
+#   ccpm   only the first --max_files (default 100, as in write_ccpm_ancestry.get_cohorts) .knn files in
+#          sorted order are read, and queries are written in that order (as get_cohorts does)
+
+MANIFEST = 'manifest.json'
+DONE = 'DONE'
+
+# score -> (sample columns, score column) of the plink outputs
+PLINK_COLUMNS = {'DST': ((0, 2), 11),
+                 'pihat': ((0, 2), 9),
+                 'kin': ((0, 1), 5)}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sharded plink top K and ccpm ancestry post-processing')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_inputs(p):
+        p.add_argument('--out_dir', help='shared output directory', required=True)
+        p.add_argument('--num_shards', type=int, help='number of shards', required=True)
+        p.add_argument('--knn', type=int, help='top K hits to return', default=20)
+        p.add_argument('--plink_dst', help='plink genome output file')
+        p.add_argument('--plink_pihat', help='plink pihat output file')
+        p.add_argument('--plink_kin', help='plink kinship output file')
+        p.add_argument('--chrom_hits', help='directory of <query>.knn files (ccpm_chrm_<C>/)')
+        p.add_argument('--ancestry', help='ccpm ancestry labels (needed with --chrom_hits)')
+        p.add_argument('--max_files', type=int, default=100,
+                       help='read only the first N .knn files in sorted order, as write_ccpm_ancestry.py (0: all)')
+
+    add_inputs(subparsers.add_parser('plan', help='write the shard manifest'))
+    work = subparsers.add_parser('work', help='process one shard')
+    work.add_argument('--manifest', help='manifest.json written by plan', required=True)
+    work.add_argument('--shard', type=int, help='shard index', required=True)
+    merge = subparsers.add_parser('merge', help='merge finished shards')
+    merge.add_argument('--manifest', help='manifest.json written by plan', required=True)
+    run = subparsers.add_parser('run', help='plan, work on all shards locally, merge')
+    add_inputs(run)
+    run.add_argument('--workers', type=int, help='shards processed at once', default=os.cpu_count())
+    return parser.parse_args()
+
+def get_shard(sample_id, num_shards):
+    # crc32 is stable across processes and machines (unlike hash())
+    return zlib.crc32(sample_id.encode()) % num_shards
+
+def get_shard_dir(manifest, shard):
+    return os.path.join(manifest['out_dir'], 'shard_' + str(shard).zfill(3))
+
+def get_chrm(chrom_hits):
+    return int(os.path.normpath(chrom_hits).split(os.sep)[-1].split('_')[-1])
+
+def plan(args):
+    '''
+    Write the manifest every worker and the merge read
+    @return: path to the manifest
+    '''
+    plink = {score: os.path.abspath(path) for score, path in
+             (('DST', args.plink_dst), ('pihat', args.plink_pihat), ('kin', args.plink_kin)) if path is not None}
+    if len(plink) == 0 and args.chrom_hits is None:
+        sys.exit('Error: no inputs, give plink files and/or --chrom_hits')
+    for path in plink.values():
+        if not os.path.exists(path):
+            sys.exit(f'Error: {path} does not exist')
+
+    manifest = {'version': 1,
+                'hash': 'crc32',
+                'num_shards': args.num_shards,
+                'k': args.knn,
+                'out_dir': os.path.abspath(args.out_dir),
+                'plink': plink,
+                'ccpm': None}
+    if args.chrom_hits is not None:
+        if args.ancestry is None:
+            sys.exit('Error: --chrom_hits needs --ancestry')
+        for path in (args.chrom_hits, args.ancestry):
+            if not os.path.exists(path):
+                sys.exit(f'Error: {path} does not exist')
+        manifest['ccpm'] = {'chrom_hits': os.path.abspath(args.chrom_hits),
+                            'ancestry': os.path.abspath(args.ancestry),
+                            'chrm': get_chrm(args.chrom_hits),
+                            'max_files': args.max_files}
+
+    os.makedirs(manifest['out_dir'], exist_ok=True)
+    manifest_file = os.path.join(manifest['out_dir'], MANIFEST)
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+    return manifest_file
+
+def read_manifest(manifest_file):
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+@profiling.profiled(rows=None)
+def get_shard_plink_top_hits(plink, scores, shard, num_shards, K):
+    '''
+    Top K of the shard's queries for every score read from one plink file
+    @param plink: plink file
+    @param scores: scores in PLINK_COLUMNS read from this file
+    @return: {score: {query: [(match, score), ...]}} with queries in file order,
+             {query: position of its first appearance in the file}
+    '''
+    # query -> heap of (score, -line, match); ties go to the earlier line as in get_plink_top_hits
+    heaps = {score: defaultdict(list) for score in scores}
+    # sample A of a line comes before sample B, as the read_plink dicts add them
+    first_seen = {}
+    lines = compressed_io.iter_lines(plink)
+    next(lines)
+    for line_num, line in enumerate(lines):
+        line = line.split()
+        for score in scores:
+            (a_column, b_column), score_column = PLINK_COLUMNS[score]
+            sample_A = line[a_column]
+            sample_B = line[b_column]
+            value = float(line[score_column])
+            for side, (query, match) in enumerate(((sample_A, sample_B), (sample_B, sample_A))):
+                if get_shard(query, num_shards) != shard:
+                    continue
+                if query not in first_seen:
+                    first_seen[query] = 2 * line_num + side
+                heap = heaps[score][query]
+                item = (value, -line_num, match)
+                if len(heap) < K:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+    queries = sorted(first_seen, key=first_seen.get)
+    top_hits = {score: {query: [(match, value) for value, line_num, match in sorted(heaps[score][query], reverse=True)]
+                        for query in queries if query in heaps[score]}
+                for score in scores}
+    return top_hits, first_seen
+
+def get_knn_files(chrom_hits, max_files):
+    '''
+    .knn files read from a directory, in sorted order (the first max_files of them unless it is 0)
+    '''
+    files = sorted(file for file in os.listdir(chrom_hits) if file.endswith('.knn'))
+    return files[:max_files] if max_files > 0 else files
+
+@profiling.profiled(rows=None)
+def get_shard_ccpm_hits(chrom_hits, shard, num_shards, max_files):
+    '''
+    Hits of the shard's queries in a directory of .knn files
+    @return: {query: [(match, genosis_score), ...]}, queries in file name order
+    '''
+    hits = {}
+    for file in get_knn_files(chrom_hits, max_files):
+        if get_shard(file.split('.')[0], num_shards) != shard:
+            continue
+        query_id, query_hits = wca.read_query_hits(os.path.join(chrom_hits, file))
+        hits[query_id] = query_hits
+    return hits
+
+def get_ancestry_counts(ccpm_ancestry, ccpm_top_k):
+    '''
+    Number of hits of each ancestry for queries of each ancestry
+    @return: {(query_ancestry, hit_ancestry): count}
+    '''
+    counts = defaultdict(int)
+    for query_id, hits in ccpm_top_k.items():
+        for hit in hits:
+            counts[(ccpm_ancestry[query_id], ccpm_ancestry[hit])] += 1
+    return counts
+
+def write_ancestry_counts(counts, output_file):
+    with open(output_file, 'w') as f:
+        f.write('query_ancestry\thit_ancestry\tcount\n')
+        for (query_ancestry, hit_ancestry), count in sorted(counts.items()):
+            f.write(f'{query_ancestry}\t{hit_ancestry}\t{count}\n')
+
+def read_ancestry_counts(input_file):
+    counts = {}
+    with open(input_file, 'r') as f:
+        f.readline()
+        for line in f:
+            query_ancestry, hit_ancestry, count = line.rstrip('\n').split('\t')
+            counts[(query_ancestry, hit_ancestry)] = int(count)
+    return counts
+
+def get_output_files(manifest):
+    '''
+    file name -> separator of the query key of each line (first field), for every output of a shard and
+    of the merge; None for plink files, which are merged on their .order files
+    '''
+    output_files = {}
+    K = str(manifest['k'])
+    for score in manifest['plink']:
+        output_files['plink_' + score + '_top_' + K + '.txt'] = None
+    if manifest['ccpm'] is not None:
+        chrm = str(manifest['ccpm']['chrm'])
+        output_files[chrm + '_ccpm_anc.txt'] = ','
+        output_files[chrm + '_ccpm_genosis_scores.txt'] = '\t'
+    return output_files
+
+def get_order_file(shard_file):
+    return shard_file[:-len('.txt')] + '.order'
+
+def write_order(top_hits, first_seen, order_file):
+    '''
+    plink file position of every query of a shard file, a line per query
+    '''
+    with open(order_file, 'w') as f:
+        for query in top_hits:
+            f.write(f'{first_seen[query]}\n')
+
+def work(manifest, shard):
+    '''
+    Compute one shard's top K and ancestry aggregates into shard_NNN/
+    '''
+    num_shards = manifest['num_shards']
+    if shard < 0 or shard >= num_shards:
+        sys.exit(f'Error: shard {shard} is not in 0..{num_shards - 1}')
+    shard_dir = get_shard_dir(manifest, shard)
+    os.makedirs(shard_dir, exist_ok=True)
+    if os.path.exists(os.path.join(shard_dir, DONE)):
+        os.remove(os.path.join(shard_dir, DONE))
+    K = manifest['k']
+    num_queries = {}
+
+    # scores that come from the same file (DST and pihat from the .genome) are read in one pass
+    files = defaultdict(list)
+    for score, path in manifest['plink'].items():
+        files[path].append(score)
+    for path, scores in files.items():
+        top_hits, first_seen = get_shard_plink_top_hits(path, scores, shard, num_shards, K)
+        for score in scores:
+            # queries in file order, with their positions so the merge can stream the shard files
+            shard_file = os.path.join(shard_dir, 'plink_' + score + '_top_' + str(K) + '.txt')
+            wpk.write_top_k(top_hits[score], shard_file)
+            write_order(top_hits[score], first_seen, get_order_file(shard_file))
+            num_queries[score] = len(top_hits[score])
+
+    if manifest['ccpm'] is not None:
+        ccpm = manifest['ccpm']
+        chrm = str(ccpm['chrm'])
+        ccpm_ancestry = wca.read_ccpm_ancestry(ccpm['ancestry'])
+        hits = get_shard_ccpm_hits(ccpm['chrom_hits'], shard, num_shards, ccpm['max_files'])
+        ccpm_top_k = {query_id: [match for match, score in query_hits] for query_id, query_hits in hits.items()}
+        ccpm_scores = {query_id: dict(query_hits) for query_id, query_hits in hits.items()}
+        wca.write_ccpm_hits_ancestry(ccpm_ancestry, ccpm_top_k, os.path.join(shard_dir, chrm + '_ccpm_anc.txt'))
+        wca.write_ccpm_genosis_scores(ccpm_scores, os.path.join(shard_dir, chrm + '_ccpm_genosis_scores.txt'))
+        write_ancestry_counts(get_ancestry_counts(ccpm_ancestry, ccpm_top_k),
+                              os.path.join(shard_dir, chrm + '_ccpm_ancestry_counts.tsv'))
+        num_queries['ccpm'] = len(hits)
+
+    # written last: merge only trusts shards with a DONE file
+    with open(os.path.join(shard_dir, DONE), 'w') as f:
+        json.dump({'shard': shard, 'num_shards': num_shards, 'queries': num_queries}, f)
+
+def read_shard_lines(shard_file, separator):
+    '''
+    (key, line) of every line of a shard output after the header, in key order: the query for ccpm files
+    (separator is given), the plink file position of the query from the .order file for plink files
+    '''
+    with open(shard_file, 'r') as f:
+        f.readline()
+        if separator is not None:
+            for line in f:
+                yield line.split(separator, 1)[0], line
+        else:
+            with open(get_order_file(shard_file), 'r') as order:
+                for position, line in zip(order, f):
+                    yield int(position), line
+
+def merge(manifest):
+    '''
+    Merge the outputs of all shards into out_dir
+    @return: list of merged files
+    '''
+    shard_dirs = [get_shard_dir(manifest, shard) for shard in range(manifest['num_shards'])]
+    missing = [d for d in shard_dirs if not os.path.exists(os.path.join(d, DONE))]
+    if len(missing) > 0:
+        sys.exit('Error: shards not finished: ' + ', '.join(os.path.basename(d) for d in missing))
+
+    merged = []
+    for file_name, separator in get_output_files(manifest).items():
+        shard_files = [os.path.join(d, file_name) for d in shard_dirs]
+        with open(shard_files[0], 'r') as f:
+            header = f.readline()
+        out_file = os.path.join(manifest['out_dir'], file_name)
+        with open(out_file + '.tmp', 'w') as f:
+            f.write(header)
+            # every query is in exactly one shard, so a k-way merge on the key keeps the order total
+            for query, line in heapq.merge(*[read_shard_lines(s, separator) for s in shard_files],
+                                           key=lambda x: x[0]):
+                f.write(line)
+        os.replace(out_file + '.tmp', out_file)
+        merged.append(out_file)
+
+    if manifest['ccpm'] is not None:
+        file_name = str(manifest['ccpm']['chrm']) + '_ccpm_ancestry_counts.tsv'
+        counts = defaultdict(int)
+        for d in shard_dirs:
+            for key, count in read_ancestry_counts(os.path.join(d, file_name)).items():
+                counts[key] += count
+        write_ancestry_counts(counts, os.path.join(manifest['out_dir'], file_name))
+        merged.append(os.path.join(manifest['out_dir'], file_name))
+    return merged
+
+def run_local(manifest_file, workers):
+    '''
+    Work on every shard with local processes, as separate jobs would
+    @return: list of failed shards
+    '''
+    manifest = read_manifest(manifest_file)
+    pending = list(range(manifest['num_shards']))
+    running = {}
+    failed = []
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < workers:
+            shard = pending.pop(0)
+            running[shard] = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'work',
+                                               '--manifest', manifest_file, '--shard', str(shard)])
+        shard = next(iter(running))
+        if running.pop(shard).wait() != 0:
+            failed.append(shard)
+    return failed
+
+def main():
+    args = parse_args()
+
+    if args.command == 'plan':
+        print('wrote', plan(args))
+    elif args.command == 'work':
+        work(read_manifest(args.manifest), args.shard)
+    elif args.command == 'merge':
+        for out_file in merge(read_manifest(args.manifest)):
+            print('wrote', out_file)
+    elif args.command == 'run':
+        manifest_file = plan(args)
+        failed = run_local(manifest_file, max(1, args.workers))
+        if len(failed) > 0:
+            sys.exit('Error: shards failed: ' + ' '.join(str(s) for s in failed))
+        for out_file in merge(read_manifest(manifest_file)):
+            print('wrote', out_file)
+
+if __name__ == '__main__':
+    main()
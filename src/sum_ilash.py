@@ -1,30 +1,63 @@
 import argparse
 import glob
 
+import numpy as np
+
+import haplotype_ids
+import pairwise_parquet
+
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--data_dir', type=str, required=True)
-    parser.add_argument('--out_file', type=str, required=True)
+    parser.add_argument('--out_file', type=str, required=True, help='text, or Parquet if it ends with .parquet')
     return parser.parse_args()
 
-def main():
-    args = get_args()
-
-    pairs = {}
+def get_pair_lengths(match_files):
+    '''
+    Sum iLASH IBD segment lengths for every pair of samples
+    @param match_files: list of iLASH .match files
+    @return: dictionary of {(sample_A, sample_B): total length}
+    '''
+    ids = haplotype_ids.HaplotypeIds()
+    a_codes = []
+    b_codes = []
+    lengths = []
 
-    for file in glob.glob(args.data_dir + '*.match'):
+    for file in match_files:
+        a = []
+        b = []
         with open(file) as lines:
             for line in lines:
                 A = line.rstrip().split('\t')
-                a = A[1][:-2]
-                b = A[3][:-2]
-                l = float(A[9])
+                a.append(A[1])
+                b.append(A[3])
+                lengths.append(float(A[9]))
+        a_codes.append(ids.encode(a))
+        b_codes.append(ids.encode(b))
+
+    if len(lengths) == 0:
+        return {}
+
+    # haplotype segments -> sample pairs, summed in file order
+    sample_A, sample_B, totals = haplotype_ids.collapse_pairs(np.concatenate(a_codes), np.concatenate(b_codes),
+                                                              np.array(lengths), how='sum', symmetric=True)
+    names_A = ids.sample_names(sample_A)
+    names_B = ids.sample_names(sample_B)
+    # a pair is named in sorted order
+    swap = names_A > names_B
+    names_A, names_B = np.where(swap, names_B, names_A), np.where(swap, names_A, names_B)
+
+    return dict(zip(zip(names_A.tolist(), names_B.tolist()), totals.tolist()))
+
+def main():
+    args = get_args()
 
-                pair = tuple(sorted([a,b]))
+    pairs = get_pair_lengths(glob.glob(args.data_dir + '*.match'))
 
-                if pair not in pairs:
-                    pairs[pair] = 0
-                pairs[pair] = pairs[pair] + l
+    if pairwise_parquet.is_parquet(args.out_file):
+        rows = ((pair[0], pair[1], pairs[pair]) for pair in pairs)
+        pairwise_parquet.write_pairs(rows, 'ilash', args.out_file)
+        return
 
     with open(args.out_file, 'w') as f:
         for pair in pairs:
@@ -0,0 +1,240 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+# Timing logs of the segment searches as one table.
+# Every chromosome log (chrmC_segments.log) is parsed in its own process into rows of
+# (chromosome, segment, stage, seconds); stages are the 'reading', 'loading', 'searching', 'scoring',
+# 'full' and 'sorting' lines of the GenoSiS logs and the 'real XmYs' lines written by `time`.
+# The summary has per-query latency percentiles for every stage, throughput, and the stage that
+# takes most of the search time (critical path). A summary written with --out can be passed back
+# as --baseline of a later run, which reports (and exits non-zero on) stages that got slower.
+
+STAGES = ['reading', 'loading', 'searching', 'scoring', 'full', 'sorting', 'real']
+# stages that make up one segment search ('full' and 'real' are totals, 'sorting' is once per chromosome)
+SEARCH_STAGES = ['reading', 'loading', 'searching', 'scoring']
+PERCENTILES = [50, 95, 99]
+
+STAGE_LINE = re.compile(r'^(?P<label>[^:]*):\s*(?P<seconds>[-+0-9.eE]+)')
+REAL_LINE = re.compile(r'^real\s+(?P<minutes>[0-9.]+)m(?P<seconds>[0-9.]+)s')
+CONFIG_LINE = re.compile(r'segment(?P<segment>\d+)\.')
+CHROMOSOME = re.compile(r'chrm(?P<chromosome>\d+)')
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Parse segment search timing logs and summarize latency')
+    parser.add_argument('--logs', type=str, nargs='+', required=True,
+                        help='log files or directories of chrm*_segments.log files')
+    parser.add_argument('--num_samples', type=int, required=True, help='number of samples searched')
+    parser.add_argument('--haplotypes', type=int, default=2, help='queries per sample')
+    parser.add_argument('--threads', type=int, default=None, help='logs parsed at once')
+    parser.add_argument('--table', type=str, help='write the parsed rows as tsv here')
+    parser.add_argument('--out', type=str, help='write the summary JSON here')
+    parser.add_argument('--baseline', type=str, help='baseline summary JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio (current / baseline) reported as a regression')
+    return parser.parse_args()
+
+def get_chromosome(log_file):
+    match = CHROMOSOME.search(os.path.basename(log_file))
+    return int(match.group('chromosome')) if match else 0
+
+def get_log_files(paths):
+    log_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            log_files.extend(glob.glob(os.path.join(path, 'chrm*_segments.log')))
+        else:
+            log_files.append(path)
+    return sorted(log_files, key=lambda f: (get_chromosome(f), f))
+
+def parse_log(log_file):
+    '''
+    Parse one timing log
+    @param log_file: log of one chromosome, named chrm<C>...
+    @return: chromosome, list of (segment, stage, seconds)
+             (segment is -1 for once-per-chromosome stages)
+    '''
+    chromosome = get_chromosome(log_file)
+    rows = []
+    segment = None
+    # without config lines the n-th time of a stage belongs to the n-th segment
+    stage_counts = dict.fromkeys(STAGES, 0)
+    with open(log_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if 'config' in line: # chrm8.segment117.config
+                config = CONFIG_LINE.search(line)
+                if config:
+                    segment = int(config.group('segment'))
+                continue
+            real = REAL_LINE.match(line)
+            if real:
+                stage = 'real'
+                seconds = float(real.group('minutes')) * 60 + float(real.group('seconds'))
+            else:
+                stage_line = STAGE_LINE.match(line)
+                if not stage_line:
+                    continue
+                stage = next((s for s in STAGES[:-1] if s in stage_line.group('label')), None)
+                if stage is None:
+                    continue
+                seconds = float(stage_line.group('seconds'))
+            if stage == 'sorting':
+                row_segment = -1
+            elif segment is not None:
+                row_segment = segment
+            else:
+                row_segment = stage_counts[stage]
+            stage_counts[stage] += 1
+            rows.append((row_segment, stage, seconds))
+    return chromosome, rows
+
+def read_logs(log_files, threads=None):
+    '''
+    Parse all logs in parallel into a columnar table
+    @return: {'chromosome': int array, 'segment': int array, 'stage': str array, 'seconds': float array}
+    '''
+    chromosomes, segments, stages, seconds = [], [], [], []
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for chromosome, rows in executor.map(parse_log, log_files):
+            chromosomes.extend([chromosome] * len(rows))
+            for segment, stage, time in rows:
+                segments.append(segment)
+                stages.append(stage)
+                seconds.append(time)
+    return {'chromosome': np.array(chromosomes, dtype=np.int32),
+            'segment': np.array(segments, dtype=np.int32),
+            'stage': np.array(stages, dtype=str),
+            'seconds': np.array(seconds, dtype=np.float64)}
+
+def write_table(table, out_file):
+    with open(out_file, 'w') as f:
+        f.write('chromosome\tsegment\tstage\tseconds\n')
+        for chromosome, segment, stage, seconds in zip(table['chromosome'], table['segment'],
+                                                       table['stage'], table['seconds']):
+            f.write(f'{chromosome}\t{segment}\t{stage}\t{seconds}\n')
+
+def summarize(table, num_queries):
+    '''
+    Per-stage latency and throughput
+    @param table: output of read_logs
+    @param num_queries: queries searched against every segment
+    @return: {'stages': {stage: {...}}, 'critical_path': {...}, ...}
+    '''
+    summary = {'num_queries': num_queries,
+               'chromosomes': sorted(int(c) for c in np.unique(table['chromosome'])),
+               'stages': {}}
+    for stage in STAGES:
+        seconds = table['seconds'][table['stage'] == stage]
+        if len(seconds) == 0:
+            continue
+        # time one query spends on one segment
+        ms_per_query = seconds / num_queries * 1000
+        stage_summary = {'count': int(len(seconds)), 'total_s': float(seconds.sum())}
+        for p, value in zip(PERCENTILES, np.percentile(ms_per_query, PERCENTILES)):
+            stage_summary['p' + str(p) + '_ms'] = float(value)
+        summary['stages'][stage] = stage_summary
+
+    search_stages = [s for s in SEARCH_STAGES if s in summary['stages']]
+    if len(search_stages) > 0:
+        totals = {s: summary['stages'][s]['total_s'] for s in search_stages}
+        critical = max(totals, key=totals.get)
+        summary['critical_path'] = {'stage': critical,
+                                    'total_s': totals[critical],
+                                    'fraction': totals[critical] / sum(totals.values())}
+
+    # the end-to-end time of a segment is 'full' (or 'real' for `time` logs) else the sum of its stages
+    total_stage = next((s for s in ('full', 'real') if s in summary['stages']), None)
+    if total_stage is not None:
+        mask = table['stage'] == total_stage
+        total_s = float(table['seconds'][mask].sum())
+        num_segments = int(mask.sum())
+    else:
+        mask = np.isin(table['stage'], search_stages)
+        total_s = float(table['seconds'][mask].sum())
+        num_segments = len({(c, s) for c, s in zip(table['chromosome'][mask], table['segment'][mask])})
+    if total_s > 0:
+        summary['throughput'] = {'segments': num_segments,
+                                 'total_s': total_s,
+                                 'segment_queries_per_s': num_segments * num_queries / total_s,
+                                 # every query is searched against every segment
+                                 'queries_per_s': num_queries / total_s,
+                                 'query_s': total_s / num_queries}
+    return summary
+
+def compare(current, baseline, threshold):
+    '''
+    Print current / baseline latency ratios
+    @return: list of (stage, percentile, ratio) slower than the threshold
+    '''
+    regressions = []
+    print('\n' + f'{"stage":12s} {"metric":>8s} {"baseline":>10s} {"current":>10s} {"ratio":>7s}')
+    for stage, stage_summary in current['stages'].items():
+        for p in PERCENTILES:
+            metric = 'p' + str(p) + '_ms'
+            try:
+                base = baseline['stages'][stage][metric]
+            except KeyError:
+                continue
+            if base <= 0:
+                continue
+            ratio = stage_summary[metric] / base
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f'{stage:12s} {metric:>8s} {base:10.4f} {stage_summary[metric]:10.4f} {ratio:7.2f}{flag}')
+            if ratio > threshold:
+                regressions.append((stage, metric, ratio))
+    if 'throughput' in current and 'throughput' in baseline:
+        ratio = baseline['throughput']['queries_per_s'] / current['throughput']['queries_per_s']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f'{"throughput":12s} {"q/s":>8s} {baseline["throughput"]["queries_per_s"]:10.4f} '
+              f'{current["throughput"]["queries_per_s"]:10.4f} {ratio:7.2f}{flag}')
+        if ratio > threshold:
+            regressions.append(('throughput', 'queries_per_s', ratio))
+    return regressions
+
+def print_summary(summary):
+    print(f'{"stage":12s} {"count":>8s} {"total (s)":>12s} ' +
+          ' '.join(f'{"p" + str(p) + " (ms)":>10s}' for p in PERCENTILES))
+    for stage, s in summary['stages'].items():
+        print(f'{stage:12s} {s["count"]:8d} {s["total_s"]:12.2f} ' +
+              ' '.join(f'{s["p" + str(p) + "_ms"]:10.4f}' for p in PERCENTILES))
+    if 'critical_path' in summary:
+        c = summary['critical_path']
+        print('critical path:', c['stage'], f'({c["fraction"] * 100:.1f}% of search time)')
+    if 'throughput' in summary:
+        t = summary['throughput']
+        print(f'throughput: {t["segment_queries_per_s"]:.1f} segment queries/s, '
+              f'{t["query_s"]:.4f} s per query over {t["segments"]} segments')
+
+def main():
+    args = get_args()
+    log_files = get_log_files(args.logs)
+    if len(log_files) == 0:
+        sys.exit('Error: no timing logs found')
+
+    table = read_logs(log_files, args.threads)
+    if args.table is not None:
+        write_table(table, args.table)
+    summary = summarize(table, args.num_samples * args.haplotypes)
+    print_summary(summary)
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(len(regressions), 'regressions over', args.threshold)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import argparse
+from itertools import combinations
+import sys
+
+import numpy as np
+
+import compressed_io
+import haplotype_ids
+import plotting.ancestry_helpers as ancestry_helpers
+import profiling
+
+# Per-query agreement between the top K hits of two methods (e.g. GenoSiS and plink DST).
+# The hits of every method are a (query x K) matrix of integer sample indexes, -1 past the last hit.
+# For a pair of methods the rank of every hit of one method in the same row of the other is found for
+# a block of rows at once: row * width + sample keys of one matrix are sorted and the other's keys are
+# looked up with searchsorted. Every metric follows from those ranks with array operations:
+#   jaccard: shared hits / hits in either list
+#   rbo: extrapolated rank-biased overlap (Webber et al. 2010), overlap at depth d weighted by rbo_p^d
+#   footrule: mean |rank difference| of the shared hits (NaN with no shared hits)
+
+METRICS = ['shared', 'jaccard', 'rbo', 'footrule']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Agreement between the top K hits of GenoSiS and plink')
+    parser.add_argument('-g', '--genosis', help='genosis top hits file')
+    parser.add_argument('-pd', '--plink_dst', help='plink top K DST file (write_plink_top_k.py)')
+    parser.add_argument('-pp', '--plink_pihat', help='plink top K pi-hat file')
+    parser.add_argument('-pk', '--plink_kin', help='plink top K kinship file')
+    parser.add_argument('-k', '--top_k', type=int, default=20, help='hits per query compared')
+    parser.add_argument('--haplotypes', default=False, action='store_true',
+                        help='genosis IDs are haplotypes (<sample>_0, <sample>_1), collapse them to samples')
+    parser.add_argument('--rbo_p', type=float, default=0.9, help='rank-biased overlap persistence')
+    parser.add_argument('-a', '--ancestry', help='ancestry file, for per-population means')
+    parser.add_argument('--out_queries', required=True, help='output: agreement of every query')
+    parser.add_argument('--out_populations', help='output: mean agreement of every population')
+    return parser.parse_args()
+
+def get_topk_matrix(top_hits_dict, ids, k, haplotypes=False):
+    '''
+    Top K hits of every query as sample indexes
+    @param top_hits_dict: {query: [(match, score), ...]} in rank order
+    @param ids: HaplotypeIds that gives samples their indexes (new samples are added)
+    @param haplotypes: IDs are haplotype IDs; hits keep the rank of the best haplotype of a sample
+                       and only the first haplotype of a query sample is kept
+    @return: query sample indexes, queries x k int64 matrix of match sample indexes (-1 past the last hit)
+    '''
+    queries = []
+    rows = []
+    seen = set()
+    for query, hits in top_hits_dict.items():
+        matches = (match for match, score in hits)
+        if haplotypes:
+            query = query[:-2]
+            matches = (match[:-2] for match in matches)
+        if query in seen:
+            continue
+        seen.add(query)
+        # the query itself is not a hit, and a sample is only counted once
+        matches = [match for match in dict.fromkeys(matches) if match != query][:k]
+        queries.append(query)
+        rows.append(matches)
+
+    ids.add_samples(queries)
+    for matches in rows:
+        ids.add_samples(matches)
+    lengths = np.array([len(matches) for matches in rows], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    flat = ids.encode_samples([match for matches in rows for match in matches])
+    row_index = np.repeat(np.arange(len(rows)), lengths)
+    matrix = np.full((len(rows), k), -1, dtype=np.int64)
+    matrix[row_index, np.arange(len(flat)) - starts[row_index]] = flat
+    return ids.encode_samples(queries), matrix
+
+@profiling.profiled(rows=lambda top: len(top[0]))
+def read_top_k(top_hits_file, ids, k, haplotypes=False):
+    '''
+    get_topk_matrix of a top hits file (query match,score match,score ...), with or without a header
+    '''
+    top_hits_dict = {}
+    for line in compressed_io.iter_lines(top_hits_file):
+        line = line.split()
+        if len(line) == 0 or line[0] == 'query':
+            continue
+        top_hits_dict.setdefault(line[0], []).extend(tuple(hit.split(',')) for hit in line[1:])
+    return get_topk_matrix(top_hits_dict, ids, k, haplotypes)
+
+def align_queries(method_queries):
+    '''
+    Queries found by every method, in the order of the first method
+    @param method_queries: {method: query sample indexes}
+    @return: query sample indexes, {method: row of every query in that method's matrix}
+    '''
+    methods = list(method_queries.keys())
+    queries = method_queries[methods[0]]
+    for method in methods[1:]:
+        queries = queries[np.isin(queries, method_queries[method])]
+    rows = {}
+    for method in methods:
+        # the first row of a query that is listed twice
+        unique, first = np.unique(method_queries[method], return_index=True)
+        rows[method] = first[np.searchsorted(unique, queries)]
+    return queries, rows
+
+def match_ranks(a, b, block_size=65536):
+    '''
+    Rank (0-based) of every hit of a in the same row of b
+    @param a, b: queries x k match matrices (-1 past the last hit)
+    @return: queries x k int64 array, -1 where the hit is not in b's row or a has no hit
+    '''
+    num_queries, k = b.shape
+    width = int(max(a.max(initial=-1), b.max(initial=-1))) + 2
+    ranks = np.full(a.shape, -1, dtype=np.int64)
+    for start in range(0, num_queries, block_size):
+        end = min(start + block_size, num_queries)
+        # padding (-1) becomes key 0 of its row, so it never matches a real hit
+        offsets = np.arange(end - start, dtype=np.int64)[:, None] * width + 1
+        b_keys = (b[start:end] + offsets).ravel()
+        a_keys = (a[start:end] + offsets).ravel()
+        order = np.argsort(b_keys, kind='stable')
+        sorted_keys = b_keys[order]
+        found = np.minimum(np.searchsorted(sorted_keys, a_keys), len(sorted_keys) - 1)
+        hit = (sorted_keys[found] == a_keys) & (a[start:end].ravel() >= 0)
+        ranks[start:end] = np.where(hit, order[found] % k, -1).reshape(end - start, k)
+    return ranks
+
+def get_agreement(a, b, rbo_p=0.9, block_size=65536):
+    '''
+    Agreement of the top K hits of two methods for every query
+    @param a, b: queries x k match matrices of the same queries (-1 past the last hit)
+    @param rbo_p: rank-biased overlap persistence (weight of depth d is rbo_p^d)
+    @return: {metric: array with a value per query} for every metric in METRICS
+    '''
+    num_queries, k = a.shape
+    ranks = match_ranks(a, b, block_size)
+    shared_hits = ranks >= 0
+    shared = shared_hits.sum(axis=1)
+    union = (a >= 0).sum(axis=1) + (b >= 0).sum(axis=1) - shared
+
+    # a shared hit is in both lists from the depth of its lower rank on
+    columns = np.broadcast_to(np.arange(k), a.shape)
+    query_index, column = np.nonzero(shared_hits)
+    depth = np.maximum(column, ranks[query_index, column])
+    overlap = np.bincount(query_index * k + depth, minlength=num_queries * k).reshape(num_queries, k)
+    overlap = np.cumsum(overlap, axis=1)
+    depths = np.arange(1, k + 1)
+    weights = rbo_p ** depths
+    rbo = (1 - rbo_p) / rbo_p * ((overlap / depths) @ weights) + overlap[:, -1] / k * rbo_p ** k
+
+    displacement = np.where(shared_hits, np.abs(columns - ranks), 0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jaccard = shared / union
+        footrule = displacement / shared
+    return {'shared': shared, 'jaccard': jaccard, 'rbo': rbo, 'footrule': footrule}
+
+@profiling.profiled()
+def get_pair_agreements(method_matrices, rbo_p=0.9):
+    '''
+    get_agreement for every pair of methods
+    @param method_matrices: {method: queries x k match matrix}, rows of the same queries in every method
+    @return: {(method_a, method_b): {metric: array with a value per query}}
+    '''
+    return {(method_a, method_b): get_agreement(method_matrices[method_a], method_matrices[method_b], rbo_p)
+            for method_a, method_b in combinations(method_matrices.keys(), 2)}
+
+def get_group_means(values, groups, num_groups):
+    '''
+    Mean of the values of every group, leaving out NaNs
+    @return: means, number of values (not NaN) per group
+    '''
+    present = ~np.isnan(values)
+    sums = np.bincount(groups[present], weights=values[present], minlength=num_groups)
+    counts = np.bincount(groups[present], minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, counts
+
+def get_population_agreement(agreements, query_populations):
+    '''
+    Mean agreement of the queries of every population
+    @param query_populations: {level: population of every query}, e.g. subpop and superpop
+    @return: list of (level, population, method_a, method_b, queries, {metric: mean})
+    '''
+    summary = []
+    for level, populations in query_populations.items():
+        names, groups = np.unique(populations, return_inverse=True)
+        num_queries = np.bincount(groups, minlength=len(names))
+        for (method_a, method_b), metrics in agreements.items():
+            means = {metric: get_group_means(metrics[metric].astype(np.float64), groups, len(names))[0]
+                     for metric in METRICS}
+            for i, name in enumerate(names):
+                summary.append((level, name, method_a, method_b, int(num_queries[i]),
+                                {metric: means[metric][i] for metric in METRICS}))
+    return summary
+
+def get_query_populations(ancestry_file, query_names):
+    '''
+    @return: {'all': ..., 'superpop': ..., 'subpop': ...} population of every query ('NA' if unknown)
+    '''
+    subpopulations = ancestry_helpers.get_subpopulations(ancestry_file)
+    subpops = np.array([subpopulations.get(query, 'NA') for query in query_names])
+    superpops = np.array([ancestry_helpers.SUB_SUPERPOPULATIONS.get(subpop, 'NA') for subpop in subpops])
+    return {'all': np.full(len(query_names), 'all'), 'superpop': superpops, 'subpop': subpops}
+
+def write_query_agreement(query_names, agreements, out_file, query_populations=None):
+    with compressed_io.open_text(out_file, 'w') as f:
+        f.write('query\tsuperpop\tsubpop\tmethod_A\tmethod_B\t' + '\t'.join(METRICS) + '\n')
+        for (method_a, method_b), metrics in agreements.items():
+            columns = [metrics[metric].tolist() for metric in METRICS]
+            for i, query in enumerate(query_names.tolist()):
+                superpop = query_populations['superpop'][i] if query_populations else 'NA'
+                subpop = query_populations['subpop'][i] if query_populations else 'NA'
+                f.write(f'{query}\t{superpop}\t{subpop}\t{method_a}\t{method_b}\t{columns[0][i]}\t'
+                        + '\t'.join(f'{column[i]:.4f}' for column in columns[1:]) + '\n')
+
+def write_population_agreement(summary, out_file):
+    with compressed_io.open_text(out_file, 'w') as f:
+        f.write('level\tpopulation\tmethod_A\tmethod_B\tqueries\t' + '\t'.join(METRICS) + '\n')
+        for level, population, method_a, method_b, num_queries, means in summary:
+            f.write(f'{level}\t{population}\t{method_a}\t{method_b}\t{num_queries}\t'
+                    + '\t'.join(f'{means[metric]:.4f}' for metric in METRICS) + '\n')
+
+def main():
+    args = parse_args()
+
+    files = {'genosis': args.genosis,
+             'plink_DST': args.plink_dst,
+             'plink_pihat': args.plink_pihat,
+             'plink_kin': args.plink_kin}
+    files = {method: file for method, file in files.items() if file is not None}
+    if len(files) < 2:
+        sys.exit('Error: need the top hits of at least two methods')
+
+    ids = haplotype_ids.HaplotypeIds()
+    method_queries = {}
+    method_matrices = {}
+    for method, file in files.items():
+        method_queries[method], method_matrices[method] = read_top_k(file, ids, args.top_k,
+                                                                     args.haplotypes and method == 'genosis')
+    queries, rows = align_queries(method_queries)
+    if len(queries) == 0:
+        sys.exit('Error: no query is in every top hits file')
+    method_matrices = {method: method_matrices[method][rows[method]] for method in method_matrices}
+    print(len(queries), 'queries in every method')
+
+    agreements = get_pair_agreements(method_matrices, args.rbo_p)
+    query_names = ids.sample_names(queries)
+    query_populations = get_query_populations(args.ancestry, query_names) if args.ancestry else None
+    write_query_agreement(query_names, agreements, args.out_queries, query_populations)
+
+    if args.out_populations:
+        if query_populations is None:
+            query_populations = {'all': np.full(len(queries), 'all')}
+        write_population_agreement(get_population_agreement(agreements, query_populations),
+                                   args.out_populations)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import argparse
+from collections import defaultdict
+import heapq
+
+import plotting.ancestry_helpers as ancestry_helpers
+from write_subpop_counts import write_subpop_counts
+from write_trio_data import read_all_relationship_labels, get_relatedness_scores_and_ranks
+from write_trio_scores import write_relationship_scores
+from write_ranks import write_relationship_ranks
+import compressed_io
+import profiling
+
+# new pairs file format (one line per pair that involves a new sample):
+# sample_A sample_B score
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Merge new samples into existing top K hits and summaries')
+    parser.add_argument('--top_hits', type=str, required=True, help='existing top K hits file')
+    parser.add_argument('--header', default=False, action='store_true',
+                        help='top hits file has a header line (e.g. plink top K files)')
+    parser.add_argument('--new_pairs', type=str, required=True, help='pair scores for the new samples')
+    parser.add_argument('--k', type=int, required=True, help='number of hits per query')
+    parser.add_argument('--out_file', type=str, required=True, help='updated top K hits file')
+    # optional summary deltas
+    parser.add_argument('--ancestry', type=str, help='ancestry file (needed for summary updates)')
+    parser.add_argument('--subpop_counts', type=str, help='existing subpopulation counts file to update')
+    parser.add_argument('--subpop_counts_out', type=str, help='updated subpopulation counts file')
+    parser.add_argument('--labels', type=str, help='directory with 1KG_trios_POP.txt label files')
+    parser.add_argument('--score', type=str, help='type of score for trio outputs (e.g. GenoSiS)')
+    parser.add_argument('--trio_out', type=str, help='output dir for updated trio scores and ranks')
+    return parser.parse_args()
+
+@profiling.profiled()
+def read_top_k(top_k_file, header=False):
+    '''
+    Read a top K hits file keeping the query order of the file
+    @param top_k_file: path to top K hits file
+    @param header: skip the first line
+    @return: header line (or None), dictionary of {query: [(match, score), ...]}
+    '''
+    top_k = {}
+    header_line = None
+    with compressed_io.open_text(top_k_file) as f:
+        if header:
+            header_line = f.readline().strip()
+        for line in f:
+            line = line.strip().split()
+            if len(line) == 0:
+                continue
+            hits = []
+            for hit in line[1:]:
+                match, score = hit.split(',')
+                hits.append((match, float(score)))
+            top_k[line[0]] = hits
+    return header_line, top_k
+
+@profiling.profiled()
+def read_new_pairs(new_pairs_file):
+    '''
+    Read pair scores for new samples as candidate hits for both samples of every pair
+    @param new_pairs_file: path to new pair scores
+    @return: dictionary of {query: [(match, score), ...]}
+    '''
+    candidates = defaultdict(list)
+    with compressed_io.open_text(new_pairs_file) as f:
+        for line in f:
+            line = line.strip().split()
+            if len(line) < 3:
+                continue
+            sample_A, sample_B = line[0], line[1]
+            try:
+                score = float(line[2])
+            except ValueError:
+                # header
+                continue
+            candidates[sample_A].append((sample_B, score))
+            if sample_A != sample_B:
+                candidates[sample_B].append((sample_A, score))
+    return candidates
+
+def get_best_hits(hits):
+    '''
+    One hit per match with its best score, so a pair listed in both orientations is counted once
+    @param hits: list of (match, score)
+    @return: list of (match, score), matches in first seen order
+    '''
+    best = {}
+    for match, score in hits:
+        if match not in best or score > best[match]:
+            best[match] = score
+    return list(best.items())
+
+@profiling.profiled()
+def merge_top_k(top_k, candidates, k):
+    '''
+    Bounded merge of new candidate hits into each query's top K
+    @param top_k: existing {query: [(match, score), ...]}, updated in place
+    @param candidates: new {query: [(match, score), ...]}
+    @param k: number of hits per query
+    @return: list of existing queries whose hits changed, list of new queries
+    '''
+    changed_queries = []
+    new_queries = []
+    for query, new_hits in candidates.items():
+        new_hits = get_best_hits(new_hits)
+        if query in top_k:
+            old_hits = top_k[query]
+            seen = {match for match, score in old_hits}
+            merged = heapq.nlargest(k, old_hits + [hit for hit in new_hits if hit[0] not in seen],
+                                    key=lambda x: x[1])
+            if merged != old_hits:
+                top_k[query] = merged
+                changed_queries.append(query)
+        else:
+            new_queries.append(query)
+    # new queries are appended so existing queries keep their position in the file
+    for query in new_queries:
+        top_k[query] = heapq.nlargest(k, get_best_hits(candidates[query]), key=lambda x: x[1])
+    return changed_queries, new_queries
+
+@profiling.profiled(rows_arg=0)
+def write_top_k(top_k, header_line, output_file):
+    with compressed_io.open_text(output_file, 'w') as f:
+        if header_line is not None:
+            f.write(header_line + '\n')
+        for query in top_k:
+            f.write(' '.join([query] + [f'{match},{score}' for match, score in top_k[query]]) + '\n')
+
+def read_subpop_count_lists(subpop_counts_file):
+    '''
+    Read a write_subpop_counts output file back into count lists
+    @param subpop_counts_file: path to subpopulation counts file
+    @return: dictionary of {query_subpop: {match_subpop: [counts...]}}
+    '''
+    subpop_counts = defaultdict(dict)
+    with compressed_io.open_text(subpop_counts_file) as f:
+        f.readline()
+        for line in f:
+            line = line.strip().split('\t')
+            counts = line[2].split(',') if len(line) > 2 and line[2] != '' else []
+            subpop_counts[line[0]][line[1]] = [int(c) for c in counts]
+    return subpop_counts
+
+def get_query_subpop_counts(query, hits, subpopulations):
+    # same counting as write_subpop_counts.get_subpop_counts for one query
+    query_dict = {subpop: 0 for subpop in ancestry_helpers.SUBPOPULATIONS}
+    for match, score in hits:
+        if query in match:
+            continue
+        query_dict[subpopulations[match]] += 1
+    return query_dict
+
+@profiling.profiled()
+def update_subpop_counts(subpop_counts, old_query_order, top_k, changed_queries, new_queries, subpopulations):
+    '''
+    Replace the entries of changed queries and append entries for new queries
+    @param subpop_counts: {query_subpop: {match_subpop: [counts...]}}, one entry per query in file order
+    @param old_query_order: queries in the order of the original top hits file
+    @return: updated subpop_counts
+    '''
+    # position of each query within the lists of its own subpopulation
+    positions = {}
+    next_position = defaultdict(int)
+    for query in old_query_order:
+        query_subpop = subpopulations[query]
+        positions[query] = next_position[query_subpop]
+        next_position[query_subpop] += 1
+
+    for query in changed_queries:
+        query_subpop = subpopulations[query]
+        query_dict = get_query_subpop_counts(query, top_k[query], subpopulations)
+        for subpop, count in query_dict.items():
+            subpop_counts[query_subpop][subpop][positions[query]] = count
+    for query in new_queries:
+        query_subpop = subpopulations[query]
+        query_dict = get_query_subpop_counts(query, top_k[query], subpopulations)
+        for subpop, count in query_dict.items():
+            subpop_counts[query_subpop][subpop].append(count)
+    return subpop_counts
+
+@profiling.profiled(rows=None)
+def update_trio_data(top_k, changed_queries, new_queries, subpopulations, labels_dir, score_type, output_dir, k):
+    '''
+    Rewrite trio scores and ranks only for the populations that have changed or new queries.
+    Trio score lists do not record which query each score came from, so an affected population
+    is relabelled from the updated top hits instead of being patched in place.
+    '''
+    pops = sorted({ancestry_helpers.SUB_SUPERPOPULATIONS[subpopulations[query]]
+                   for query in changed_queries + new_queries})
+    if len(pops) == 0:
+        return pops
+    pop_labels = read_all_relationship_labels(labels_dir, pops)
+    top_hits_dict = {query: dict(hits) for query, hits in top_k.items()}
+    pop_scores, pop_ranks = get_relatedness_scores_and_ranks(top_hits_dict, pop_labels, subpopulations, pops)
+    for pop in pops:
+        write_relationship_scores(pop_scores[pop], score_type, output_dir, pop, str(k))
+        write_relationship_ranks(pop_ranks[pop], score_type, output_dir, pop, str(k))
+    return pops
+
+def main():
+    args = parse_args()
+
+    header_line, top_k = read_top_k(args.top_hits, args.header)
+    old_query_order = list(top_k.keys())
+    candidates = read_new_pairs(args.new_pairs)
+
+    changed_queries, new_queries = merge_top_k(top_k, candidates, args.k)
+    print('changed queries...', len(changed_queries))
+    print('new queries...', len(new_queries))
+    write_top_k(top_k, header_line, args.out_file)
+
+    if args.subpop_counts is not None or args.trio_out is not None:
+        if args.ancestry is None:
+            raise SystemExit('Error: --ancestry is required to update summaries')
+        subpopulations = ancestry_helpers.get_subpopulations(args.ancestry)
+
+        if args.subpop_counts is not None:
+            subpop_counts = read_subpop_count_lists(args.subpop_counts)
+            subpop_counts = update_subpop_counts(subpop_counts, old_query_order, top_k,
+                                                 changed_queries, new_queries, subpopulations)
+            write_subpop_counts(subpop_counts, args.subpop_counts_out)
+
+        if args.trio_out is not None:
+            pops = update_trio_data(top_k, changed_queries, new_queries, subpopulations,
+                                    args.labels, args.score, args.trio_out, args.k)
+            print('updated trio populations...', pops)
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,23 @@ import argparse
 from collections import defaultdict
 import os
 import sys
+import checkpoint
+import compressed_io
+import profiling
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--ancestry', help='ccpm ancestry labels', required=True)
     parser.add_argument('--chrom_hits', help='chromosome hits', required=True)
+    parser.add_argument('--checkpoints', help='directory for the completion journal and finished batches of hits '
+                                              '(an interrupted run started again skips them)')
+    parser.add_argument('--restart', default=False, action='store_true',
+                        help='ignore the journal and read every file again')
+    parser.add_argument('--compress', choices=['gz', 'zst'], help='compress outputs (block gzip or zstd)')
 
     return parser.parse_args()
 
+@profiling.profiled()
 def read_ccpm_ancestry(ccpm_ancestry_file):
     '''
     Read the ccpm ancestry file and return a dictionary with ccpm_id as key and ancestry as value
@@ -29,36 +38,88 @@ def read_ccpm_ancestry(ccpm_ancestry_file):
 
     return ccpm_ancestry
 
-def get_cohorts(chrom_hits):
+def read_query_hits(knn_file):
+    '''
+    Read one query's hits
+    @param knn_file: path to <query_id>.knn
+    @return: query_id, list of (match_id, genosis_score) in file order
+    '''
+    query_id = os.path.basename(knn_file).split('.')[0]
+    hits = []
+    with compressed_io.open_text(knn_file) as f:
+        for line in f:
+            if 'QUERY' in line:
+                # check that the query id is the same as the file name
+                assert query_id == line.strip().split(':')[1].strip()
+            else:
+                line = line.strip().split('\t')
+                hits.append((line[0], float(line[1])))
+    return query_id, hits
+
+def get_knn_files(chrom_hits, max_files=100):
+    '''
+    the first max_files .knn files of the chromosome hits dir, in sorted order
+    '''
+    return sorted(file for file in os.listdir(chrom_hits) if file.endswith('.knn'))[:max_files]
+
+@profiling.profiled()
+def get_cohorts(chrom_hits, checkpoints=None, restart=False, batch_size=10):
     '''
     Read all the query's hits and return a dictionary with ccpm_id as key and top k hits as value
     @param chrom_hits: path to the chromosome hits dir
+    @param checkpoints: directory for the journal and batches of parsed files (None: no checkpoints)
+    @param restart: ignore an existing journal
+    @param batch_size: .knn files per checkpointed batch
     @return: dictionary with ccpm_id as key and top k hits as value
     '''
-    num_files = 0
+    if checkpoints is not None:
+        return get_cohorts_checkpointed(chrom_hits, checkpoints, restart, batch_size)
+
     ccpm_top_k = defaultdict(list)
     ccpm_top_k_genosis_scores = defaultdict(dict)
 
-    for file in os.listdir(chrom_hits):
-        if num_files == 100:
-            break
-        if file.endswith('.knn'):
-            query_id = file.split('.')[0]
-            with open(os.path.join(chrom_hits, file), 'r') as f:
-                for line in f:
-                    if 'QUERY' in line:
-                        # check that the query id is the same as the file name
-                        assert query_id == line.strip().split(':')[1].strip()
-                    else:
-                        line = line.strip().split('\t')
-                        match_id = line[0]
-                        genosis_score = float(line[1])
-                        ccpm_top_k[query_id].append(match_id)
-                        ccpm_top_k_genosis_scores[query_id][match_id] = genosis_score
-            num_files += 1
+    for file in get_knn_files(chrom_hits):
+        query_id, hits = read_query_hits(os.path.join(chrom_hits, file))
+        for match_id, genosis_score in hits:
+            ccpm_top_k[query_id].append(match_id)
+            ccpm_top_k_genosis_scores[query_id][match_id] = genosis_score
 
     return ccpm_top_k, ccpm_top_k_genosis_scores
 
+def read_hits_batch(chrom_hits, files, batch_file):
+    checkpoint.save_unit(batch_file, [read_query_hits(os.path.join(chrom_hits, file)) for file in files])
+
+def get_cohorts_checkpointed(chrom_hits, checkpoints, restart, batch_size):
+    '''
+    get_cohorts over batches of files, each saved once it is read
+    '''
+    # sorted so a restarted run makes the same batches
+    files = get_knn_files(chrom_hits)
+    os.makedirs(checkpoints, exist_ok=True)
+    journal = checkpoint.Journal(os.path.join(checkpoints, 'cohorts.journal'), restart=restart)
+
+    units = []
+    for start in range(0, len(files), batch_size):
+        batch = files[start:start + batch_size]
+        unit = batch[0] + '..' + batch[-1]
+        batch_file = os.path.join(checkpoints, 'batch' + str(start // batch_size).zfill(6) + '.json')
+        units.append((unit, [batch_file],
+                      lambda batch=batch, batch_file=batch_file: read_hits_batch(chrom_hits, batch, batch_file),
+                      [os.path.join(chrom_hits, file) for file in batch]))
+    failed = checkpoint.run_units(units, journal)
+    if len(failed) > 0:
+        sys.exit(f'Error: {len(failed)} batches failed, run again to retry them')
+
+    ccpm_top_k = defaultdict(list)
+    ccpm_top_k_genosis_scores = defaultdict(dict)
+    for unit, outputs, func, inputs in units:
+        for query_id, hits in checkpoint.load_unit(outputs[0]):
+            for match_id, genosis_score in hits:
+                ccpm_top_k[query_id].append(match_id)
+                ccpm_top_k_genosis_scores[query_id][match_id] = genosis_score
+    return ccpm_top_k, ccpm_top_k_genosis_scores
+
+@profiling.profiled(rows_arg=1)
 def write_ccpm_hits_ancestry(ccpm_ancestry,
                              ccpm_top_k,
                              output_file):
@@ -68,7 +129,7 @@ def write_ccpm_hits_ancestry(ccpm_ancestry,
     @param ccpm_ancestry_labels: list of ancestry labels
     @param output_file: path to the output file
     '''
-    with open(output_file, 'w') as f:
+    with checkpoint.atomic_open(output_file) as f:
         f.write('query_id,ancestry\t' + '\thit_id,ancestry\n')
         for query_id, hits in ccpm_top_k.items():
             query_ancestry = ccpm_ancestry[query_id]
@@ -77,8 +138,8 @@ def write_ccpm_hits_ancestry(ccpm_ancestry,
                 hit_ancestry = ccpm_ancestry[hit]
                 f.write(f'{hit},{hit_ancestry}\t')
             f.write('\n')
-    f.close()
 
+@profiling.profiled(rows_arg=0)
 def write_ccpm_genosis_scores(ccpm_genosis_scores,
                                 output_file):
         '''
@@ -86,14 +147,13 @@ def write_ccpm_genosis_scores(ccpm_genosis_scores,
         @param ccpm_genosis_scores: dictionary with ccpm_id as key and top k hits genosis scores as value
         @param output_file: path to the output file
         '''
-        with open(output_file, 'w') as f:
+        with checkpoint.atomic_open(output_file) as f:
             f.write('query_id\t' + '\thit_id,genosis_score\n')
             for query_id, hits in ccpm_genosis_scores.items():
                 f.write(f'{query_id}\t')
                 for hit, genosis_score in hits.items():
                     f.write(f'{hit},{genosis_score}\t')
                 f.write('\n')
-        f.close()
 
 def main():
     # Parse command line arguments
@@ -113,16 +173,16 @@ def main():
     ccpm_ancestry = read_ccpm_ancestry(ccpm_ancestry_file)
 
     print('Reading chromosome hits')
-    ccpm_top_k, ccpm_genosis_scores = get_cohorts(chrom_hits)
+    ccpm_top_k, ccpm_genosis_scores = get_cohorts(chrom_hits, args.checkpoints, args.restart)
 
     print('writing chromosome hits ancestry to file')
-    out_file = str(chrm) + '_ccpm_anc.txt'
+    out_file = compressed_io.add_suffix(str(chrm) + '_ccpm_anc.txt', args.compress)
     write_ccpm_hits_ancestry(ccpm_ancestry,
                              ccpm_top_k,
                              out_file)
 
     print('writing chromosome genosis scores to file')
-    out_file = str(chrm) + '_ccpm_genosis_scores.txt'
+    out_file = compressed_io.add_suffix(str(chrm) + '_ccpm_genosis_scores.txt', args.compress)
     write_ccpm_genosis_scores(ccpm_genosis_scores,
                              out_file)
 
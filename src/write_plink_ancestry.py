@@ -1,6 +1,8 @@
 import plotting.ancestry_helpers as ah
+import profiling
 
 
+@profiling.profiled()
 def read_hits_file(hits_file, trio_samples, sample_subpopulations, SUB_SUPERPOPULATIONS):
     # { superpop: {subpop: [scores], superpop: [scores], outgroup: [scores] } }
     hits = {'AFR': {'subpop': [], 'superpop': [], 'outgroup': []},
@@ -51,6 +53,7 @@ def read_hits_file(hits_file, trio_samples, sample_subpopulations, SUB_SUPERPOPU
     f.close()
     return hits
 
+@profiling.profiled()
 def get_trio_samples(ped_file):
     trio_samples = []
     f = open(ped_file, 'r')
@@ -71,6 +74,7 @@ def get_trio_samples(ped_file):
     f.close()
     return trio_samples
 
+@profiling.profiled(rows_arg=0)
 def write_plink_hits(hits, out_file):
     f = open(out_file, 'w')
     f.write('superpop,category,scores...\n')
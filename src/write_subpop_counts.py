@@ -2,6 +2,8 @@ import argparse
 from collections import defaultdict
 
 import plotting.ancestry_helpers as ancestry_helpers
+import compressed_io
+import profiling
 
 
 def parse_args():
@@ -14,6 +16,7 @@ def parse_args():
     parser.add_argument('--output_dir', type=str, required=True, help='Path to output directory')
     return parser.parse_args()
 
+@profiling.profiled()
 def get_subpop_counts(top_k_file,
                       subpopulations,
                       header=True):
@@ -26,7 +29,7 @@ def get_subpop_counts(top_k_file,
     all_subpopulations = ancestry_helpers.SUBPOPULATIONS
     subpopulation_counts = {sub: {sub2: [] for sub2 in all_subpopulations} for sub in all_subpopulations}
 
-    f = open(top_k_file, 'r')
+    f = compressed_io.open_text(top_k_file)
     if header:
         f.readline()
     for line in f:
@@ -48,6 +51,7 @@ def get_subpop_counts(top_k_file,
     f.close()
     return subpopulation_counts
 
+@profiling.profiled(rows_arg=0)
 def write_subpop_counts(subpopulation_counts, output_file):
     '''
     Write subpopulation counts to file
@@ -55,7 +59,7 @@ def write_subpop_counts(subpopulation_counts, output_file):
     @param output_file: path to output file
     '''
     all_subpopulations = sorted(subpopulation_counts.keys())
-    with open(output_file, 'w') as f:
+    with compressed_io.open_text(output_file, 'w') as f:
         f.write('query_subpop match_subpop counts,...\n')
         for query_subpopulation in all_subpopulations:
             # f.write(f'{query_subpopulation}\t')
@@ -1,11 +1,20 @@
 import argparse
 import os
+import sys
+import tempfile
 from collections import defaultdict
+import checkpoint
+import profiling
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-a', '--ancestry', type=str, help='ancestry file', required=True)
     parser.add_argument('-d', '--data', type=str, help='data directory', required=True)
+    parser.add_argument('--checkpoints', type=str,
+                        help='directory for the completion journal and finished query/database scores '
+                             '(a job run again skips directories that have not changed)')
+    parser.add_argument('--restart', default=False, action='store_true',
+                        help='ignore the journal and read every directory again')
     return parser.parse_args()
 
 SUBPOPULATIONS = ['ASW', 'LWK', 'GWD', 'MSL', 'ESN', 'YRI', 'ACB', 
@@ -26,6 +35,7 @@ SUPER_SUBPOPULATIONS = {'AFR': ['ASW', 'LWK', 'GWD', 'MSL', 'ESN', 'YRI', 'ACB']
                         'EUR': ['CEU', 'TSI', 'FIN', 'GBR', 'IBS'],
                         'SAS': ['BEB', 'GIH', 'ITU', 'PJL', 'STU']}
 
+@profiling.profiled()
 def get_subpopulations(ancestry_file):
     sample_subpopulations = {}
     with open(ancestry_file) as f:
@@ -81,26 +91,62 @@ def read_top_hits(query_file,
     f.close()
     return query_full_dict
 
+@profiling.profiled(rows_arg=1)
 def write_query_pop_scores(query_pop,
                             query_full_dict):
 
-    o_file = open(query_pop + '.txt', 'w')
-    header = 'QUERY POPULATION: ' + query_pop + '\n'
-    o_file.write(header)
-
-    for database_pop in query_full_dict.keys():
-        o_file.write('database: ' + database_pop + '\n')
-        for query_subpop in query_full_dict[database_pop]:
-            for hit_subpop in query_full_dict[database_pop][query_subpop]:
-                line = query_subpop + '->' + hit_subpop + ':'
-                scores = query_full_dict[database_pop][query_subpop][hit_subpop]
-                if len(scores) == 0:
-                    continue
-                else:
-                    for score in scores:
-                        line += str(score) + ','
-                    o_file.write(line + '\n')
-    
+    with checkpoint.atomic_open(query_pop + '.txt') as o_file:
+        header = 'QUERY POPULATION: ' + query_pop + '\n'
+        o_file.write(header)
+
+        for database_pop in query_full_dict.keys():
+            o_file.write('database: ' + database_pop + '\n')
+            for query_subpop in query_full_dict[database_pop]:
+                for hit_subpop in query_full_dict[database_pop][query_subpop]:
+                    line = query_subpop + '->' + hit_subpop + ':'
+                    scores = query_full_dict[database_pop][query_subpop][hit_subpop]
+                    if len(scores) == 0:
+                        continue
+                    else:
+                        for score in scores:
+                            line += str(score) + ','
+                        o_file.write(line + '\n')
+
+def read_database_scores(top_hits_dir,
+                         query_pop,
+                         database_pop,
+                         sample_subpopulations,
+                         scores_file):
+    '''
+    Read the top hits of every query in one query/database directory and save the scores
+    @param scores_file: JSON file for {query subpop: {hit subpop: [scores]}}
+    '''
+    query_full_dict = defaultdict(dict)
+    # iterate through all top hits for each sample
+    with profiling.stage('read_top_hits.' + query_pop + '.' + database_pop) as stage:
+        for query_ID in os.listdir(top_hits_dir):
+            q_ID = query_ID.replace('.knn', '')
+            # assert sample is in expected superpopulation
+            assert_sample_pop(q_ID, query_pop, sample_subpopulations)
+            query_file = top_hits_dir + query_ID
+            query_full_dict = read_top_hits(query_file,
+                                                query_full_dict,
+                                                database_pop,
+                                                sample_subpopulations)
+            stage.add_rows(1)
+    checkpoint.save_unit(scores_file, query_full_dict[database_pop])
+
+def write_query_pop(query_pop,
+                    database_pops,
+                    scores_files):
+    # report scores by subpopulation
+    query_full_dict = defaultdict(dict)
+    for database_pop in database_pops:
+        scores = checkpoint.load_unit(scores_files[database_pop])
+        if len(scores) > 0:
+            query_full_dict[database_pop] = scores
+    write_query_pop_scores(query_pop,
+                           query_full_dict)
 
 def main():
 
@@ -117,28 +163,35 @@ def main():
                         'EUR': 'European',
                         'SAS': 'South Asian'}
 
+    # every query/database directory is a unit saved under --checkpoints,
+    # so an interrupted run only reads the directories it had not finished
+    if args.checkpoints is not None:
+        checkpoints = args.checkpoints
+        os.makedirs(checkpoints, exist_ok=True)
+        journal = checkpoint.Journal(os.path.join(checkpoints, 'quality_data.journal'), restart=args.restart)
+    else:
+        temporary = tempfile.TemporaryDirectory()
+        checkpoints = temporary.name
+        journal = None
+
     # queries were performed by superpopulation
+    units = []
     for query_pop in super_populations.keys():
-        print('query...', query_pop)
-        # report scores by subpopulation
-        query_full_dict = defaultdict(dict)
-        # query_subpop_scores = {subpop : [] for subpop in SUBPOPULATIONS}
+        scores_files = {}
         for database_pop in super_populations.keys():
-            print('...database...', database_pop)
             top_hits_dir = data_dir + query_pop + '_db/' + database_pop + '_top_hits/'
-            # iterate through all top hits for each sample
-            for query_ID in os.listdir(top_hits_dir):
-                q_ID = query_ID.replace('.knn', '')
-                # assert sample is in expected superpopulation
-                assert_sample_pop(q_ID, query_pop, sample_subpopulations)
-                query_file = top_hits_dir + query_ID
-                query_full_dict = read_top_hits(query_file,
-                                                    query_full_dict,
-                                                    database_pop,
-                                                    sample_subpopulations)
-
-        write_query_pop_scores(query_pop,
-                               query_full_dict)
+            scores_files[database_pop] = os.path.join(checkpoints, query_pop + '_' + database_pop + '.json')
+            units.append((query_pop + '.' + database_pop, [scores_files[database_pop]],
+                          lambda q=query_pop, d=database_pop, t=top_hits_dir, o=scores_files[database_pop]:
+                              read_database_scores(t, q, d, sample_subpopulations, o),
+                          [top_hits_dir, ancestry_file]))
+        units.append((query_pop, [query_pop + '.txt'],
+                      lambda q=query_pop, o=scores_files: write_query_pop(q, super_populations.keys(), o),
+                      list(scores_files.values())))
+
+    failed = checkpoint.run_units(units, journal)
+    if len(failed) > 0:
+        sys.exit(f'Error: {len(failed)} units failed, run again to retry them')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,109 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import plotting.ancestry_helpers as ah
+from write_trio_scores import (read_top_hits, read_relationship_labels, write_relationship_scores,
+                               get_relationship_label)
+from write_ranks import write_relationship_ranks
+import compressed_io
+import profiling
+
+POPULATIONS = ['AFR', 'AMR', 'EAS', 'EUR', 'SAS']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Writes scores and ranks for top K by relatedness label "
+                                                 "for every population and metric in one run")
+    parser.add_argument("-i", "--input", nargs='+', required=True,
+                        help="input top hits files (one per metric)")
+    parser.add_argument("-s", "--score", nargs='+', required=True,
+                        help="type of score for each input file (e.g. GenoSiS plink_DST plink_pihat plink_kin)")
+    parser.add_argument("-p", "--pops", nargs='+', default=POPULATIONS, help="populations")
+    parser.add_argument("-k", "--knn", help="value of K for hits", required=True)
+    parser.add_argument("-a", "--ancestry", help="ancestry file", required=True)
+    parser.add_argument("-l", "--labels", default='data/', help="directory with 1KG_trios_POP.txt label files")
+    parser.add_argument("-o", "--out", help="output dir", required=True)
+    parser.add_argument("-t", "--threads", type=int, default=None, help="number of metric files to process at once")
+    parser.add_argument("-c", "--compress", choices=['gz', 'zst'], help="compress outputs (block gzip or zstd)")
+    return parser.parse_args()
+
+@profiling.profiled()
+def read_all_relationship_labels(labels_dir, pops):
+    '''
+    Read the relationship labels for every population into one lookup
+    @param labels_dir: directory with 1KG_trios_POP.txt files
+    @param pops: list of superpopulations
+    @return: dictionary of {sample1: {sample2: relationship}} for all populations
+    '''
+    pop_labels = {}
+    for pop in pops:
+        pop_labels_file = compressed_io.resolve(labels_dir + '/1KG_trios_' + pop + '.txt')
+        for sample, labels in read_relationship_labels(pop_labels_file).items():
+            try:
+                pop_labels[sample].update(labels)
+            except KeyError:
+                pop_labels[sample] = labels
+    return pop_labels
+
+@profiling.profiled()
+def get_relatedness_scores_and_ranks(top_hits_dict, pop_labels, subpopulations, pops):
+    '''
+    Label every hit once and collect both its score and its rank, split by query superpopulation
+    @param top_hits_dict: dictionary of {query: {match: score}}
+    @param pop_labels: dictionary of {sample1: {sample2: relationship}}
+    @param subpopulations: dictionary of subpopulations for each sample
+    @param pops: list of superpopulations to report
+    @return: {pop: relationship scores}, {pop: relationship ranks}
+    '''
+    relationship_options = ['self', 'parent', 'child', 'subpop', 'AFR', 'AMR', 'EAS', 'EUR', 'SAS']
+
+    pop_scores = {pop: {label: [] for label in relationship_options} for pop in pops}
+    pop_ranks = {pop: {label: [] for label in relationship_options} for pop in pops}
+    for query in top_hits_dict:
+        query_superpop = ah.SUB_SUPERPOPULATIONS[subpopulations[query]]
+        if query_superpop not in pop_scores:
+            continue
+        scores = pop_scores[query_superpop]
+        ranks = pop_ranks[query_superpop]
+        match_rank = 0
+        for match, score in top_hits_dict[query].items():
+            relationship_label = get_relationship_label(pop_labels, query, match, subpopulations)
+            if relationship_label not in relationship_options:
+                relationship_label = ah.SUB_SUPERPOPULATIONS[subpopulations[match]]
+            scores[relationship_label].append(score)
+            ranks[relationship_label].append(match_rank)
+            match_rank += 1
+    return pop_scores, pop_ranks
+
+@profiling.profiled(rows=None)
+def write_metric_trio_data(top_hits_file, score_type, pop_labels, subpopulations, pops, output_dir, k, compression=None):
+    '''
+    Read one metric's top hits file and write scores and ranks for every population
+    @return: score type that was written
+    '''
+    top_hits_dict = read_top_hits(top_hits_file)
+    pop_scores, pop_ranks = get_relatedness_scores_and_ranks(top_hits_dict, pop_labels, subpopulations, pops)
+    for pop in pops:
+        write_relationship_scores(pop_scores[pop], score_type, output_dir, pop, k, compression)
+        write_relationship_ranks(pop_ranks[pop], score_type, output_dir, pop, k, compression)
+    return score_type
+
+def main():
+    args = parse_args()
+    if len(args.input) != len(args.score):
+        raise SystemExit('Error: --input and --score must have the same number of values')
+
+    subpopulations = ah.get_subpopulations(args.ancestry)
+    pop_labels = read_all_relationship_labels(args.labels, args.pops)
+
+    threads = args.threads or len(args.input)
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(write_metric_trio_data,
+                                   top_hits_file, score_type,
+                                   pop_labels, subpopulations,
+                                   args.pops, args.out, args.knn, args.compress)
+                   for top_hits_file, score_type in zip(args.input, args.score)]
+        for future in futures:
+            print('wrote', future.result())
+
+if __name__ == "__main__":
+    main()
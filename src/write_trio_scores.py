@@ -1,8 +1,15 @@
 import argparse
 from collections import defaultdict
+import os
+import sys
 
+# also imported as src.write_trio_scores by the plotting scripts
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import read_plink as rp
 import plotting.ancestry_helpers as ah
+import compressed_io
+import pairwise_parquet
+import profiling
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Writes scores for top K by relatedness label")
@@ -12,12 +19,14 @@ def parse_args():
     parser.add_argument("-k", "--knn", help="value of K for hits")
     parser.add_argument("-a", "--ancestry", help="ancestry file")
     parser.add_argument("-o", "--out", help="output dir")
+    parser.add_argument("-c", "--compress", choices=['gz', 'zst'], help="compress the output (block gzip or zstd)")
     return parser.parse_args()
 
+@profiling.profiled()
 def read_top_hits(top_hits_file):
     top_hits_dict = defaultdict(dict)
 
-    with open(top_hits_file, 'r') as f:
+    with compressed_io.open_text(top_hits_file) as f:
         for line in f:
             line = line.strip().split()
             query = line[0]
@@ -35,9 +44,12 @@ def read_top_hits(top_hits_file):
 
     return top_hits_dict
 
+@profiling.profiled()
 def read_relationship_labels(pop_labels_file):
+    if pairwise_parquet.is_parquet(pop_labels_file):
+        return pairwise_parquet.get_relationship_labels(pop_labels_file)
     pop_labels = defaultdict(dict)
-    with open(pop_labels_file, 'r') as f:
+    with compressed_io.open_text(pop_labels_file) as f:
         for line in f:
             line = line.strip().split()
             sample1 = line[0]
@@ -55,6 +67,24 @@ def read_relationship_labels(pop_labels_file):
                 pop_labels[sample2][sample1] = relationship
     return pop_labels
 
+def get_relationship_label(pop_labels, query, match, subpopulations):
+    '''
+    Label of a pair from read_relationship_labels
+    Sparse label files (get_relations --sparse) only list pairs connected in the family tree; a missing pair is
+    labelled by ancestry (subpop, superpop or outpop) as get_relations.label_relationship does in dense files
+    '''
+    try:
+        return pop_labels[query][match]
+    except KeyError:
+        if query == match:
+            return 'self'
+        if subpopulations[query] == subpopulations[match]:
+            return 'subpop'
+        if ah.SUB_SUPERPOPULATIONS[subpopulations[query]] == ah.SUB_SUPERPOPULATIONS[subpopulations[match]]:
+            return 'superpop'
+        return 'outpop'
+
+@profiling.profiled()
 def get_relatedness_dict(top_hits_dict, pop_labels, subpopulations, pop):
     # get population labels for each hit
     relationship_options = ['self', 'parent', 'child', 'subpop', 'AFR', 'AMR', 'EAS', 'EUR', 'SAS']
@@ -66,10 +96,7 @@ def get_relatedness_dict(top_hits_dict, pop_labels, subpopulations, pop):
             for match in top_hits_dict[query]:
                 match_superpop = ah.SUB_SUPERPOPULATIONS[subpopulations[match]]
                 score = top_hits_dict[query][match]
-                try:
-                    relationship_label = pop_labels[query][match]
-                except KeyError:
-                    relationship_label = 'outpop'
+                relationship_label = get_relationship_label(pop_labels, query, match, subpopulations)
 
                 if relationship_label not in relationship_options:
                     relationship_label = match_superpop
@@ -83,22 +110,21 @@ def get_relatedness_dict(top_hits_dict, pop_labels, subpopulations, pop):
 
 
 
-def write_relationship_scores(relatedness_dict, score_type, output_dir, pop, k):
+@profiling.profiled(rows_arg=0)
+def write_relationship_scores(relatedness_dict, score_type, output_dir, pop, k, compression=None):
     output_file = output_dir + "/" + score_type + "_" + pop + "_trio_scores_" + k + ".txt"
-    f = open(output_file, 'w')
-    with open(output_file, 'w') as f:
+    with compressed_io.open_text(compressed_io.add_suffix(output_file, compression), 'w') as f:
         f.write("relationship score\n")
         for relationship in relatedness_dict:
             f.write(f"{relationship} ")
             for score in relatedness_dict[relationship]:
                 f.write(f"{score} ")
             f.write("\n")
-    f.close()
 
 def main():
     args = parse_args()
 
-    pop_labels_file = 'data/1KG_trios_' + args.pop + '.txt'
+    pop_labels_file = compressed_io.resolve('data/1KG_trios_' + args.pop + '.txt')
     subpopulations = ah.get_subpopulations(args.ancestry)
 
     top_hits_dict = read_top_hits(args.input)
@@ -106,7 +132,7 @@ def main():
 
     relatedness_dict = get_relatedness_dict(top_hits_dict, pop_labels, subpopulations, args.pop)
 
-    write_relationship_scores(relatedness_dict, args.score, args.out, args.pop, args.knn)
+    write_relationship_scores(relatedness_dict, args.score, args.out, args.pop, args.knn, args.compress)
 
 if __name__ == "__main__":
     main()